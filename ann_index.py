@@ -0,0 +1,265 @@
+import os
+import json
+import math
+import faiss
+import numpy as np
+from typing import Dict, Optional
+
+# ==============================
+# INDEX SPECS
+# ==============================
+# An index spec is a plain dict, e.g.
+#   {"type": "flat"}
+#   {"type": "hnsw",  "M": 32, "efConstruction": 40, "efSearch": 64}
+#   {"type": "ivf",   "nlist": 100, "nprobe": 8}
+#   {"type": "ivfpq", "nlist": 100, "nprobe": 8, "m": 8, "nbits": 8}
+#   {"type": "flat",  "quantize": "int8", "rescore": 8}
+# Missing keys fall back to DEFAULTS.
+#
+# quantize stores compact codes instead of float32 vectors: "fp16" (2x
+# smaller), "int8" (4x, flat / hnsw / ivf) or "binary" (one sign bit per
+# dimension, 32x, Hamming distance, flat only). Searches then fetch
+# rescore * k candidates from the codes (default RESCORE_FACTORS) and
+# rank them by exact L2 over the float32 vectors memory-mapped from
+# disk (see raw_vectors.py).
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+QUANTIZERS = (None, "fp16", "int8", "binary")
+SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+# sign bits lose far more than int8: ~0.9 recall@10 needs ~20x candidates
+RESCORE_FACTORS = {"fp16": 2, "int8": 4, "binary": 20}
+
+DEFAULTS = {
+    "type": "flat",
+    "M": 32,
+    "efConstruction": 40,
+    "efSearch": 64,
+    "nlist": 100,
+    "nprobe": 8,
+    "m": 8,
+    "nbits": 8,
+    "quantize": None,
+    "rescore": None,
+}
+
+# resolved spec of a saved index, next to the index file
+SPEC_SUFFIX = ".spec.json"
+
+# faiss recommends at least ~39 training points per centroid
+POINTS_PER_CENTROID = 39
+# int8 ranges / binary thresholds are per-dimension statistics
+QUANTIZER_TRAIN_SIZE = 10_000
+
+
+def resolve_spec(spec: Optional[Dict] = None) -> Dict:
+    spec = {**DEFAULTS, **(spec or {})}
+    if spec["type"] not in INDEX_TYPES:
+        raise ValueError(f"index type must be one of {INDEX_TYPES}, got {spec['type']!r}")
+    if spec["quantize"] not in QUANTIZERS:
+        raise ValueError(f"quantize must be one of {QUANTIZERS}, got {spec['quantize']!r}")
+    if spec["quantize"] and spec["type"] == "ivfpq":
+        raise ValueError("ivfpq already stores product-quantized codes, drop quantize")
+    if spec["quantize"] == "binary" and spec["type"] != "flat":
+        raise ValueError("binary codes are only supported for flat indexes")
+    if spec["quantize"] and not spec["rescore"]:
+        spec["rescore"] = RESCORE_FACTORS[spec["quantize"]]
+    return spec
+
+
+def train_size(spec: Dict) -> int:
+    """
+    Number of vectors to collect before training (0 = no training needed).
+    """
+    spec = resolve_spec(spec)
+    if spec["type"] == "ivf":
+        return POINTS_PER_CENTROID * spec["nlist"]
+    if spec["type"] == "ivfpq":
+        return POINTS_PER_CENTROID * max(spec["nlist"], 1 << spec["nbits"])
+    if spec["quantize"] in ("int8", "binary"):
+        return QUANTIZER_TRAIN_SIZE
+    return 0
+
+
+def fit_spec(spec: Dict, n: int) -> Dict:
+    """
+    Shrink nlist / nbits so that a small training sample of n vectors is
+    still enough to train the index.
+    """
+    spec = resolve_spec(spec)
+    if spec["type"] in ("ivf", "ivfpq"):
+        spec["nlist"] = max(1, min(spec["nlist"], n // POINTS_PER_CENTROID))
+        spec["nprobe"] = min(spec["nprobe"], spec["nlist"])
+    if spec["type"] == "ivfpq" and n < (1 << spec["nbits"]):
+        spec["nbits"] = max(1, int(math.log2(max(n, 2))))
+    return spec
+
+
+# ==============================
+# BUILD
+# ==============================
+def build_index(dim: int, spec: Optional[Dict] = None) -> faiss.Index:
+    spec = resolve_spec(spec)
+    kind = spec["type"]
+    sq = SQ_TYPES.get(spec["quantize"])
+
+    if kind == "flat":
+        if spec["quantize"] == "binary":
+            # sign bit per dimension, thresholds = per-dimension medians
+            return faiss.IndexLSH(dim, dim, False, True)
+        if sq is not None:
+            return faiss.IndexScalarQuantizer(dim, sq, faiss.METRIC_L2)
+        return faiss.IndexFlatL2(dim)
+
+    if kind == "hnsw":
+        if sq is not None:
+            index = faiss.IndexHNSWSQ(dim, sq, spec["M"])
+        else:
+            index = faiss.IndexHNSWFlat(dim, spec["M"])
+        index.hnsw.efConstruction = spec["efConstruction"]
+        index.hnsw.efSearch = spec["efSearch"]
+        return index
+
+    quantizer = faiss.IndexFlatL2(dim)
+    if kind == "ivf":
+        if sq is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, spec["nlist"], sq, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, spec["nlist"])
+    else:
+        if dim % spec["m"]:
+            raise ValueError(f"dim {dim} is not divisible by PQ m={spec['m']}")
+        index = faiss.IndexIVFPQ(quantizer, dim, spec["nlist"], spec["m"], spec["nbits"])
+    index.nprobe = spec["nprobe"]
+    return index
+
+
+def build_id_index(dim: int, spec: Optional[Dict] = None) -> faiss.Index:
+    """
+    Index that accepts add_with_ids / remove_ids with caller-chosen ids.
+    IVF indexes store ids natively; flat and HNSW are wrapped in an
+    IndexIDMap2. (IndexIDMap.remove_ids assumes the inner index compacts
+    its ids after a removal, which IVF does not, so IVF must not be wrapped.)
+    """
+    index = build_index(dim, spec)
+    if isinstance(index, faiss.IndexIVF):
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def is_id_index(index: faiss.Index) -> bool:
+    return isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def quantizer_of(index: faiss.Index) -> Optional[str]:
+    """
+    The "quantize" value an index was built with (None for float32 /
+    PQ indexes), read back from a loaded index file.
+    """
+    inner = faiss.downcast_index(base_index(index))
+    if isinstance(inner, faiss.IndexLSH):
+        return "binary"
+    if isinstance(inner, faiss.IndexHNSWSQ):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if inner.sq.qtype == SQ_TYPES["fp16"] else "int8"
+    return None
+
+
+def supports_selector(index: faiss.Index) -> bool:
+    # IndexLSH.search rejects SearchParameters (and so an IDSelector)
+    return not isinstance(faiss.downcast_index(base_index(index)), faiss.IndexLSH)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """
+    Serialized size, a close proxy for the resident size of the codes.
+    """
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def train_index(index: faiss.Index, embeddings: np.ndarray, sample_size: Optional[int] = None, seed: int = 0):
+    """
+    Train on a random sample of the given embeddings (no-op for flat/HNSW).
+    """
+    if index.is_trained:
+        return
+    if sample_size and len(embeddings) > sample_size:
+        rng = np.random.default_rng(seed)
+        embeddings = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    index.train(np.ascontiguousarray(embeddings, dtype="float32"))
+
+
+# ==============================
+# SPEC FILE
+# ==============================
+def spec_path(index_path: str) -> str:
+    return index_path + SPEC_SUFFIX
+
+
+def save_spec(index_path: str, spec: Dict):
+    """
+    The spec an index was built with, after resolve_spec / fit_spec, so
+    readers get its "rescore" factor instead of the quantizer default.
+    """
+    with open(spec_path(index_path), "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+
+
+def load_spec(index_path: str) -> Optional[Dict]:
+    path = spec_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ==============================
+# QUERY-TIME KNOBS
+# ==============================
+def base_index(index: faiss.Index) -> faiss.Index:
+    """
+    Unwrap IDMap / PreTransform wrappers to reach the actual ANN index.
+    """
+    while True:
+        inner = getattr(index, "index", None)
+        if inner is None:
+            return index
+        index = faiss.downcast_index(inner)
+
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                  selector: Optional[faiss.IDSelector] = None):
+    """
+    Per-request search parameters for index.search(..., params=...).
+    `selector` restricts results to the selected ids (see bitmap_filter).
+    Returns None when nothing is overridden, so the defaults stored in
+    the index file are used.
+    """
+    inner = faiss.downcast_index(base_index(index))
+    if isinstance(inner, faiss.IndexIVF):
+        if nprobe is None and selector is None:
+            return None
+        params = faiss.SearchParametersIVF(nprobe=int(nprobe or inner.nprobe))
+    elif isinstance(inner, faiss.IndexHNSW):
+        if ef_search is None and selector is None:
+            return None
+        params = faiss.SearchParametersHNSW(efSearch=int(ef_search or inner.hnsw.efSearch))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def describe_index(index: faiss.Index) -> Dict:
+    inner = faiss.downcast_index(base_index(index))
+    info = {"class": type(inner).__name__, "ntotal": index.ntotal, "quantize": quantizer_of(index)}
+    if isinstance(inner, faiss.IndexIVF):
+        info.update(nlist=inner.nlist, nprobe=inner.nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        info.update(efSearch=inner.hnsw.efSearch)
+    return info
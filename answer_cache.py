@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import faiss
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# ==============================
+# CONFIGURATION
+# ==============================
+ANSWER_CACHE_DIR = ".answer_cache"
+SIMILARITY_THRESHOLD = 0.95  # cosine between query embeddings
+TTL_SECONDS = 24 * 3600
+MAX_ENTRIES = 2048
+NEIGHBOURS = 4  # candidates checked per lookup
+
+INDEX_FILE = "queries.index"
+ENTRIES_FILE = "entries.json"
+
+
+def index_version(*paths: str) -> str:
+    """
+    Identifies one build of the retrieval index (size + mtime of its
+    files); answers cached against another build are never served.
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, "header.json")
+        if os.path.exists(path):
+            st = os.stat(path)
+            h.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def scope_key(**opts) -> str:
+    """
+    Retrieval options an answer depends on (k, filters, weights, ...);
+    a hit needs the same scope.
+    """
+    return json.dumps(opts, sort_keys=True, default=str)
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype="float32").reshape(1, -1).copy()
+    faiss.normalize_L2(vector)
+    return vector
+
+
+# ==============================
+# CACHE
+# ==============================
+class SemanticAnswerCache:
+    """
+    Answers keyed on query embeddings. Keys live in a flat inner-product
+    FAISS index over L2-normalized vectors, so a lookup is one search
+    over past queries: a near-duplicate question (cosine >= threshold)
+    asked against the same index version and scope reuses the answer and
+    its source ids. Entries expire after ttl seconds; beyond max_entries
+    the least recently used is evicted. Saved to cache_dir on every put.
+    """
+    def __init__(self, dim: int, cache_dir: str = ANSWER_CACHE_DIR,
+                 threshold: float = SIMILARITY_THRESHOLD, ttl: float = TTL_SECONDS,
+                 max_entries: int = MAX_ENTRIES):
+        self.dim = dim
+        self.cache_dir = cache_dir
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()  # LRU order
+        self.next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._load()
+
+    # ---------- persistence ----------
+    def _file(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self):
+        if not os.path.exists(self._file(ENTRIES_FILE)):
+            return
+        with open(self._file(ENTRIES_FILE), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        index = faiss.read_index(self._file(INDEX_FILE))
+        if saved.get("dim") != self.dim or index.d != self.dim:
+            return  # other embedding model: start empty
+        self.index = index
+        self.next_id = saved["next_id"]
+        for entry in saved["entries"]:
+            self.entries[entry["id"]] = entry
+        self._expire(time.time())
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        faiss.write_index(self.index, self._file(INDEX_FILE) + ".tmp")
+        os.replace(self._file(INDEX_FILE) + ".tmp", self._file(INDEX_FILE))
+        tmp = self._file(ENTRIES_FILE) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "next_id": self.next_id, "entries": list(self.entries.values())}, f)
+        os.replace(tmp, self._file(ENTRIES_FILE))
+
+    # ---------- eviction ----------
+    def _remove(self, ids: List[int]):
+        if ids:
+            for i in ids:
+                self.entries.pop(i, None)
+            self.index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def _expire(self, now: float):
+        self._remove([i for i, e in self.entries.items() if now - e["created"] > self.ttl])
+
+    # ---------- public API ----------
+    def get(self, query_emb: np.ndarray, version: str, scope: str = "") -> Optional[Dict]:
+        """
+        Cached {"query", "answer", "sources", ...} for a near-duplicate
+        query, or None.
+        """
+        query = _normalize(query_emb)
+        now = time.time()
+        with self._lock:
+            if self.index.ntotal:
+                sims, ids = self.index.search(query, min(NEIGHBOURS, self.index.ntotal))
+                for sim, i in zip(sims[0], ids[0].tolist()):
+                    if i < 0 or sim < self.threshold:
+                        break
+                    entry = self.entries.get(i)
+                    if entry is None or entry["scope"] != scope:
+                        continue
+                    if entry["version"] != version or now - entry["created"] > self.ttl:
+                        # built against an older index, or too old: drop it
+                        self._remove([i])
+                        self.stale += 1
+                        continue
+                    self.entries.move_to_end(i)
+                    entry["hits"] += 1
+                    self.hits += 1
+                    return {**entry, "similarity": round(float(sim), 4)}
+            self.misses += 1
+            return None
+
+    def put(self, query: str, query_emb: np.ndarray, answer: str, source_ids: List[int],
+            version: str, scope: str = "", persist: bool = True):
+        vector = _normalize(query_emb)
+        with self._lock:
+            i = self.next_id
+            self.next_id += 1
+            self.index.add_with_ids(vector, np.asarray([i], dtype="int64"))
+            self.entries[i] = {
+                "id": i,
+                "query": query,
+                "answer": answer,
+                "sources": [int(s) for s in source_ids if s is not None],
+                "version": version,
+                "scope": scope,
+                "created": time.time(),
+                "hits": 0,
+            }
+            self._expire(time.time())
+            overflow = len(self.entries) - self.max_entries
+            if overflow > 0:
+                self._remove(list(self.entries)[:overflow])
+            if persist:
+                self.save()
+
+    def clear(self):
+        with self._lock:
+            self.index.reset()
+            self.entries.clear()
+            self.save()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,476 @@
+# api.py
+# HTTP service over the RAG pipeline; models stay loaded between requests.
+#
+#   uvicorn api:app --host 0.0.0.0 --port 8000
+#
+# The server accepts requests right away; models load in a background
+# warm-up thread (embedder first, so /search is ready before /answer).
+# Several worker processes can share one copy of the weights: load them
+# once, then fork (copy-on-write):
+#
+#   python api.py --workers 4
+#   RAG_PRELOAD=1 gunicorn -k uvicorn.workers.UvicornWorker --preload -w 4 api:app
+#
+# Concurrent requests are collected for a few milliseconds (see
+# micro_batcher.py) so N users cost one encode / generate call per batch
+# instead of N.
+#
+# With RAG_TRACE=1 every stage is timed; GET /metrics serves the
+# histograms in Prometheus text format (see tracing.py).
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from ann_index import describe_index
+from answer_cache import SemanticAnswerCache, scope_key
+from embedding_cache import EmbeddingCache
+from micro_batcher import MicroBatcher
+from players_table import PlayersTable
+from query_router import PlayerIndex, route
+from reranker import CrossEncoderReranker
+from knowledge_graph import GRAPH_FILE, load_graph, with_graph_facts
+from context_packer import ContextPacker
+from retrieval import CONTEXT_CANDIDATES, PROMPT_TEMPLATE, Retriever, generated_text
+from streaming import TokenStream, aiter_stream, sse_event
+from lazy_models import LazyResource, warm_up
+from tracing import count, observe, registry, span, trace
+
+# ==============================
+# CONFIGURATION
+# ==============================
+EMBED_MODEL = "all-MiniLM-L6-v2"
+GEN_MODEL = "google/flan-t5-base"
+GEN_MAX_LENGTH = 200
+
+EMBED_MAX_BATCH = 64
+EMBED_MAX_WAIT_MS = 5
+GEN_MAX_BATCH = 8
+GEN_MAX_WAIT_MS = 20
+
+# <<< EDIT PATHS BELOW IF NEEDED >>>
+INDEX_PATH = os.environ.get("RAG_INDEX", "faiss.index")
+METADATA_DIR = os.environ.get("RAG_METADATA", "metadata")
+PLAYERS_PARQUET = "players.parquet"
+PLAYERS_TXT = "players.txt"
+
+
+# ==============================
+# MODELS (loaded once per process)
+# ==============================
+def load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL)
+
+
+def load_generator():
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=GEN_MODEL)
+
+
+class Service:
+    """
+    Models, index and caches of one server. Creating it is cheap (the
+    index is memory-mapped, models are LazyResources); preload() loads
+    the models now, start() begins serving in the current process.
+    """
+    def __init__(self):
+        self._embedder = LazyResource(load_embedder, "embedder")
+        self._generator = LazyResource(load_generator, "generator")
+        self._packer = LazyResource(
+            lambda: ContextPacker.for_generator(self.generator, PROMPT_TEMPLATE), "context packer"
+        )
+        self._graph = LazyResource(lambda: load_graph(os.environ.get("RAG_GRAPH", GRAPH_FILE)), "knowledge graph")
+        self.embedding_cache = EmbeddingCache(EMBED_MODEL)
+        self.retriever = Retriever.load(self.embed_sync, INDEX_PATH, METADATA_DIR)
+        self.answer_cache = SemanticAnswerCache(self.retriever.index.d)
+        self.player_index = self._load_player_index()
+        self.embed_batcher: Optional[MicroBatcher] = None
+        self.gen_batcher: Optional[MicroBatcher] = None
+        self._reranker = None
+        self._reranker_lock = threading.Lock()
+
+    @property
+    def resources(self) -> List[LazyResource]:
+        # warm-up order: what /search needs first
+        return [self._embedder, self._graph, self._generator, self._packer]
+
+    def preload(self):
+        # weights only, no forward pass: forked workers share these pages,
+        # and torch's thread pool must not be started before the fork
+        for r in self.resources:
+            r.get()
+
+    def start(self):
+        # threads do not survive a fork, so every worker process starts its own;
+        # only the batcher threads touch the embedding cache and the models
+        self.embed_batcher = MicroBatcher(
+            self._encode, max_batch=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS, name="embed"
+        )
+        self.gen_batcher = MicroBatcher(
+            self._generate, max_batch=GEN_MAX_BATCH, max_wait_ms=GEN_MAX_WAIT_MS, name="generate"
+        )
+        warm_up([r for r in self.resources if not r.loaded])
+
+    @property
+    def embedder(self):
+        return self._embedder.get()
+
+    @property
+    def generator(self):
+        return self._generator.get()
+
+    @property
+    def packer(self) -> ContextPacker:
+        return self._packer.get()
+
+    @property
+    def graph(self):
+        return self._graph.get()
+
+    @property
+    def reranker(self) -> CrossEncoderReranker:
+        # loaded on the first request that asks for reranking
+        with self._reranker_lock:
+            if self._reranker is None:
+                self._reranker = CrossEncoderReranker()
+            return self._reranker
+
+    @staticmethod
+    def _load_player_index():
+        if os.path.exists(PLAYERS_PARQUET):
+            return PlayerIndex(PlayersTable.from_parquet(PLAYERS_PARQUET))
+        if os.path.exists(PLAYERS_TXT):
+            return PlayerIndex(PlayersTable.from_txt(PLAYERS_TXT))
+        return None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        def encode(batch):
+            count("embed.model_texts", len(batch))
+            return self.embedder.encode(batch, batch_size=len(batch), convert_to_numpy=True)
+
+        # runs on the batcher thread: counted in the metrics, not in a request trace
+        with span("embed.batch"):
+            return self.embedding_cache.encode(texts, encode)
+
+    def _generate(self, prompts: List[str]) -> List[str]:
+        with span("generate.batch"):
+            outputs = self.generator(prompts, max_length=GEN_MAX_LENGTH, batch_size=len(prompts))
+        return [generated_text(o) for o in outputs]
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        return np.vstack([f.result() for f in self.embed_batcher.submit_many(texts)])
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        futures = self.embed_batcher.submit_many(texts)
+        return np.vstack(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+
+    async def generate(self, prompt: str) -> str:
+        return await asyncio.wrap_future(self.gen_batcher.submit(prompt))
+
+
+service: Optional[Service] = None
+
+if os.environ.get("RAG_PRELOAD"):
+    # gunicorn --preload imports this module once in the master process
+    service = Service()
+    service.preload()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global service
+    if service is None:
+        service = Service()
+    service.start()
+    yield
+
+
+app = FastAPI(title="RAG Knowledge Bot API", lifespan=lifespan)
+
+
+# ==============================
+# REQUEST / RESPONSE MODELS
+# ==============================
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+class SearchRequest(BaseModel):
+    query: str
+    k: int = 3
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    filters: Optional[Dict[str, List[str]]] = None
+    weights: List[float] = [1.0, 1.0]  # (dense, BM25) fusion weights
+    rerank: bool = False  # over-fetch and rerank with a cross-encoder
+
+
+class AnswerRequest(SearchRequest):
+    k: int = CONTEXT_CANDIDATES  # candidates; the context packer keeps what fits
+    structured: bool = True  # try the typed player table first
+    documents: Optional[List[str]] = None  # answer from these instead of retrieving
+    graph_hops: int = 1  # knowledge-graph facts about entities in the query (0 = off)
+
+
+# ==============================
+# ENDPOINTS
+# ==============================
+async def _search(req: SearchRequest, query_emb: Optional[np.ndarray] = None):
+    """
+    (results, rerank stats or None)
+    """
+    if len(req.weights) != 2:
+        raise HTTPException(422, "weights must be [dense, sparse]")
+    if query_emb is None and req.weights[0]:
+        with span("embed"):
+            query_emb = await service.embed([req.query])
+    reranker = service.reranker if req.rerank else None
+    results = await asyncio.to_thread(
+        service.retriever.search,
+        req.query,
+        reranker.max_depth(req.k) if reranker else req.k,
+        nprobe=req.nprobe,
+        ef_search=req.ef_search,
+        filters=req.filters,
+        weights=tuple(req.weights),
+        query_emb=query_emb,
+    )
+    if reranker is None:
+        return results, None
+    with span("rerank"):
+        return await asyncio.to_thread(reranker.rerank, req.query, results, req.k)
+
+
+def _scope(req: SearchRequest) -> str:
+    return scope_key(k=req.k, nprobe=req.nprobe, ef_search=req.ef_search, filters=req.filters,
+                     weights=req.weights, rerank=req.rerank, graph_hops=getattr(req, "graph_hops", 0))
+
+
+async def _cached_answer(req: AnswerRequest):
+    """
+    (cached entry or None, query embedding) for a request that retrieves
+    its own documents.
+    """
+    if req.documents is not None:
+        return None, None
+    with span("embed"):
+        query_emb = await service.embed([req.query])
+    with span("answer_cache.get"):
+        cached = service.answer_cache.get(query_emb, service.retriever.version, _scope(req))
+    count("answer_cache.hit" if cached else "answer_cache.miss")
+    if cached:
+        cached["sources"] = [{"id": i, "text": service.retriever.text(i)} for i in cached["sources"]]
+    return cached, query_emb
+
+
+async def _remember(req: AnswerRequest, query_emb, answer: str, sources: List[Dict]):
+    if query_emb is not None:
+        await asyncio.to_thread(
+            service.answer_cache.put, req.query, query_emb, answer,
+            [s["id"] for s in sources], service.retriever.version, _scope(req),
+        )
+
+
+@app.post("/embed")
+async def embed(req: EmbedRequest):
+    if not req.texts:
+        raise HTTPException(422, "texts must not be empty")
+    vectors = await service.embed(req.texts)
+    return {"model": EMBED_MODEL, "dim": int(vectors.shape[1]), "vectors": vectors.tolist()}
+
+
+@app.post("/search")
+async def search(req: SearchRequest):
+    with trace("search"):
+        results, rerank = await _search(req)
+    return {"query": req.query, "results": results, "rerank": rerank}
+
+
+@app.post("/answer")
+async def answer(req: AnswerRequest):
+    with trace("answer"):
+        return await _answer(req)
+
+
+async def _answer(req: AnswerRequest):
+    if req.structured:
+        routed = route(req.query, service.player_index)
+        if routed:
+            return {"query": req.query, "answer": routed["answer"], "sources": [], "structured": routed}
+
+    cached, query_emb = await _cached_answer(req)
+    if cached:
+        return {"query": req.query, "answer": cached["answer"], "sources": cached["sources"], "cached": True}
+
+    rerank = None
+    if req.documents is not None:
+        sources = [{"id": None, "text": d} for d in req.documents]
+    else:
+        sources, rerank = await _search(req, query_emb)
+    with span("graph_facts"):
+        sources = with_graph_facts(sources, service.graph, req.query, req.graph_hops)
+    with span("pack_prompt"):
+        packed = service.packer.pack(req.query, sources)
+    sources = packed["used"]
+    with span("generate"):
+        text = await service.generate(packed["prompt"])
+    await _remember(req, query_emb, text, sources)
+    return {"query": req.query, "answer": text, "sources": sources, "rerank": rerank}
+
+
+@app.post("/answer/stream")
+async def answer_stream(req: AnswerRequest):
+    """
+    Server-sent events: "sources" once retrieval is done, one "token" per
+    generated piece, then "done" with the full answer and timings.
+    Closing the connection stops generation.
+    """
+    async def events():
+        started = time.perf_counter()
+        if req.structured:
+            routed = route(req.query, service.player_index)
+            if routed:
+                yield sse_event([], "sources")
+                yield sse_event({"text": routed["answer"]}, "token")
+                yield sse_event({"answer": routed["answer"], "structured": True,
+                                 "elapsed_ms": routed["elapsed_ms"]}, "done")
+                return
+
+        cached, query_emb = await _cached_answer(req)
+        if cached:
+            yield sse_event(cached["sources"], "sources")
+            yield sse_event({"text": cached["answer"]}, "token")
+            elapsed = round((time.perf_counter() - started) * 1000, 1)
+            yield sse_event({"answer": cached["answer"], "cached": True,
+                             "ttft_ms": elapsed, "elapsed_ms": elapsed}, "done")
+            return
+
+        rerank = None
+        if req.documents is not None:
+            sources = [{"id": None, "text": d} for d in req.documents]
+        else:
+            sources, rerank = await _search(req, query_emb)
+        sources = with_graph_facts(sources, service.graph, req.query, req.graph_hops)
+        packed = service.packer.pack(req.query, sources)
+        sources = packed["used"]
+        yield sse_event(sources, "sources")
+        if rerank:
+            yield sse_event(rerank, "rerank")
+
+        # one generate call per stream: streaming bypasses the generation batcher
+        stream = TokenStream(service.generator, packed["prompt"], max_length=GEN_MAX_LENGTH)
+        async for piece in aiter_stream(stream):
+            yield sse_event({"text": piece}, "token")
+        yield sse_event({
+            "answer": stream.text,
+            "ttft_ms": round((stream.first_token_at - started) * 1000, 1) if stream.first_token_at else None,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }, "done")
+        # spans cannot stay open across the yields of a response body
+        if stream.first_token_at:
+            observe("stream.ttft", stream.first_token_at - started)
+        observe("stream.total", time.perf_counter() - started)
+        # reached only if the client read the whole stream
+        await _remember(req, query_emb, stream.text, sources)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/filters")
+def filters():
+    bitmaps = service.retriever.bitmaps
+    if bitmaps is None:
+        return {}
+    return {attr: bitmaps.values(attr) for attr in ("state", "college", "source_file")}
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "embed_batches": service.embed_batcher.stats(),
+        "generate_batches": service.gen_batcher.stats(),
+        "embedding_cache": service.embedding_cache.stats(),
+        "answer_cache": service.answer_cache.stats(),
+        "context_packer": service._packer.get().stats() if service._packer.loaded else None,
+        "reranker": service._reranker.stats() if service._reranker else None,
+        "graph": service.graph.stats() if service._graph.loaded and service.graph else None,
+        "hybrid": service.retriever.bm25 is not None,
+        "index": {
+            **describe_index(service.retriever.index),
+            "rescore": service.retriever.rescore_factor if service.retriever.raw is not None else None,
+        },
+        "models": [r.stats() for r in service.resources],
+    }
+
+
+@app.get("/metrics")
+def metrics(format: str = "prometheus"):
+    """
+    Stage latency histograms and counters (empty unless RAG_TRACE=1):
+    Prometheus text by default, ?format=json for a summary.
+    """
+    if format == "json":
+        return registry.snapshot()
+    return PlainTextResponse(registry.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health")
+def health():
+    if service is None:
+        return {"status": "loading"}
+    # "ok" = accepting requests; "ready" = every model loaded, no cold start left
+    return {"status": "ok", "ready": all(r.loaded for r in service.resources)}
+
+
+def serve_forked(host: str, port: int, workers: int):
+    """
+    Load the models once, then fork workers that share them and one
+    listening socket. Falls back to a single process where os.fork does
+    not exist (Windows).
+    """
+    import socket
+    import uvicorn
+
+    global service
+    config = uvicorn.Config(app, host=host, port=port)
+    if not hasattr(os, "fork") or workers <= 1:
+        uvicorn.Server(config).run()
+        return
+
+    service = Service()
+    service.preload()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            uvicorn.Server(config).run(sockets=[sock])
+            os._exit(0)
+        children.append(pid)
+    print(f"✅ Serving on {host}:{port} with {workers} workers (pids {children})")
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RAG Knowledge Bot API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=1, help="forked processes sharing the loaded models")
+    args = parser.parse_args()
+    serve_forked(args.host, args.port, args.workers)
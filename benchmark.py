@@ -0,0 +1,512 @@
+# benchmark.py
+# End-to-end benchmark of the pipeline on synthetic players.txt corpora.
+#
+#   python benchmark.py --sizes 3000 100000 1000000
+#   python benchmark.py --sizes 3000 --skip extract answer --out bench/base.json
+#   python benchmark.py --compare bench/base.json bench/results-<time>.json
+#
+# Every stage reports throughput, p50/p95/p99 latency per call, peak RSS
+# while it ran and (for search) recall@k against exact flat search.
+# Results are written as JSON so two runs can be compared.
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import platform
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from chunker import batched, iter_folder_chunks
+
+# ==============================
+# CONFIGURATION
+# ==============================
+SIZES = (3_000, 100_000, 1_000_000)
+BATCH_SIZE = 1024
+N_QUERIES = 200
+K = 10
+N_ANSWERS = 10
+# spaCy NER is by far the slowest stage: only this many rows per size
+EXTRACT_LIMIT = 20_000
+INDEX_SPECS = (
+    {"type": "flat"},
+    {"type": "hnsw", "M": 32, "efSearch": 64},
+    {"type": "ivf", "nlist": 1024, "nprobe": 16},
+    # compact codes + exact rescoring: memory vs recall@k against "flat"
+    {"type": "flat", "quantize": "fp16"},
+    {"type": "flat", "quantize": "int8"},
+    {"type": "flat", "quantize": "binary"},
+    {"type": "hnsw", "M": 32, "efSearch": 64, "quantize": "int8"},
+)
+STAGES = ("ingest", "extract", "embed", "index", "answer")
+BENCH_DATA_DIR = "bench_data"
+BENCH_OUT_DIR = "bench"
+# --compare flags a stage whose throughput or p95 got this much worse
+REGRESSION_PCT = 10.0
+RSS_INTERVAL_S = 0.005
+
+HEADER = "Player\theight\tweight\tcollage\tborn\tbirth_city\tbirth_state"
+FIRST_NAMES = [
+    "James", "Michael", "Kevin", "Chris", "Anthony", "Stephen", "Tim", "Dwyane", "Kobe", "Paul",
+    "Russell", "Kyrie", "Damian", "Jimmy", "Kawhi", "Luka", "Nikola", "Joel", "Jayson", "Devin",
+    "Earl", "Muggsy", "Larry", "Magic", "Scottie", "Dennis", "Karl", "John", "Hakeem", "Patrick",
+]
+LAST_NAMES = [
+    "Johnson", "Smith", "Williams", "Brown", "Jones", "Davis", "Miller", "Wilson", "Moore", "Taylor",
+    "Thomas", "Jackson", "White", "Harris", "Martin", "Thompson", "Garcia", "Robinson", "Clark", "Lewis",
+    "Walker", "Allen", "Young", "King", "Wright", "Scott", "Green", "Baker", "Adams", "Nelson",
+]
+COLLEGES = [
+    "University of Kentucky", "Duke University", "University of North Carolina", "University of Kansas",
+    "University of California, Los Angeles", "Indiana University", "Michigan State University",
+    "Syracuse University", "University of Arizona", "Georgetown University", "Wake Forest University",
+    "Eastern Michigan University", "Weber State University", "University of Texas at Austin",
+    "Villanova University", "Gonzaga University", "University of Connecticut", "Ohio State University",
+]
+CITIES = [
+    ("Baltimore", "Maryland"), ("Cleveland", "Ohio"), ("Chicago", "Illinois"), ("Oakland", "California"),
+    ("Los Angeles", "California"), ("Houston", "Texas"), ("Dallas", "Texas"), ("Brooklyn", "New York"),
+    ("Philadelphia", "Pennsylvania"), ("Detroit", "Michigan"), ("Atlanta", "Georgia"),
+    ("Seattle", "Washington"), ("Akron", "Ohio"), ("Memphis", "Tennessee"), ("Boston", "Massachusetts"),
+    ("New Orleans", "Louisiana"), ("Louisville", "Kentucky"), ("Miami", "Florida"),
+]
+
+
+# ==============================
+# SYNTHETIC DATA
+# ==============================
+def synth_players(n: int, path: str, seed: int = 0, block: int = 100_000):
+    """
+    Write n rows in the players.txt layout (tab separated, header row).
+    Deterministic for a given seed, written in blocks of rows.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(HEADER + "\n")
+        for start in range(0, n, block):
+            m = min(block, n - start)
+            first = rng.integers(len(FIRST_NAMES), size=m)
+            last = rng.integers(len(LAST_NAMES), size=m)
+            college = rng.integers(len(COLLEGES), size=m)
+            city = rng.integers(len(CITIES), size=m)
+            height = rng.integers(160, 232, size=m)
+            weight = height - 100 + rng.integers(-15, 30, size=m)
+            born = rng.integers(1930, 2004, size=m)
+            f.writelines(
+                f"{start + j}\t{FIRST_NAMES[first[j]]} {LAST_NAMES[last[j]]}\t{height[j]}\t{weight[j]}\t"
+                f"{COLLEGES[college[j]]}\t{born[j]}\t{CITIES[city[j]][0]}\t{CITIES[city[j]][1]}\n"
+                for j in range(m)
+            )
+
+
+def corpus_dir(n: int, seed: int = 0) -> str:
+    """
+    Folder holding the n-row corpus, generated on first use.
+    """
+    folder = os.path.join(BENCH_DATA_DIR, f"players_{n}_s{seed}")
+    path = os.path.join(folder, "players.txt")
+    if not os.path.exists(path):
+        print(f"📝 Generating {n} synthetic rows in {path}")
+        synth_players(n, path + ".tmp", seed)
+        os.replace(path + ".tmp", path)
+    return folder
+
+
+def synth_queries(n: int, seed: int = 1) -> List[str]:
+    rng = np.random.default_rng(seed)
+    templates = [
+        lambda: f"Which players were born in {CITIES[rng.integers(len(CITIES))][0]}?",
+        lambda: f"Who played college basketball at {COLLEGES[rng.integers(len(COLLEGES))]}?",
+        lambda: f"How tall is {FIRST_NAMES[rng.integers(len(FIRST_NAMES))]} "
+                f"{LAST_NAMES[rng.integers(len(LAST_NAMES))]}?",
+        lambda: f"Players from {CITIES[rng.integers(len(CITIES))][1]} born after {rng.integers(1950, 2000)}",
+    ]
+    return [templates[i % len(templates)]() for i in range(n)]
+
+
+# ==============================
+# MEASUREMENT
+# ==============================
+def rss_mb() -> Optional[float]:
+    """
+    Current resident set size of this process, None if unknown.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return None
+
+
+class RssSampler:
+    """
+    Polls rss_mb() in a background thread; peak_mb is the highest value
+    seen between start() and stop().
+    """
+    def __init__(self, interval: float = RSS_INTERVAL_S):
+        self.interval = interval
+        self.peak_mb = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            now = rss_mb()
+            if now is not None and (self.peak_mb is None or now > self.peak_mb):
+                self.peak_mb = now
+
+    def start(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Optional[float]:
+        self._stop.set()
+        self._thread.join()
+        now = rss_mb()
+        if now is not None and (self.peak_mb is None or now > self.peak_mb):
+            self.peak_mb = now
+        return self.peak_mb
+
+
+class Stage:
+    """
+    One timed stage. Wrap each unit of work in timed(items); only time
+    spent inside timed() counts towards throughput and latency.
+
+        with Stage("embed") as stage:
+            for batch in batches:
+                with stage.timed(len(batch)):
+                    embed(batch)
+        results.append(stage.result())
+    """
+    def __init__(self, name: str, **extra):
+        self.name = name
+        self.extra = extra
+        self.latencies_ms: List[float] = []
+        self.items = 0
+        self.peak_rss_mb: Optional[float] = None
+        self._sampler: Optional[RssSampler] = None
+
+    def __enter__(self) -> "Stage":
+        self._sampler = RssSampler().start()
+        return self
+
+    def __exit__(self, *exc):
+        self.peak_rss_mb = self._sampler.stop()
+
+    @contextmanager
+    def timed(self, items: int = 1):
+        start = time.perf_counter()
+        yield
+        self.latencies_ms.append((time.perf_counter() - start) * 1000)
+        self.items += items
+
+    def result(self) -> Dict:
+        lat = np.asarray(self.latencies_ms or [0.0])
+        seconds = lat.sum() / 1000
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "calls": len(self.latencies_ms),
+            "seconds": round(float(seconds), 4),
+            "throughput": round(self.items / seconds, 2) if seconds else None,
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            **self.extra,
+        }
+
+
+def skipped(name: str, reason: str) -> Dict:
+    print(f"⏭️  {name}: skipped ({reason})")
+    return {"stage": name, "skipped": reason}
+
+
+def recall_at_k(found: List[List[int]], truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(t[:k].tolist())) for f, t in zip(found, truth))
+    return round(hits / (len(found) * k), 4) if found else 0.0
+
+
+# ==============================
+# STAGES
+# ==============================
+def bench_ingest(folder: str, batch_size: int) -> List[Dict]:
+    from milestone1 import ingest_txt_files, normalize_text
+
+    out = []
+    with Stage("ingest_txt_files") as stage:
+        with stage.timed():
+            records = ingest_txt_files(folder)
+        stage.items = sum(r["cleaned_text"].count("\n") for r in records)
+    out.append(stage.result())
+    del records
+
+    with open(os.path.join(folder, "players.txt"), "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    with Stage("normalize_text", batch_rows=batch_size) as stage:
+        for start in range(0, len(lines), batch_size):
+            text = "".join(lines[start:start + batch_size])
+            with stage.timed(min(batch_size, len(lines) - start)):
+                normalize_text(text)
+    out.append(stage.result())
+    return out
+
+
+def bench_extract(folder: str, limit: int, batch_size: int) -> List[Dict]:
+    try:
+        import milestone2
+    except (ImportError, OSError) as e:  # spaCy or en_core_web_sm missing
+        return [skipped("process_dataset", str(e))]
+
+    with open(os.path.join(folder, "players.txt"), "r", encoding="utf-8") as f:
+        next(f)
+        lines = [line for _, line in zip(range(limit), f)]
+    with Stage("process_dataset", batch_rows=batch_size) as stage:
+        triplets = 0
+        for start in range(0, len(lines), batch_size):
+            records = [{
+                "id": start,
+                "source_file": "players.txt",
+                "content": milestone2.clean_text("".join(lines[start:start + batch_size]), keep_lines=True),
+            }]
+            with stage.timed(min(batch_size, len(lines) - start)):
+                _, store = milestone2.process_dataset(records)
+            triplets += len(store)
+        stage.extra["triplets"] = triplets
+    return [stage.result()]
+
+
+def bench_embed(folder: str, limit: Optional[int], batch_size: int, warm_cache: bool):
+    """
+    Returns ([stage result], texts, embeddings); the embeddings feed the
+    index stages.
+    """
+    import milestone3
+    from embedding_cache import EmbeddingCache
+
+    if not warm_cache:
+        # a cold cache, so every text is really encoded
+        milestone3.embedding_cache = EmbeddingCache(milestone3.EMBED_MODEL, cache_dir=tempfile.mkdtemp())
+    chunks = iter_folder_chunks(folder, mode="row")
+    if limit is not None:
+        chunks = (c for _, c in zip(range(limit), chunks))
+
+    texts: List[str] = []
+    parts: List[np.ndarray] = []
+    load_ms = None
+    with Stage("generate_embeddings", batch_rows=batch_size) as stage:
+        for batch in batched(chunks, batch_size):
+            batch_texts = [c["text"] for c in batch]
+            if load_ms is None:
+                # model load is not part of the per-batch numbers
+                milestone3.embedder.get()
+                load_ms = milestone3.embedder.load_ms
+            with stage.timed(len(batch_texts)):
+                vectors = milestone3.generate_embeddings(batch_texts, batch_size=min(batch_size, 256))
+            texts.extend(batch_texts)
+            parts.append(vectors)
+        stage.extra["model_load_ms"] = load_ms
+    embeddings = np.vstack(parts).astype("float32") if parts else np.zeros((0, 0), "float32")
+    return [stage.result()], texts, embeddings
+
+
+def bench_index(texts: List[str], embeddings: np.ndarray, specs, queries: List[str],
+                k: int, batch_size: int):
+    """
+    Returns ([stage results], flat VectorStore) for the answer stage.
+    Quantized stores are saved to a temporary directory first so their
+    searches rescore from the memory-mapped float32 file.
+    """
+    import milestone3
+    from ann_index import index_bytes
+
+    query_emb = milestone3.generate_embeddings(queries)
+    exact = faiss.IndexFlatL2(embeddings.shape[1])
+    exact.add(embeddings)
+    _, truth = exact.search(query_emb, k)
+    del exact
+
+    out, flat_store = [], None
+    tmp_dir = tempfile.mkdtemp()
+    for spec in specs:
+        label = spec["type"] + (f"-{spec['quantize']}" if spec.get("quantize") else "")
+        with Stage(f"index_add[{label}]", spec=spec) as stage:
+            store = milestone3.VectorStore(embeddings.shape[1], spec)
+            for start in range(0, len(texts), batch_size):
+                end = min(start + batch_size, len(texts))
+                with stage.timed(end - start):
+                    store.add(embeddings[start:end], texts[start:end])
+            with stage.timed(0):
+                store.flush()  # IVF trains here when the corpus is small
+            if spec.get("quantize"):
+                with stage.timed(0):
+                    store.save_index(os.path.join(tmp_dir, f"{label}.index"))
+            stage.extra["index_mb"] = round(index_bytes(store.index) / 2**20, 2)
+        out.append(stage.result())
+
+        found = []
+        with Stage(f"search[{label}]", spec=spec, k=k) as stage:
+            for q in query_emb:
+                with stage.timed():
+                    found.append(store.search_ids(q.reshape(1, -1), k))
+            stage.extra["recall_at_k"] = recall_at_k(found, truth, k)
+        out.append(stage.result())
+        print(f"   {label}: recall@{k} = {stage.extra['recall_at_k']}, index {out[-2]['index_mb']} MB")
+
+        if label == "flat":
+            flat_store = store
+        else:
+            del store
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return out, flat_store
+
+
+def bench_answer(store, queries: List[str]) -> List[Dict]:
+    import milestone3
+
+    try:
+        milestone3.generator.get()
+        milestone3.packer.get()
+    except ImportError as e:
+        return [skipped("rag_answer", str(e))]
+    with Stage("rag_answer", model_load_ms=milestone3.generator.load_ms) as stage:
+        for q in queries:
+            with stage.timed():
+                milestone3.rag_answer(q, store)
+    return [stage.result()]
+
+
+# ==============================
+# RUN
+# ==============================
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "faiss": getattr(faiss, "__version__", None),
+    }
+
+
+def run_size(n: int, args) -> Dict:
+    print(f"\n📏 {n} rows")
+    folder = corpus_dir(n, args.seed)
+    stages: List[Dict] = []
+    skip = set(args.skip)
+
+    if "ingest" not in skip:
+        stages += bench_ingest(folder, args.batch_size)
+    if "extract" not in skip:
+        stages += bench_extract(folder, min(n, args.extract_limit), args.batch_size)
+
+    needs_vectors = {"embed", "index", "answer"} - skip
+    if needs_vectors:
+        embed_stage, texts, embeddings = bench_embed(folder, args.embed_limit, args.batch_size, args.warm_cache)
+        stages += embed_stage if "embed" not in skip else []
+        if {"index", "answer"} - skip:
+            queries = synth_queries(args.queries, args.seed + 1)
+            specs = INDEX_SPECS if "index" not in skip else ({"type": "flat"},)
+            index_stages, flat_store = bench_index(texts, embeddings, specs, queries, args.k, args.batch_size)
+            stages += index_stages if "index" not in skip else []
+            del embeddings
+            if "answer" not in skip:
+                stages += bench_answer(flat_store, queries[:args.answers])
+
+    for s in stages:
+        if "skipped" not in s:
+            print(f"   {s['stage']:<24} {s['throughput'] or 0:>12.1f}/s  p50 {s['p50_ms']:>9.3f} ms  "
+                  f"p95 {s['p95_ms']:>9.3f} ms  p99 {s['p99_ms']:>9.3f} ms  rss {s['peak_rss_mb']} MB")
+    return {"rows": n, "stages": stages}
+
+
+def compare(old_path: str, new_path: str, threshold: float = REGRESSION_PCT) -> int:
+    """
+    Print per-stage changes between two result files. Returns the number
+    of regressions (throughput down or p95 up by more than threshold %).
+    """
+    def load(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {(run["rows"], s["stage"]): s for run in data["runs"] for s in run["stages"] if "skipped" not in s}
+
+    def pct(a, b):
+        return (b - a) / a * 100 if a else 0.0
+
+    old, new = load(old_path), load(new_path)
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        tp = pct(a["throughput"] or 0, b["throughput"] or 0)
+        p95 = pct(a["p95_ms"], b["p95_ms"])
+        bad = tp < -threshold or p95 > threshold
+        regressions += bad
+        recall = ""
+        if "recall_at_k" in a:
+            recall = f"  recall {a['recall_at_k']} -> {b['recall_at_k']}"
+        print(f"{'❌' if bad else '  '} {key[0]:>9} {key[1]:<24} throughput {tp:+7.1f}%  p95 {p95:+7.1f}%{recall}")
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"   {key[0]:>9} {key[1]:<24} only in {'old' if key in old else 'new'}")
+    print(f"\n{regressions} regression(s) over {threshold}%")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG pipeline benchmark on synthetic player corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--skip", nargs="*", default=[], choices=STAGES)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--queries", type=int, default=N_QUERIES)
+    parser.add_argument("--answers", type=int, default=N_ANSWERS)
+    parser.add_argument("-k", type=int, default=K)
+    parser.add_argument("--extract-limit", type=int, default=EXTRACT_LIMIT)
+    parser.add_argument("--embed-limit", type=int, default=None,
+                        help="embed / index only the first N rows of each corpus")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the on-disk embedding cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--threshold", type=float, default=REGRESSION_PCT)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, threshold=args.threshold) else 0
+
+    results = {"environment": environment(), "config": vars(args), "runs": []}
+    for n in args.sizes:
+        results["runs"].append(run_size(n, args))
+
+    out = args.out or os.path.join(BENCH_OUT_DIR, f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Saved {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
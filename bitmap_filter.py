@@ -0,0 +1,232 @@
+import os
+import faiss
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from ann_index import base_index, search_params, supports_selector
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# Attributes a search can be filtered on. source_file comes from the
+# metadata store; the others from typed player tables (players_table)
+# for chunks that cover rows of a players file.
+FILTER_ATTRIBUTES = ("source_file", "state", "city", "college")
+BITMAPS_FILE = "bitmaps.npz"
+KEY_SEP = "\x1f"
+
+# when a filtered ANN search comes back short, nprobe / efSearch are
+# multiplied by this until the index is searched exhaustively
+ESCALATION = 4
+
+Filters = Dict[str, Union[str, Iterable[str]]]
+
+
+# ==============================
+# BITMAP INDEX
+# ==============================
+class BitmapIndex:
+    """
+    One packed bitmap over chunk ids per (attribute, value). Bit i is
+    (bitmap[i >> 3] >> (i & 7)) & 1, the layout faiss.IDSelectorBitmap
+    reads, so a combined filter can be handed to FAISS as is.
+    """
+    def __init__(self, n_ids: int, bitmaps: Dict[str, Dict[str, np.ndarray]]):
+        self.n_ids = n_ids
+        self.bitmaps = bitmaps
+
+    # ---------- build ----------
+    @classmethod
+    def build(cls, metadata, tables: Optional[Dict] = None,
+              attributes: Tuple[str, ...] = FILTER_ATTRIBUTES) -> "BitmapIndex":
+        """
+        metadata: a metadata_store.MetadataStore
+        tables:   {source_file: PlayersTable}; chunk rows [row_start, row_end)
+                  of that file are looked up in the table (a multi-row chunk
+                  matches every value any of its rows has)
+        """
+        tables = tables or {}
+        ids = np.asarray(metadata.ids, dtype="int64")
+        n_ids = int(ids.max()) + 1 if len(ids) else 0
+        bools: Dict[str, Dict[str, np.ndarray]] = {a: {} for a in attributes}
+
+        def mark(attr, value, chunk_ids):
+            if not value:
+                return
+            value = str(value).lower()
+            bits = bools[attr].get(value)
+            if bits is None:
+                bits = bools[attr][value] = np.zeros(n_ids, dtype=bool)
+            bits[chunk_ids] = True
+
+        if "source_file" in attributes and "source_file" in metadata.columns:
+            codes = np.asarray(metadata.columns["source_file"])
+            for code, value in enumerate(metadata.fields["source_file"]["values"]):
+                mark("source_file", value, ids[codes == code])
+
+        player_attrs = [a for a in attributes if a != "source_file"]
+        if tables and player_attrs and "row_start" in metadata.columns:
+            codes = np.asarray(metadata.columns["source_file"])
+            starts = np.asarray(metadata.columns["row_start"])
+            ends = np.asarray(metadata.columns["row_end"])
+            for code, source in enumerate(metadata.fields["source_file"]["values"]):
+                table = tables.get(source)
+                if table is None:
+                    continue
+                pos = np.flatnonzero((codes == code) & (starts >= 0))
+                single = pos[ends[pos] - starts[pos] == 1]
+                multi = pos[ends[pos] - starts[pos] > 1]
+                for attr in player_attrs:
+                    column = table.columns[attr]
+                    values = table.categories[attr]
+                    # one row per chunk: vectorized by category code
+                    rows = starts[single]
+                    ok = rows < len(column)
+                    for c in np.unique(column[rows[ok]]):
+                        mark(attr, values[c], ids[single[ok]][column[rows[ok]] == c])
+                    for p in multi:
+                        for c in set(column[starts[p]:min(ends[p], len(column))].tolist()):
+                            mark(attr, values[c], ids[p:p + 1])
+
+        bitmaps = {
+            attr: {v: np.packbits(bits, bitorder="little") for v, bits in values.items()}
+            for attr, values in bools.items()
+        }
+        return cls(n_ids, bitmaps)
+
+    # ---------- persistence ----------
+    def save(self, path: str):
+        arrays = {"__n_ids__": np.asarray([self.n_ids], dtype="int64")}
+        for attr, values in self.bitmaps.items():
+            for value, bitmap in values.items():
+                arrays[attr + KEY_SEP + value] = bitmap
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "BitmapIndex":
+        data = np.load(path)
+        bitmaps: Dict[str, Dict[str, np.ndarray]] = {}
+        for key in data.files:
+            if key == "__n_ids__":
+                continue
+            attr, value = key.split(KEY_SEP, 1)
+            bitmaps.setdefault(attr, {})[value] = data[key]
+        return cls(int(data["__n_ids__"][0]), bitmaps)
+
+    # ---------- queries ----------
+    def values(self, attr: str) -> List[str]:
+        return sorted(self.bitmaps.get(attr, {}))
+
+    def empty(self) -> np.ndarray:
+        return np.zeros((self.n_ids + 7) // 8, dtype="uint8")
+
+    def mask(self, filters: Filters) -> np.ndarray:
+        """
+        AND across attributes, OR across the values of one attribute.
+        Unknown values select nothing.
+        """
+        result = None
+        for attr, wanted in filters.items():
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            union = self.empty()
+            for value in wanted:
+                bitmap = self.bitmaps.get(attr, {}).get(str(value).lower())
+                if bitmap is not None:
+                    union |= bitmap
+            result = union if result is None else result & union
+        return result if result is not None else np.packbits(np.ones(self.n_ids, dtype=bool), bitorder="little")
+
+    @staticmethod
+    def count(mask: np.ndarray) -> int:
+        return int(np.unpackbits(mask).sum())
+
+
+def ids_in(mask: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(mask, bitorder="little")).astype("int64")
+
+
+def load_bitmaps(metadata_dir: str) -> Optional[BitmapIndex]:
+    path = os.path.join(metadata_dir, BITMAPS_FILE)
+    return BitmapIndex.load(path) if os.path.exists(path) else None
+
+
+# ==============================
+# FILTERED SEARCH
+# ==============================
+def _exact_over(index: faiss.Index, query: np.ndarray, ids: np.ndarray, k: int):
+    """
+    Exact L2 search over a small explicit id set (needs reconstruct by id).
+    """
+    vectors = np.vstack([index.reconstruct(int(i)) for i in ids])
+    dist = ((vectors - query[0]) ** 2).sum(axis=1)
+    top = np.argsort(dist)[:k]
+    D = np.full((1, k), np.inf, dtype="float32")
+    I = np.full((1, k), -1, dtype="int64")
+    D[0, :len(top)] = dist[top]
+    I[0, :len(top)] = ids[top]
+    return D, I
+
+
+def _post_filtered(index: faiss.Index, query: np.ndarray, k: int, mask: np.ndarray, want: int):
+    """
+    For indexes that take no IDSelector (binary codes): search unfiltered
+    and drop unselected ids, fetching ESCALATION times more until `want`
+    hits survive or the whole index was returned.
+    """
+    bits = np.unpackbits(mask, bitorder="little")
+    fetch = k
+    while True:
+        fetch = min(fetch, index.ntotal)
+        D, I = index.search(query, fetch)
+        ids = I[0]
+        keep = (ids >= 0) & (ids < len(bits))
+        keep[keep] = bits[ids[keep]].astype(bool)
+        if keep.sum() >= want or fetch >= index.ntotal:
+            break
+        fetch *= ESCALATION
+    D_out = np.full((1, k), np.inf, dtype="float32")
+    I_out = np.full((1, k), -1, dtype="int64")
+    hits = np.flatnonzero(keep)[:k]
+    D_out[0, :len(hits)] = D[0, hits]
+    I_out[0, :len(hits)] = ids[hits]
+    return D_out, I_out
+
+
+def filtered_search(index: faiss.Index, query: np.ndarray, k: int, mask: np.ndarray,
+                    nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    index.search restricted to the ids set in `mask` through an
+    IDSelectorBitmap. If an approximate index returns fewer than
+    min(k, selected) hits, nprobe / efSearch are escalated until the
+    search is exhaustive, so valid hits are never dropped.
+    Returns (D, I) like index.search.
+    """
+    selected = BitmapIndex.count(mask)
+    want = min(k, selected)
+    if want == 0:
+        return np.full((1, k), np.inf, dtype="float32"), np.full((1, k), -1, dtype="int64")
+
+    mask = np.ascontiguousarray(mask, dtype="uint8")
+    if not supports_selector(index):
+        return _post_filtered(index, query, k, mask, want)
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(mask))
+    inner = faiss.downcast_index(base_index(index))
+
+    while True:
+        params = search_params(index, nprobe=nprobe, ef_search=ef_search, selector=selector)
+        D, I = index.search(query, k, params=params)
+        if (I[0] >= 0).sum() >= want:
+            return D, I
+        if isinstance(inner, faiss.IndexIVF):
+            current = nprobe or inner.nprobe
+            if current >= inner.nlist:
+                return D, I
+            nprobe = min(inner.nlist, current * ESCALATION)
+        elif isinstance(inner, faiss.IndexHNSW):
+            current = ef_search or inner.hnsw.efSearch
+            if current >= index.ntotal:
+                return _exact_over(index, query, ids_in(mask), k)
+            ef_search = min(index.ntotal, max(current * ESCALATION, k))
+        else:
+            return D, I
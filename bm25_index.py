@@ -0,0 +1,201 @@
+import os
+import re
+import numpy as np
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# Sparse (lexical) index next to the FAISS index. Stored as one .npz in
+# the metadata directory:
+#   terms     -> vocabulary, sorted (binary search on lookup)
+#   offsets   -> uint64, len(terms) + 1 byte offsets into postings
+#   df        -> uint32 document frequency per term
+#   postings  -> uint8, per term the (doc id gap, tf) pairs as varints
+#   doc_len   -> uint32 token count per chunk id (0 = no such chunk)
+BM25_FILE = "bm25.npz"
+K1 = 1.2
+B = 0.75
+
+# reciprocal-rank fusion constant (score = sum w / (RRF_K + rank))
+RRF_K = 60
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+# ==============================
+# VARINT POSTINGS
+# ==============================
+def encode_varints(values: Sequence[int], out: bytearray):
+    """
+    7 bits per byte, high bit set on every byte but the last of a value.
+    """
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7F) | 0x80)
+            v >>= 7
+        out.append(v)
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """
+    Vectorized inverse of encode_varints for a whole postings list.
+    """
+    if not len(data):
+        return np.zeros(0, dtype="int64")
+    data = data.astype("int64")
+    last = data < 0x80
+    value_idx = np.concatenate(([0], np.cumsum(last[:-1])))
+    starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    shift = 7 * (np.arange(len(data)) - starts[value_idx])
+    return np.bincount(value_idx, weights=(data & 0x7F) << shift).astype("int64")
+
+
+# ==============================
+# BUILD
+# ==============================
+def build_bm25(entries: Iterable[Tuple[int, str]]) -> "BM25Index":
+    """
+    entries: (chunk_id, text) in increasing chunk id order.
+    """
+    postings: Dict[str, array] = defaultdict(lambda: array("q"))
+    ids = array("q")
+    lengths = array("I")
+    for chunk_id, text in entries:
+        tokens = tokenize(text)
+        ids.append(chunk_id)
+        lengths.append(len(tokens))
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            p = postings[t]
+            p.append(chunk_id)
+            p.append(tf)
+
+    n_ids = (max(ids) + 1) if ids else 0
+    doc_len = np.zeros(n_ids, dtype="uint32")
+    doc_len[np.asarray(ids, dtype="int64")] = np.asarray(lengths, dtype="uint32")
+
+    terms = sorted(postings)
+    blob = bytearray()
+    offsets = np.zeros(len(terms) + 1, dtype="uint64")
+    df = np.zeros(len(terms), dtype="uint32")
+    for i, t in enumerate(terms):
+        p = postings[t]
+        doc_ids, tfs = p[0::2], p[1::2]
+        gaps = [doc_ids[0]] + [b - a for a, b in zip(doc_ids, doc_ids[1:])]
+        pairs = [v for pair in zip(gaps, tfs) for v in pair]
+        encode_varints(pairs, blob)
+        offsets[i + 1] = len(blob)
+        df[i] = len(doc_ids)
+
+    return BM25Index(
+        np.asarray(terms, dtype=str), offsets, df, np.frombuffer(bytes(blob), dtype="uint8"), doc_len
+    )
+
+
+# ==============================
+# INDEX
+# ==============================
+class BM25Index:
+    """
+    Okapi BM25 over chunk ids with delta + varint compressed postings.
+    Scores are accumulated into a dense array over chunk ids, so a
+    query costs one decode + one scatter-add per query term.
+    """
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, df: np.ndarray,
+                 postings: np.ndarray, doc_len: np.ndarray):
+        self.terms = terms
+        self.offsets = offsets
+        self.df = df
+        self.postings = postings
+        self.doc_len = doc_len
+        self.n_docs = int((doc_len > 0).sum())
+        self.avg_len = float(doc_len.sum()) / max(self.n_docs, 1)
+        # per-doc part of the BM25 denominator, computed once
+        self._norm = (K1 * (1 - B + B * doc_len / max(self.avg_len, 1e-9))).astype("float32")
+
+    def __len__(self):
+        return self.n_docs
+
+    # ---------- persistence ----------
+    def save(self, path: str):
+        np.savez(path, terms=self.terms, offsets=self.offsets, df=self.df,
+                 postings=self.postings, doc_len=self.doc_len)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        data = np.load(path)
+        return cls(data["terms"], data["offsets"], data["df"], data["postings"], data["doc_len"])
+
+    # ---------- lookup ----------
+    def term_id(self, term: str) -> int:
+        i = int(np.searchsorted(self.terms, term))
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def posting(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (chunk ids, term frequencies) of one term.
+        """
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        pairs = decode_varints(self.postings[start:end])
+        return np.cumsum(pairs[0::2]), pairs[1::2]
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.doc_len), dtype="float32")
+        for t in set(tokenize(query)):
+            tid = self.term_id(t)
+            if tid < 0:
+                continue
+            df = float(self.df[tid])
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            ids, tf = self.posting(tid)
+            scores[ids] += idf * tf * (K1 + 1) / (tf + self._norm[ids])
+        return scores
+
+    def search(self, query: str, k: int = 10, mask: Optional[np.ndarray] = None):
+        """
+        Top-k (scores, chunk ids) with a positive score. `mask` is a
+        packed bitmap over chunk ids (bitmap_filter.BitmapIndex.mask).
+        """
+        scores = self.scores(query)
+        if mask is not None:
+            keep = np.unpackbits(mask, bitorder="little", count=len(scores)).astype(bool)
+            scores[~keep] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return scores[hits], hits
+
+
+def load_bm25(metadata_dir: str) -> Optional[BM25Index]:
+    path = os.path.join(metadata_dir, BM25_FILE)
+    return BM25Index.load(path) if os.path.exists(path) else None
+
+
+# ==============================
+# FUSION
+# ==============================
+def rrf_fuse(rankings: Sequence[Sequence[int]], k: int = 10, rrf_k: int = RRF_K,
+             weights: Optional[Sequence[float]] = None) -> List[Tuple[int, float]]:
+    """
+    Reciprocal-rank fusion of several ranked id lists (-1 entries are
+    ignored). weights scale each list's contribution, e.g. (1.0, 0.5)
+    to favour the first retriever. Returns [(id, score)] best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for ranking, w in zip(rankings, weights):
+        for rank, i in enumerate(ranking):
+            i = int(i)
+            if i >= 0:
+                fused[i] = fused.get(i, 0.0) + w / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda x: -x[1])[:k]
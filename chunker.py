@@ -0,0 +1,194 @@
+import os
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# "row"    -> one chunk per data row
+# "rows"   -> one chunk per `rows_per_chunk` data rows
+# "tokens" -> sliding window of `window_tokens` tokens with `overlap`
+CHUNK_MODES = ("row", "rows", "tokens")
+
+DEFAULT_BATCH_SIZE = 256
+
+TOKEN_RE = re.compile(r"\S+")
+
+
+# ==============================
+# LINE STREAMING
+# ==============================
+def iter_lines(file_path: str) -> Iterator[Tuple[str, int, int]]:
+    """
+    Stream a text file line by line.
+    Yields (line, start, end) where start/end are character offsets
+    into the file and the line has its newline stripped.
+    """
+    offset = 0
+    with open(file_path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            yield line, offset, offset + len(line)
+            offset += len(raw)
+
+
+def looks_like_header(line: str) -> bool:
+    """
+    A tab separated line with no purely numeric field is treated as the
+    table header (e.g. "Player\theight\tweight\t...").
+    """
+    if "\t" not in line:
+        return False
+    fields = [f.strip() for f in line.split("\t") if f.strip()]
+    return bool(fields) and not any(f.isdigit() for f in fields)
+
+
+def iter_rows(file_path: str, skip_header: bool = True) -> Iterator[Tuple[int, str, int, int]]:
+    """
+    Yields (row_number, line, start, end) for every non-empty line.
+    The header line (if detected) is skipped and does not get a row number.
+    """
+    row = 0
+    first = True
+    for line, start, end in iter_lines(file_path):
+        if not line.strip():
+            continue
+        if first:
+            first = False
+            if skip_header and looks_like_header(line):
+                continue
+        yield row, line, start, end
+        row += 1
+
+
+def read_header(file_path: str) -> str:
+    for line, _, _ in iter_lines(file_path):
+        if line.strip():
+            return line if looks_like_header(line) else ""
+    return ""
+
+
+# ==============================
+# CHUNKING
+# ==============================
+def _make_chunk(source_file, text, start, end, row_start, row_end, header=""):
+    if header:
+        text = header + "\n" + text
+    return {
+        "source_file": source_file,
+        "text": text,
+        "start": start,
+        "end": end,
+        "row_start": row_start,
+        "row_end": row_end,
+    }
+
+
+def _chunk_rows(file_path, source_file, rows_per_chunk, header):
+    rows: List[Tuple[int, str, int, int]] = []
+    for item in iter_rows(file_path):
+        rows.append(item)
+        if len(rows) == rows_per_chunk:
+            yield _make_chunk(
+                source_file,
+                "\n".join(r[1] for r in rows),
+                rows[0][2], rows[-1][3],
+                rows[0][0], rows[-1][0] + 1,
+                header,
+            )
+            rows = []
+    if rows:
+        yield _make_chunk(
+            source_file,
+            "\n".join(r[1] for r in rows),
+            rows[0][2], rows[-1][3],
+            rows[0][0], rows[-1][0] + 1,
+            header,
+        )
+
+
+def _chunk_tokens(file_path, source_file, window_tokens, overlap, header):
+    # each entry: (token, start, end, row)
+    window: deque = deque()
+    fresh = 0  # tokens in the window not yet emitted in a previous chunk
+
+    def emit():
+        return _make_chunk(
+            source_file,
+            " ".join(t[0] for t in window),
+            window[0][1], window[-1][2],
+            window[0][3], window[-1][3] + 1,
+            header,
+        )
+
+    for row, line, start, _ in iter_rows(file_path):
+        for m in TOKEN_RE.finditer(line):
+            window.append((m.group(), start + m.start(), start + m.end(), row))
+            fresh += 1
+            if len(window) == window_tokens:
+                yield emit()
+                for _ in range(window_tokens - overlap):
+                    window.popleft()
+                fresh = 0
+    if fresh:
+        yield emit()
+
+
+def iter_chunks(
+    file_path: str,
+    mode: str = "row",
+    rows_per_chunk: int = 1,
+    window_tokens: int = 128,
+    overlap: int = 32,
+    include_header: bool = False,
+) -> Iterator[Dict]:
+    """
+    Stream one file into chunks. Every chunk carries its source file,
+    character offsets (start/end) and row range (row_start inclusive,
+    row_end exclusive). Chunk ids are assigned by iter_folder_chunks.
+    """
+    if mode not in CHUNK_MODES:
+        raise ValueError(f"mode must be one of {CHUNK_MODES}, got {mode!r}")
+
+    source_file = os.path.basename(file_path)
+    header = read_header(file_path) if include_header else ""
+
+    if mode == "tokens":
+        if window_tokens <= 0 or not 0 <= overlap < window_tokens:
+            raise ValueError("need window_tokens > 0 and 0 <= overlap < window_tokens")
+        return _chunk_tokens(file_path, source_file, window_tokens, overlap, header)
+
+    size = 1 if mode == "row" else rows_per_chunk
+    if size <= 0:
+        raise ValueError("rows_per_chunk must be > 0")
+    return _chunk_rows(file_path, source_file, size, header)
+
+
+def iter_folder_chunks(folder_path: str, **chunk_opts) -> Iterator[Dict]:
+    """
+    Stream every .txt file of a folder through iter_chunks and assign
+    sequential chunk ids across the whole folder.
+    """
+    chunk_id = 0
+    for file_name in sorted(os.listdir(folder_path)):
+        if not file_name.endswith(".txt"):
+            continue
+        for chunk in iter_chunks(os.path.join(folder_path, file_name), **chunk_opts):
+            chunk["id"] = chunk_id
+            chunk_id += 1
+            yield chunk
+
+
+# ==============================
+# BATCHING
+# ==============================
+def batched(items: Iterable, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
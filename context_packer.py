@@ -0,0 +1,128 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# used when the tokenizer does not know its model's input limit
+DEFAULT_MAX_INPUT_TOKENS = 512
+# slack for special tokens and separators the per-chunk counts miss
+SAFETY_TOKENS = 8
+TOKEN_CACHE_SIZE = 8192
+SEPARATOR = "\n"
+
+
+def input_budget(generator, max_new_tokens: int = 0) -> int:
+    """
+    Prompt tokens a text-generation / text2text pipeline can take.
+    Decoder-only models (gpt2) share their window with the answer, so
+    max_new_tokens is reserved for it.
+    """
+    limit = getattr(generator.tokenizer, "model_max_length", None)
+    if not limit or limit > 100_000:  # "no limit" sentinel of some tokenizers
+        limit = getattr(generator.model.config, "n_positions", None) or DEFAULT_MAX_INPUT_TOKENS
+    if not generator.model.config.is_encoder_decoder:
+        limit -= max_new_tokens
+    return limit
+
+
+# ==============================
+# PACKER
+# ==============================
+class ContextPacker:
+    """
+    Fills a prompt template with as many retrieved chunks as fit in
+    max_input_tokens, best score first. Duplicate chunks (same id or same
+    normalized text) are skipped, a chunk that does not fit is skipped in
+    favour of smaller lower-ranked ones, and the top chunk is truncated
+    rather than dropped if it alone is over budget.
+    Token ids of chunks are kept in an LRU cache keyed by a hash of the
+    text, so popular chunks are tokenized once.
+    """
+    def __init__(self, tokenizer, max_input_tokens: int, template: str,
+                 cache_size: int = TOKEN_CACHE_SIZE):
+        self.tokenizer = tokenizer
+        self.max_input_tokens = max_input_tokens
+        self.template = template
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, List[int]]" = OrderedDict()
+        self._sep_tokens = len(self._encode(SEPARATOR))
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    @classmethod
+    def for_generator(cls, generator, template: str, max_new_tokens: int = 0, **kwargs) -> "ContextPacker":
+        return cls(generator.tokenizer, input_budget(generator, max_new_tokens), template, **kwargs)
+
+    def token_ids(self, text: str) -> List[int]:
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        ids = self._cache.get(key)
+        if ids is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return ids
+        self.cache_misses += 1
+        ids = self._encode(text)
+        self._cache[key] = ids
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return ids
+
+    def pack(self, query: str, chunks: Sequence[Dict]) -> Dict:
+        """
+        chunks: [{"text", "id"?, "score"?}], higher score = better (rank
+        order is kept when there are no scores).
+        Returns {"prompt", "context", "used", "tokens", "budget", "dropped"}
+        where used are the chunks that made it into the context.
+        """
+        fixed = len(self._encode(self.template.format(context="", query=query)))
+        budget = self.max_input_tokens - fixed - SAFETY_TOKENS
+
+        ranked = sorted(
+            enumerate(chunks), key=lambda x: (-(x[1].get("score") or 0.0), x[0])
+        )
+        seen_ids, seen_texts = set(), set()
+        used, parts, tokens, dropped = [], [], 0, 0
+        for _, chunk in ranked:
+            text = chunk["text"].strip()
+            norm = " ".join(text.lower().split())
+            if chunk.get("id") in seen_ids or norm in seen_texts:
+                continue
+            seen_texts.add(norm)
+            if chunk.get("id") is not None:
+                seen_ids.add(chunk["id"])
+
+            ids = self.token_ids(text)
+            cost = len(ids) + (self._sep_tokens if parts else 0)
+            if tokens + cost <= budget:
+                parts.append(text)
+                used.append(chunk)
+                tokens += cost
+            elif not parts and budget > 0:
+                # best chunk alone is too long: keep its head
+                parts.append(self.tokenizer.decode(ids[:budget], skip_special_tokens=True))
+                used.append(chunk)
+                tokens = budget
+            else:
+                dropped += 1
+
+        context = SEPARATOR.join(parts)
+        return {
+            "prompt": self.template.format(context=context, query=query),
+            "context": context,
+            "used": used,
+            "tokens": tokens + fixed,
+            "budget": self.max_input_tokens,
+            "dropped": dropped,
+        }
+
+    def stats(self) -> Dict:
+        total = self.cache_hits + self.cache_misses
+        return {
+            "cached_chunks": len(self._cache),
+            "hit_rate": round(self.cache_hits / total, 4) if total else 0.0,
+        }
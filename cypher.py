@@ -1,6 +1,9 @@
 import os
 import re
+import csv
 import pandas as pd
+from typing import Dict, Iterable, Iterator, List, Tuple
+from players_table import COLUMNS as PLAYER_COLUMNS, INT_COLUMNS as PLAYER_INT_COLUMNS, MISSING_INT, detect_players_file, iter_player_rows
 
 # ==============================
 # CONFIGURATION
@@ -10,6 +13,22 @@ OUTPUT_FILE = r"C:\Users\Soumya Shree\OneDrive\Attachments\milestone_2\cypher.cs
 
 # Node label for Neo4j
 NODE_LABEL = "Player"
+# Property used to MERGE nodes (must be unique per node)
+MERGE_KEY = "name"
+
+# "file"      -> write one CREATE statement per row to OUTPUT_FILE (old behaviour)
+# "bolt"      -> load through the Neo4j driver in parameterized UNWIND batches
+# "admin-csv" -> write node / relationship CSVs for `neo4j-admin database import`
+LOAD_MODE = "file"
+BATCH_SIZE = 1000
+ADMIN_CSV_DIR = r"C:\Users\Soumya Shree\OneDrive\Attachments\milestone_2\neo4j_import"
+
+# Triplets written by milestone2 (optional, loaded as relationships)
+TRIPLETS_FILE = "triplets.jsonl"
+
+NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "")
 
 # ==============================
 # TEXT NORMALIZATION
@@ -47,6 +66,33 @@ def parse_txt_to_dict(file_path: str):
     return data_list
 
 
+# ==============================
+# TYPED PLAYER ROWS
+# ==============================
+PLAYER_KEY = "id"
+
+
+def player_props(row: Dict) -> Dict:
+    """
+    Typed players row -> node properties (missing values left out).
+    """
+    return {k: v for k, v in row.items() if v != MISSING_INT and v != ""}
+
+
+def cypher_literal(value) -> str:
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def generate_typed_cypher_queries(rows: Iterable[Dict], node_label=NODE_LABEL):
+    queries = []
+    for row in rows:
+        props = ", ".join(f"{k}: {cypher_literal(v)}" for k, v in player_props(row).items())
+        queries.append({"cypher_query": f"CREATE (:{node_label} {{{props}}});"})
+    return queries
+
+
 # GENERATE CYPHER QUERIES
 # ==============================
 def generate_cypher_queries(data_list, node_label=NODE_LABEL):
@@ -60,10 +106,247 @@ def generate_cypher_queries(data_list, node_label=NODE_LABEL):
     return queries
 
 
+# ==============================
+# BATCHED, PARAMETERIZED LOADING
+# ==============================
+def batched(rows: Iterable, batch_size: int = BATCH_SIZE) -> Iterator[List]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def relationship_type(relation: str) -> str:
+    """
+    Relationship types cannot be query parameters, so they are
+    sanitized into the query text: "associated_with" -> "ASSOCIATED_WITH".
+    """
+    rel = re.sub(r"[^A-Za-z0-9_]", "_", relation).upper()
+    return rel if rel and not rel[0].isdigit() else "REL_" + rel
+
+
+def node_merge_query(node_label: str = NODE_LABEL, key: str = MERGE_KEY) -> str:
+    return (
+        f"UNWIND $rows AS r "
+        f"MERGE (n:{node_label} {{{key}: r.{key}}}) "
+        f"SET n += r"
+    )
+
+
+def triplet_merge_query(relation: str, node_label: str = "Entity") -> str:
+    return (
+        f"UNWIND $rows AS r "
+        f"MERGE (a:{node_label} {{name: r.source}}) "
+        f"MERGE (b:{node_label} {{name: r.target}}) "
+        f"MERGE (a)-[:{relationship_type(relation)}]->(b)"
+    )
+
+
+def ensure_constraint(session, node_label: str = NODE_LABEL, key: str = MERGE_KEY):
+    # MERGE without a uniqueness constraint (and its index) scans all nodes
+    session.run(
+        f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{node_label}) REQUIRE n.{key} IS UNIQUE"
+    )
+
+
+def load_nodes(session, rows: Iterable[Dict], node_label: str = NODE_LABEL,
+               key: str = MERGE_KEY, batch_size: int = BATCH_SIZE) -> int:
+    """
+    MERGE rows as nodes, one round-trip (and one cached query plan) per
+    batch instead of per row. `session` is anything with
+    run(query, parameters), e.g. a neo4j Session or RecordingSession.
+    """
+    query = node_merge_query(node_label, key)
+    count = 0
+    for batch in batched(rows, batch_size):
+        session.run(query, {"rows": batch})
+        count += len(batch)
+    return count
+
+
+def load_triplets(session, triplets: Iterable, node_label: str = "Entity",
+                  batch_size: int = BATCH_SIZE) -> int:
+    """
+    MERGE [source, relation, target] triplets; batches are grouped per
+    relation since the relationship type is part of the query text.
+    """
+    pending: Dict[str, List[Dict]] = {}
+    count = 0
+    for source, relation, target in triplets:
+        batch = pending.setdefault(relation, [])
+        batch.append({"source": source, "target": target})
+        if len(batch) == batch_size:
+            session.run(triplet_merge_query(relation, node_label), {"rows": batch})
+            count += len(batch)
+            pending[relation] = []
+    for relation, batch in pending.items():
+        if batch:
+            session.run(triplet_merge_query(relation, node_label), {"rows": batch})
+            count += len(batch)
+    return count
+
+
+class RecordingSession:
+    """
+    Local stand-in for a Neo4j session: records (query, parameters) of
+    every batch instead of sending it (dry runs and tests).
+    """
+    def __init__(self):
+        self.batches = []
+
+    def run(self, query, parameters=None, **kwargs):
+        self.batches.append((query, dict(parameters or {}, **kwargs)))
+
+    def close(self):
+        pass
+
+
+def open_session(uri: str = NEO4J_URI, user: str = NEO4J_USER, password: str = NEO4J_PASSWORD):
+    from neo4j import GraphDatabase  # only needed for LOAD_MODE = "bolt"
+    driver = GraphDatabase.driver(uri, auth=(user, password))
+    return driver, driver.session()
+
+
+# ==============================
+# NEO4J-ADMIN BULK IMPORT CSVs
+# ==============================
+def write_admin_node_csv(path: str, rows: Iterable[Dict], node_label: str = NODE_LABEL,
+                         key: str = MERGE_KEY, columns: List[str] = None,
+                         int_columns: Iterable[str] = ()) -> int:
+    """
+    Header: <key>:ID(<label>),<other props...>,:LABEL
+    Column set is `columns` or else taken from the first row; props in
+    int_columns are typed as <prop>:int.
+    """
+    count = 0
+    writer = None
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for row in rows:
+            if writer is None:
+                props = [p for p in (columns or row) if p != key]
+                writer = csv.writer(f)
+                header = [f"{p}:int" if p in int_columns else p for p in props]
+                writer.writerow([f"{key}:ID({node_label})"] + header + [":LABEL"])
+            writer.writerow([row.get(key, "")] + [row.get(p, "") for p in props] + [node_label])
+            count += 1
+    return count
+
+
+def write_admin_triplet_csvs(nodes_path: str, rels_path: str, triplets: Iterable,
+                             node_label: str = "Entity") -> int:
+    """
+    Entities get integer ids as they are first seen; relationships
+    reference them with :START_ID / :END_ID.
+    """
+    ids: Dict[str, int] = {}
+    count = 0
+    with open(nodes_path, "w", encoding="utf-8", newline="") as nf, \
+         open(rels_path, "w", encoding="utf-8", newline="") as rf:
+        nodes, rels = csv.writer(nf), csv.writer(rf)
+        nodes.writerow([f"id:ID({node_label})", "name", ":LABEL"])
+        rels.writerow([f":START_ID({node_label})", f":END_ID({node_label})", ":TYPE"])
+        for source, relation, target in triplets:
+            for name in (source, target):
+                if name not in ids:
+                    ids[name] = len(ids)
+                    nodes.writerow([ids[name], name, node_label])
+            rels.writerow([ids[source], ids[target], relationship_type(relation)])
+            count += 1
+    return count
+
+
 # ==============================
 # MAIN PIPELINE
 # ==============================
+def iter_sources(folder_path: str = RAW_DATA_DIR) -> Iterator[Tuple[str, Iterator[Dict], str, List[str]]]:
+    """
+    Yields (file_name, rows, merge_key, columns) per input file. Tab
+    separated players files are parsed into typed rows keyed by player
+    id; other files fall back to name / attribute rows keyed by name.
+    """
+    for file_name in os.listdir(folder_path):
+        file_path = os.path.join(folder_path, file_name)
+        if file_name.endswith(".csv"):
+            print(f"Processing: {file_path}")
+            yield file_name, _iter_csv_rows(file_path), MERGE_KEY, ["name", "attribute"]
+        elif file_name.endswith(".txt"):
+            print(f"Processing: {file_path}")
+            if detect_players_file(file_path):
+                rows = (player_props(r) for r in iter_player_rows(file_path))
+                yield file_name, rows, PLAYER_KEY, PLAYER_COLUMNS
+            else:
+                yield file_name, iter(parse_txt_to_dict(file_path)), MERGE_KEY, ["name", "attribute"]
+
+
+def _iter_csv_rows(file_path: str) -> Iterator[Dict]:
+    for chunk in pd.read_csv(file_path, chunksize=BATCH_SIZE):
+        for row in chunk.itertuples(index=False):
+            yield {
+                "name": str(row[0]),
+                "attribute": str(row[1]) if len(row) > 1 else ""
+            }
+
+
+def load(mode: str = LOAD_MODE):
+    """
+    Non-legacy load modes ("bolt", "admin-csv").
+    """
+    if mode == "admin-csv":
+        os.makedirs(ADMIN_CSV_DIR, exist_ok=True)
+        node_files = []
+        for file_name, rows, key, columns in iter_sources(RAW_DATA_DIR):
+            out = os.path.splitext(file_name)[0] + "_nodes.csv"
+            n = write_admin_node_csv(
+                os.path.join(ADMIN_CSV_DIR, out), rows, key=key, columns=columns,
+                int_columns=PLAYER_INT_COLUMNS if key == PLAYER_KEY else (),
+            )
+            node_files.append(out)
+            print(f"✅ Wrote {n} {NODE_LABEL} nodes to {out}")
+        rel_args = ""
+        if os.path.exists(TRIPLETS_FILE):
+            from jsonl_io import read_json_or_jsonl
+            rel_args = " --nodes=entities.csv --relationships=relationships.csv"
+            n = write_admin_triplet_csvs(
+                os.path.join(ADMIN_CSV_DIR, "entities.csv"),
+                os.path.join(ADMIN_CSV_DIR, "relationships.csv"),
+                read_json_or_jsonl(TRIPLETS_FILE),
+            )
+            print(f"✅ Wrote {n} relationships to {ADMIN_CSV_DIR}")
+        nodes = " ".join(f"--nodes={f}" for f in node_files)
+        print(
+            f"Import with: neo4j-admin database import full {nodes}{rel_args} neo4j"
+        )
+        return
+
+    if mode == "bolt":
+        driver, session = open_session()
+        try:
+            ensure_constraint(session, "Entity", "name")
+            for file_name, rows, key, _ in iter_sources(RAW_DATA_DIR):
+                ensure_constraint(session, NODE_LABEL, key)
+                n = load_nodes(session, rows, key=key)
+                print(f"✅ Merged {n} {NODE_LABEL} nodes from {file_name} in batches of {BATCH_SIZE}")
+            if os.path.exists(TRIPLETS_FILE):
+                from jsonl_io import read_json_or_jsonl
+                n = load_triplets(session, read_json_or_jsonl(TRIPLETS_FILE))
+                print(f"✅ Merged {n} relationships")
+        finally:
+            session.close()
+            driver.close()
+        return
+
+    raise ValueError(f"unknown LOAD_MODE {mode!r}")
+
+
 def main():
+    if LOAD_MODE != "file":
+        load(LOAD_MODE)
+        return
+
     all_queries = []
 
     for file_name in os.listdir(RAW_DATA_DIR):
@@ -79,6 +362,10 @@ def main():
                     query = f"CREATE (:{NODE_LABEL} {{name: '{name}', attribute: '{attr}'}});"
                     all_queries.append({"cypher_query": query})
 
+            elif detect_players_file(file_path):
+                # typed columns instead of one lowercased string per row
+                all_queries.extend(generate_typed_cypher_queries(iter_player_rows(file_path)))
+
             else:
                 data_list = parse_txt_to_dict(file_path)
                 all_queries.extend(generate_cypher_queries(data_list))
@@ -0,0 +1,306 @@
+import os
+import re
+import csv
+import sys
+import json
+import hashlib
+import argparse
+import unicodedata
+import numpy as np
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# ==============================
+# CONFIGURATION
+# ==============================
+NUM_PERM = 128
+# 16 bands x 8 rows: pairs above ~0.7 Jaccard almost always share a
+# bucket, pairs below ~0.5 almost never do
+BANDS = 16
+# estimated Jaccard (fraction of equal signature slots) to collapse
+THRESHOLD = 0.8
+# word n-grams; a text shorter than this is one shingle
+SHINGLE_WORDS = 3
+SIGNATURE_BATCH = 256
+
+MINHASH_FILE = "minhash.npz"
+SOURCES_FILE = "sources.json"
+
+PLAYER_ROW = re.compile(r"^(\d+) ((?:\D\S* ?)+?)(?= \d|$)")
+
+
+def normalize_row(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(text.split())
+
+
+def row_group(text: str) -> Optional[str]:
+    """
+    Identity of the player rows in a text: the (leading id, name) of
+    every line that starts with a numeric id, tab or space separated
+    ("3489\tBrandon Knight\t178 ..." or "3489 brandon knight 178 ...").
+    Texts with player rows only collapse onto texts with exactly the same
+    rows, so two different players never merge however similar the rest
+    of their fields is. None for texts without player rows.
+    """
+    keys = []
+    for line in text.split("\n"):
+        m = PLAYER_ROW.match(normalize_row(line))
+        if m:
+            keys.append(f"{m.group(1)}:{m.group(2).strip()}")
+    if not keys:
+        return None
+    return hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()
+
+
+def shingle_hashes(text: str, n: int = SHINGLE_WORDS) -> np.ndarray:
+    """
+    Distinct 64-bit hashes of the word n-grams of the normalized text.
+    """
+    words = normalize_row(text).split() or [""]
+    grams = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+    return np.unique(np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") for g in grams),
+        dtype="uint64", count=len(grams),
+    ))
+
+
+# ==============================
+# MINHASH / LSH
+# ==============================
+class NearDuplicateIndex:
+    """
+    MinHash signatures bucketed by LSH bands. query() returns the key of
+    an indexed text whose estimated Jaccard similarity (over word
+    n-grams) is at least threshold, so near-duplicates can be collapsed
+    onto the first copy seen. Texts with a row_group are only compared
+    with texts of the same group (MinHash just confirms the match).
+
+        sig, group = index.signature(text), index.group(text)
+        canonical = index.query(sig, group)
+        if canonical is None:
+            index.add(chunk_id, sig, group)
+    """
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 threshold: float = THRESHOLD, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        # multiply-shift "permutations" (a * h + b mod 2^64, top 32 bits)
+        # of the well mixed shingle hashes; a is odd
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, size=num_perm, dtype="uint64") * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype="uint64")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.seed = seed
+        self.keys: List[Hashable] = []
+        self.groups: List[Optional[str]] = []
+        self.sigs = np.zeros((0, num_perm), dtype="uint32")
+        self._n = 0
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._by_group: Dict[str, List[int]] = defaultdict(list)
+        self._removed = set()
+        self.queries = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        return self._n - len(self._removed)
+
+    # ---------- signatures ----------
+    group = staticmethod(row_group)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """
+        (len(texts), num_perm) uint32 MinHash signatures, computed
+        SIGNATURE_BATCH texts at a time with one reduceat per batch.
+        """
+        out = np.zeros((len(texts), self.num_perm), dtype="uint32")
+        for start in range(0, len(texts), SIGNATURE_BATCH):
+            hashes = [shingle_hashes(t) for t in texts[start:start + SIGNATURE_BATCH]]
+            offsets = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+            values = (self.a[:, None] * np.concatenate(hashes)[None, :] + self.b[:, None]) >> np.uint64(32)
+            out[start:start + len(hashes)] = np.minimum.reduceat(values, offsets, axis=1).T
+        return out
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.signatures([text])[0]
+
+    # ---------- index ----------
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key: Hashable, sig: np.ndarray, group: Optional[str] = None):
+        if self._n == len(self.sigs):
+            grown = np.zeros((max(64, 2 * self._n), self.num_perm), dtype="uint32")
+            grown[:self._n] = self.sigs[:self._n]
+            self.sigs = grown
+        row = self._n
+        self.sigs[row] = sig
+        self.keys.append(key)
+        self.groups.append(group)
+        self._n += 1
+        if group is not None:
+            self._by_group[group].append(row)
+            return
+        for band, band_key in zip(self._buckets, self._band_keys(sig)):
+            band[band_key].append(row)
+
+    def query(self, sig: np.ndarray, group: Optional[str] = None) -> Optional[Hashable]:
+        """
+        Key of the most similar indexed entry of the same group at or
+        above threshold.
+        """
+        self.queries += 1
+        if group is not None:
+            candidates = set(self._by_group.get(group, ()))
+        else:
+            candidates = set()
+            for band, band_key in zip(self._buckets, self._band_keys(sig)):
+                candidates.update(band.get(band_key, ()))
+        candidates -= self._removed
+        if not candidates:
+            return None
+        rows = np.fromiter(candidates, dtype="int64")
+        similarity = (self.sigs[rows] == sig).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return None
+        self.duplicates += 1
+        return self.keys[rows[best]]
+
+    def remove(self, keys: Iterable[Hashable]):
+        keys = set(keys)
+        self._removed.update(row for row, key in enumerate(self.keys) if key in keys)
+
+    def stats(self) -> Dict:
+        return {
+            "indexed": len(self),
+            "checked": self.queries,
+            "duplicates": self.duplicates,
+            "removed_pct": round(100 * self.duplicates / self.queries, 2) if self.queries else 0.0,
+        }
+
+    # ---------- persistence ----------
+    def save(self, path: str):
+        live = [row for row in range(self._n) if row not in self._removed]
+        np.savez(
+            path,
+            keys=np.asarray([self.keys[r] for r in live], dtype="int64"),
+            groups=np.asarray([self.groups[r] or "" for r in live], dtype="U40"),
+            sigs=self.sigs[live],
+            params=np.asarray([self.num_perm, self.bands, self.seed], dtype="int64"),
+            threshold=np.asarray(self.threshold),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "NearDuplicateIndex":
+        data = np.load(path)
+        num_perm, bands, seed = (int(x) for x in data["params"])
+        index = cls(num_perm, bands, float(data["threshold"]), seed)
+        for key, group, sig in zip(data["keys"].tolist(), data["groups"].tolist(), data["sigs"]):
+            index.add(key, sig, group or None)
+        return index
+
+
+def load_dedup_index(metadata_dir: str) -> Optional[NearDuplicateIndex]:
+    path = os.path.join(metadata_dir, MINHASH_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        return NearDuplicateIndex.load(path)
+    except KeyError:
+        # written before signatures were grouped by player rows
+        return None
+
+
+# ==============================
+# HELPERS
+# ==============================
+def collapse_rows(records: List[Dict], text_field: str, name_field: str) -> Tuple[List[Dict], Dict]:
+    """
+    Drop rows (lines of record[text_field]) that near-duplicate an earlier
+    row of any record. Each record keeps the references of what it lost
+    as "duplicates": [[line, canonical record name, canonical line], ...].
+    Returns (records, stats).
+    """
+    index = NearDuplicateIndex()
+    for record in records:
+        lines = record[text_field].split("\n")
+        sigs = index.signatures(lines)
+        kept, dups = [], []
+        for i, (line, sig) in enumerate(zip(lines, sigs)):
+            group = index.group(line)
+            canonical = index.query(sig, group)
+            if canonical is None:
+                index.add((record[name_field], i), sig, group)
+                kept.append(line)
+            else:
+                dups.append([i, canonical[0], canonical[1]])
+        record[text_field] = "\n".join(kept)
+        record["duplicates"] = dups
+    return records, index.stats()
+
+
+def chunk_sources(manifest: Dict) -> Dict[int, List]:
+    """
+    {chunk id: [[file name, chunk number in file], ...]} for the chunk
+    ids of a manifest that more than one chunk was collapsed onto.
+    """
+    refs = defaultdict(list)
+    for file_name, entry in manifest["files"].items():
+        for n, (cid, _) in enumerate(entry["chunks"]):
+            refs[cid].append([file_name, n])
+    return {cid: r for cid, r in refs.items() if len(r) > 1}
+
+
+def save_sources(sources: Dict[int, List], metadata_dir: str):
+    with open(os.path.join(metadata_dir, SOURCES_FILE), "w", encoding="utf-8") as f:
+        json.dump({str(k): v for k, v in sources.items()}, f)
+
+
+def load_sources(metadata_dir: str) -> Dict[int, List]:
+    path = os.path.join(metadata_dir, SOURCES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+
+# ==============================
+# CHECK
+# ==============================
+def check_distinct_ids(path: str) -> int:
+    """
+    Run collapse_rows over a structured.csv (milestone1 output, one
+    record per file) or .txt files and list every collapsed row whose
+    leading player id differs from the row it was folded onto. Returns
+    the number of such rows (0 = no distinct players merged).
+    """
+    if path.endswith(".csv"):
+        csv.field_size_limit(sys.maxsize)
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            records = [{"file_name": r["file_name"], "text": r["cleaned_text"]} for r in csv.DictReader(f)]
+    else:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            records = [{"file_name": os.path.basename(path), "text": f.read()}]
+    lines = {r["file_name"]: r["text"].split("\n") for r in records}
+
+    records, stats = collapse_rows(records, "text", "file_name")
+    merged = 0
+    for record in records:
+        for line, canonical_file, canonical_line in record["duplicates"]:
+            a = PLAYER_ROW.match(normalize_row(lines[record["file_name"]][line]))
+            b = PLAYER_ROW.match(normalize_row(lines[canonical_file][canonical_line]))
+            if a and b and a.group(1) != b.group(1):
+                merged += 1
+                print(f"❌ {lines[record['file_name']][line]!r} -> {lines[canonical_file][canonical_line]!r}")
+    print(f"Collapsed {stats['duplicates']} of {stats['checked']} rows, {merged} with a different player id")
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that dedup never merges distinct players")
+    parser.add_argument("path", nargs="?", default="structured.csv")
+    sys.exit(1 if check_distinct_ids(parser.parse_args().path) else 0)
@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked across processes
+    fcntl = None
+
+# ==============================
+# CONFIGURATION
+# ==============================
+CACHE_DIR = ".embedding_cache"
+LRU_SIZE = 4096
+
+KEYS_FILE = "keys.bin"        # 20-byte sha1 digests, one per row
+VECTORS_FILE = "vectors.f32"  # float32 rows, same order as keys
+META_FILE = "meta.json"
+DIGEST_SIZE = 20
+
+
+# ==============================
+# KEYS
+# ==============================
+def normalize_for_cache(text: str) -> str:
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(normalize_for_cache(text).encode("utf-8")).digest()
+
+
+def _model_dir(cache_dir: str, model_name: str) -> str:
+    slug = re.sub(r"[^\w.-]+", "_", model_name)
+    return os.path.join(cache_dir, slug)
+
+
+# ==============================
+# CACHE
+# ==============================
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache for one model.
+    Vectors are appended to a float32 file that is read through np.memmap;
+    a small LRU dict sits in front of it for hot texts (e.g. repeated
+    queries). Keys are sha1 digests of the normalized text.
+    """
+    def __init__(self, model_name: str, cache_dir: str = CACHE_DIR, lru_size: int = LRU_SIZE):
+        self.model_name = model_name
+        self.path = _model_dir(cache_dir, model_name)
+        self.lru_size = lru_size
+        self.lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.rows: Dict[bytes, int] = {}
+        self.dim = None
+        self._mmap = None
+        self.n_rows = 0  # rows in the files; > len(rows) when a key was appended twice
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lru_hits = 0
+        # the directory is created by the first append: constructing a
+        # cache (milestone3 does at import) writes nothing
+        self._load()
+
+    # ---------- persistence ----------
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file(META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+
+        with open(self._file(KEYS_FILE), "rb") as f:
+            keys = f.read()
+        n_vectors = os.path.getsize(self._file(VECTORS_FILE)) // (4 * self.dim)
+        # an interrupted append may leave one side longer than the other
+        n = min(len(keys) // DIGEST_SIZE, n_vectors)
+        for row in range(n):
+            self.rows[keys[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]] = row
+        self.n_rows = n
+
+    def _vectors(self):
+        n = self.n_rows
+        if self._mmap is None or self._mmap.shape[0] < n:
+            self._mmap = np.memmap(self._file(VECTORS_FILE), dtype="float32", mode="r", shape=(n, self.dim))
+        return self._mmap
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._file(META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self.dim}, f)
+        with open(self._file(VECTORS_FILE), "ab") as vf, open(self._file(KEYS_FILE), "ab") as kf:
+            if fcntl is not None:
+                fcntl.flock(vf.fileno(), fcntl.LOCK_EX)  # released on close
+            # row numbers come from the files, not from self.rows: other
+            # processes (forked API workers, a second app) append here too
+            start = min(os.path.getsize(vf.name) // (4 * self.dim), os.path.getsize(kf.name) // DIGEST_SIZE)
+            # drop the longer side of an interrupted append so both stay aligned
+            vf.truncate(start * 4 * self.dim)
+            kf.truncate(start * DIGEST_SIZE)
+            vf.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+            kf.write(b"".join(keys))
+        for i, key in enumerate(keys):
+            self.rows[key] = start + i
+        self.n_rows = start + len(keys)
+
+    # ---------- LRU ----------
+    def _remember(self, key, vector):
+        self.lru[key] = vector
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def _get(self, key):
+        vector = self.lru.get(key)
+        if vector is not None:
+            self.lru.move_to_end(key)
+            self.lru_hits += 1
+            return vector
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        vector = np.array(self._vectors()[row])
+        self._remember(key, vector)
+        return vector
+
+    # ---------- public API ----------
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Return float32 embeddings for texts, calling encode_fn only for
+        texts that are not cached yet (each distinct miss is encoded once).
+        """
+        keys = [text_key(t) for t in texts]
+        out: List = [None] * len(texts)
+        missing: "OrderedDict[bytes, List[int]]" = OrderedDict()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._get(key)
+                if vector is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    out[i] = vector
+            self.hits += len(texts) - sum(len(v) for v in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            miss_texts = [texts[idx[0]] for idx in missing.values()]
+            new = np.asarray(encode_fn(miss_texts), dtype="float32")
+            with self._lock:
+                fresh = [k for k in missing if k not in self.rows]
+                if fresh:
+                    pos = {k: j for j, k in enumerate(missing)}
+                    self._append(fresh, new[[pos[k] for k in fresh]])
+                for j, (key, idx) in enumerate(missing.items()):
+                    self._remember(key, new[j])
+                    for i in idx:
+                        out[i] = new[j]
+
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+        return np.vstack(out).astype("float32", copy=False)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self.rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "lru_hits": self.lru_hits,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
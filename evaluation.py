@@ -0,0 +1,332 @@
+# evaluation.py
+# Offline evaluation of retrieval + generation over a question dataset.
+#
+#   python evaluation.py make-dataset eval.jsonl --n 1000
+#   python evaluation.py run eval.jsonl --k 5 --workers 8
+#   python evaluation.py run eval.jsonl --no-generate      # retrieval only
+#
+# Dataset: one JSON object per line,
+#   {"id": ..., "question": "...", "reference": "...",
+#    "relevant_ids": [chunk ids], "relevant_text": ["substring", ...]}
+# reference is needed for answer similarity, relevant_ids or
+# relevant_text (matched case-insensitively in retrieved chunks) for
+# recall@k / MRR. Every stage is cached in .eval_cache/, so a re-run
+# only computes what changed (new questions, new index, new model).
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from chunker import batched
+from embedding_cache import EmbeddingCache
+from jsonl_io import JsonlWriter, read_jsonl, write_jsonl
+from retrieval import CONTEXT_CANDIDATES, PROMPT_TEMPLATE, Retriever, generated_text
+from tracing import span
+
+# ==============================
+# CONFIGURATION
+# ==============================
+EMBED_MODEL = "all-MiniLM-L6-v2"
+GEN_MODEL = "google/flan-t5-base"
+GEN_MAX_LENGTH = 200
+EVAL_CACHE_DIR = ".eval_cache"
+K = 5
+WORKERS = 4
+EMBED_BATCH_SIZE = 64
+GEN_BATCH_SIZE = 16
+
+# <<< EDIT PATHS BELOW IF NEEDED >>>
+INDEX_PATH = "faiss.index"
+METADATA_DIR = "metadata"
+
+
+# ==============================
+# STAGE CACHE
+# ==============================
+def cache_key(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    Append-only JSONL cache of one evaluation stage ({"key", "value"} per
+    line), loaded into a dict on open. Keys hash everything a result
+    depends on, so stale entries are simply never looked up again.
+    """
+    def __init__(self, stage: str, cache_dir: str = EVAL_CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, stage + ".jsonl")
+        self.values: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            for line in read_jsonl(self.path):
+                self.values[line["key"]] = line["value"]
+
+    def get(self, key: str):
+        return self.values.get(key)
+
+    def put_many(self, items: Dict[str, object]):
+        if not items:
+            return
+        with self._lock:
+            self.values.update(items)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for key, value in items.items():
+                    f.write(json.dumps({"key": key, "value": value}) + "\n")
+
+
+# ==============================
+# METRICS (vectorized)
+# ==============================
+def pairwise_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of row i of a with row i of b.
+    """
+    a = np.asarray(a, dtype="float32")
+    b = np.asarray(b, dtype="float32")
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return np.einsum("ij,ij->i", a, b) / np.maximum(norms, 1e-12)
+
+
+def hit_matrix(retrieved: Sequence[Sequence[int]], texts: Sequence[Sequence[str]],
+               relevant_ids: Sequence[Sequence[int]], relevant_text: Sequence[Sequence[str]],
+               k: int) -> np.ndarray:
+    """
+    (n_questions, k) bool: rank j of question i retrieved a relevant chunk.
+    """
+    hits = np.zeros((len(retrieved), k), dtype=bool)
+    for i, (ids, chunk_texts) in enumerate(zip(retrieved, texts)):
+        wanted = set(relevant_ids[i])
+        needles = [t.lower() for t in relevant_text[i]]
+        for j, (cid, text) in enumerate(zip(ids[:k], chunk_texts[:k])):
+            lower = text.lower()
+            hits[i, j] = cid in wanted or any(n in lower for n in needles)
+    return hits
+
+
+def retrieval_metrics(hits: np.ndarray, n_relevant: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-question recall@k, hit@k and reciprocal rank from a hit matrix.
+    n_relevant = number of relevant chunks per question (ids or, for
+    text matches, 1), 0 for questions without ground truth.
+    """
+    found = hits.sum(axis=1)
+    first = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+    return {
+        "recall": np.minimum(found, n_relevant) / np.maximum(n_relevant, 1),
+        "hit": hits.any(axis=1).astype("float32"),
+        "rr": np.where(first >= 0, 1.0 / (first + 1), 0.0),
+    }
+
+
+# ==============================
+# EVALUATOR
+# ==============================
+def load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL)
+
+
+def load_generator():
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=GEN_MODEL)
+
+
+class Evaluator:
+    """
+    Runs a question dataset through the same retrieval / packing /
+    generation path as the app and api, in batches:
+
+      1. question embeddings, EMBED_BATCH_SIZE at a time (EmbeddingCache)
+      2. retrieval, one query per worker thread (FAISS / numpy release the GIL)
+      3. prompt packing, then generation GEN_BATCH_SIZE prompts per call
+      4. answer / reference embeddings and all metrics as array operations
+
+    Retrieval results are cached per (index version, options, question),
+    answers per (model, prompt).
+    """
+    def __init__(self, retriever: Retriever, embed_fn: Callable[[List[str]], np.ndarray],
+                 generator=None, packer=None, k: int = K, workers: int = WORKERS,
+                 cache_dir: str = EVAL_CACHE_DIR, search_opts: Optional[Dict] = None):
+        self.retriever = retriever
+        self.embed_fn = embed_fn
+        self.generator = generator
+        self.packer = packer
+        self.k = k
+        self.workers = workers
+        self.search_opts = search_opts or {}
+        self.retrieval_cache = StageCache("retrieval", cache_dir)
+        self.answer_cache = StageCache("answers", cache_dir)
+
+    @classmethod
+    def load(cls, generate: bool = True, **kwargs) -> "Evaluator":
+        embedder = load_embedder()
+        cache = EmbeddingCache(EMBED_MODEL)
+
+        def embed_fn(texts):
+            return cache.encode(list(texts), lambda batch: embedder.encode(batch, convert_to_numpy=True))
+
+        retriever = Retriever.load(embed_fn, INDEX_PATH, METADATA_DIR)
+        generator = packer = None
+        if generate:
+            from context_packer import ContextPacker
+            generator = load_generator()
+            packer = ContextPacker.for_generator(generator, PROMPT_TEMPLATE)
+        return cls(retriever, embed_fn, generator, packer, **kwargs)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.vstack([self.embed_fn(batch) for batch in batched(texts, EMBED_BATCH_SIZE)])
+
+    def retrieve(self, questions: List[str], depth: int) -> List[List[int]]:
+        keys = [cache_key(self.retriever.version, depth, self.search_opts, q) for q in questions]
+        todo = [i for i, key in enumerate(keys) if self.retrieval_cache.get(key) is None]
+        if todo:
+            with span("eval.embed_questions"):
+                q_emb = self.embed([questions[i] for i in todo])
+
+            def one(j):
+                i = todo[j]
+                return self.retriever.search_ids(questions[i], depth, query_emb=q_emb[j], **self.search_opts)
+
+            with span("eval.retrieve"), ThreadPoolExecutor(self.workers) as pool:
+                found = list(pool.map(one, range(len(todo))))
+            self.retrieval_cache.put_many({keys[i]: ids for i, ids in zip(todo, found)})
+        return [self.retrieval_cache.get(key) for key in keys]
+
+    def answer(self, questions: List[str], retrieved: List[List[int]]) -> List[str]:
+        def pack(i):
+            chunks = [{"id": c, "text": self.retriever.text(c)} for c in retrieved[i]]
+            return self.packer.pack(questions[i], chunks)["prompt"]
+
+        with span("eval.pack"), ThreadPoolExecutor(self.workers) as pool:
+            prompts = list(pool.map(pack, range(len(questions))))
+        keys = [cache_key(GEN_MODEL, GEN_MAX_LENGTH, p) for p in prompts]
+        todo = [i for i, key in enumerate(keys) if self.answer_cache.get(key) is None]
+        for batch in batched(todo, GEN_BATCH_SIZE):
+            with span("eval.generate"):
+                outputs = self.generator([prompts[i] for i in batch], max_length=GEN_MAX_LENGTH,
+                                         batch_size=len(batch))
+            self.answer_cache.put_many({keys[i]: generated_text(o) for i, o in zip(batch, outputs)})
+        return [self.answer_cache.get(key) for key in keys]
+
+    def run(self, dataset: List[Dict], generate: bool = True) -> Dict:
+        """
+        Returns {"summary": {...}, "rows": [per-question results]}.
+        """
+        started = time.perf_counter()
+        questions = [d["question"] for d in dataset]
+        depth = max(self.k, CONTEXT_CANDIDATES) if generate else self.k
+        retrieved = self.retrieve(questions, depth)
+        texts = [[self.retriever.text(c) for c in ids[:self.k]] for ids in retrieved]
+
+        relevant_ids = [[int(i) for i in d.get("relevant_ids", [])] for d in dataset]
+        relevant_text = [list(d.get("relevant_text", [])) for d in dataset]
+        n_relevant = np.array([len(r) or (1 if t else 0) for r, t in zip(relevant_ids, relevant_text)])
+        hits = hit_matrix(retrieved, texts, relevant_ids, relevant_text, self.k)
+        metrics = retrieval_metrics(hits, n_relevant)
+        judged = n_relevant > 0
+
+        summary = {
+            "questions": len(dataset),
+            "k": self.k,
+            "judged": int(judged.sum()),
+            f"recall@{self.k}": round(float(metrics["recall"][judged].mean()), 4) if judged.any() else None,
+            f"hit@{self.k}": round(float(metrics["hit"][judged].mean()), 4) if judged.any() else None,
+            "mrr": round(float(metrics["rr"][judged].mean()), 4) if judged.any() else None,
+        }
+
+        answers: List[Optional[str]] = [None] * len(dataset)
+        similarity = np.full(len(dataset), np.nan, dtype="float32")
+        if generate and self.generator is not None:
+            answers = self.answer(questions, retrieved)
+            with_ref = [i for i, d in enumerate(dataset) if d.get("reference")]
+            if with_ref:
+                with span("eval.similarity"):
+                    a = self.embed([answers[i] for i in with_ref])
+                    r = self.embed([dataset[i]["reference"] for i in with_ref])
+                    similarity[with_ref] = pairwise_similarity(a, r)
+                summary["answer_similarity"] = round(float(np.nanmean(similarity)), 4)
+        summary["seconds"] = round(time.perf_counter() - started, 2)
+
+        rows = []
+        for i, d in enumerate(dataset):
+            rows.append({
+                "id": d.get("id", i),
+                "question": questions[i],
+                "retrieved": retrieved[i][:self.k],
+                "recall": round(float(metrics["recall"][i]), 4) if judged[i] else None,
+                "rr": round(float(metrics["rr"][i]), 4) if judged[i] else None,
+                "answer": answers[i],
+                "similarity": None if np.isnan(similarity[i]) else round(float(similarity[i]), 4),
+            })
+        return {"summary": summary, "rows": rows}
+
+
+# ==============================
+# DATASET
+# ==============================
+def make_player_dataset(metadata, n: int, seed: int = 0) -> List[Dict]:
+    """
+    Questions about random player rows of the metadata store, with the
+    row as the relevant chunk and the player's name as relevant text.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.asarray(metadata.ids) if hasattr(metadata, "ids") else np.asarray(sorted(metadata))
+    out = []
+    for cid in rng.permutation(ids).tolist():
+        fields = metadata[cid]["text"].split("\t")
+        if len(fields) < 8 or not fields[1].strip():
+            continue
+        name, college, city, state = fields[1].rstrip("*"), fields[4], fields[6], fields[7]
+        if city and state:
+            question, reference = f"Where was {name} born?", f"{name} was born in {city}, {state}."
+        elif college:
+            question, reference = f"Which college did {name} attend?", f"{name} attended {college}."
+        else:
+            continue
+        out.append({"id": len(out), "question": question, "reference": reference,
+                    "relevant_ids": [int(cid)], "relevant_text": [name]})
+        if len(out) >= n:
+            break
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline RAG evaluation")
+    sub = parser.add_subparsers(dest="command", required=True)
+    make = sub.add_parser("make-dataset", help="questions about random player rows of the index")
+    make.add_argument("path")
+    make.add_argument("--n", type=int, default=1000)
+    make.add_argument("--seed", type=int, default=0)
+    run = sub.add_parser("run")
+    run.add_argument("path")
+    run.add_argument("-k", type=int, default=K)
+    run.add_argument("--workers", type=int, default=WORKERS)
+    run.add_argument("--no-generate", action="store_true", help="retrieval metrics only")
+    run.add_argument("--out", default="eval_results.jsonl")
+    args = parser.parse_args(argv)
+
+    if args.command == "make-dataset":
+        from metadata_store import open_metadata
+        dataset = make_player_dataset(open_metadata(METADATA_DIR), args.n, args.seed)
+        write_jsonl(args.path, dataset)
+        print(f"✅ Saved {args.path} ({len(dataset)} questions)")
+        return
+
+    dataset = list(read_jsonl(args.path))
+    evaluator = Evaluator.load(generate=not args.no_generate, k=args.k, workers=args.workers)
+    result = evaluator.run(dataset, generate=not args.no_generate)
+    with JsonlWriter(args.out) as w:
+        w.write_all(result["rows"])
+    print(json.dumps(result["summary"], indent=2))
+    print(f"✅ Saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
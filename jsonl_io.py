@@ -0,0 +1,115 @@
+import io
+import gzip
+import json
+from typing import Iterable, Iterator, Optional
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# compression is picked from the file extension unless given explicitly:
+#   file.jsonl     -> plain
+#   file.jsonl.gz  -> gzip
+#   file.jsonl.zst -> zstandard (pip install zstandard)
+COMPRESSIONS = (None, "gzip", "zstd")
+
+
+def detect_compression(path: str) -> Optional[str]:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def open_text(path: str, mode: str = "r", compression: Optional[str] = "auto"):
+    """
+    Open a (possibly compressed) UTF-8 text file for "r" or "w".
+    """
+    if compression == "auto":
+        compression = detect_compression(path)
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {COMPRESSIONS}, got {compression!r}")
+
+    if compression is None:
+        return open(path, mode, encoding="utf-8", newline="\n")
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="\n")
+
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd compression needs the 'zstandard' package") from e
+    raw = open(path, mode + "b")
+    if mode == "r":
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    else:
+        stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+    return io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+
+
+# ==============================
+# WRITER
+# ==============================
+class JsonlWriter:
+    """
+    Writes one JSON value per line as soon as it is produced.
+
+        with JsonlWriter("triplets.jsonl.gz") as w:
+            for t in triplets:
+                w.write(t)
+    """
+    def __init__(self, path: str, compression: Optional[str] = "auto"):
+        self.path = path
+        self.count = 0
+        self._f = open_text(path, "w", compression)
+
+    def write(self, obj):
+        self._f.write(json.dumps(obj, ensure_ascii=False))
+        self._f.write("\n")
+        self.count += 1
+
+    def write_all(self, items: Iterable):
+        for item in items:
+            self.write(item)
+        return self.count
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_jsonl(path: str, items: Iterable, compression: Optional[str] = "auto") -> int:
+    with JsonlWriter(path, compression) as w:
+        return w.write_all(items)
+
+
+# ==============================
+# LAZY READER
+# ==============================
+def read_jsonl(path: str, compression: Optional[str] = "auto") -> Iterator:
+    """
+    Yield one parsed JSON value per line; only one line is in memory at a time.
+    """
+    with open_text(path, "r", compression) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_json_or_jsonl(path: str) -> Iterator:
+    """
+    Iterate items of either a JSON-lines file or an old-style JSON list
+    (the latter is loaded in full).
+    """
+    name = path[:-3] if path.endswith(".gz") else path[:-4] if path.endswith(".zst") else path
+    if name.endswith(".json"):
+        with open_text(path, "r") as f:
+            yield from json.load(f)
+    else:
+        yield from read_jsonl(path)
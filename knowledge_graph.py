@@ -0,0 +1,311 @@
+import os
+import re
+import csv
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from jsonl_io import read_json_or_jsonl
+from players_table import PlayersTable
+from triplet_store import TripletStore
+
+# ==============================
+# CONFIGURATION
+# ==============================
+GRAPH_FILE = "knowledge_graph.npz"
+TRIPLETS_FILE = "triplets.jsonl"
+
+# entity names shorter than this are not linked in questions
+MIN_NAME_CHARS = 3
+# a hop stops adding nodes past this many (hub nodes such as big states)
+MAX_EXPANSION = 200
+MAX_FACTS = 12
+
+TOKEN_RE = re.compile(r"\w+")
+END = ""  # trie key marking "an entity name ends here"
+
+
+def name_tokens(name: str) -> Tuple[str, ...]:
+    return tuple(TOKEN_RE.findall(name.lower()))
+
+
+# ==============================
+# TRIPLET SOURCES
+# ==============================
+def iter_triplet_file(path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    milestone2 output: triplets.jsonl ([source, relation, target]) or
+    relationship.jsonl ({"source", "relation", "target"}), also the old
+    .json lists.
+    """
+    for item in read_json_or_jsonl(path):
+        if isinstance(item, dict):
+            yield item["source"], item["relation"], item["target"]
+        else:
+            yield item[0], item[1], item[2]
+
+
+def iter_admin_csv(nodes_path: str, rels_path: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Triplets back from the neo4j-admin CSVs written by
+    cypher.write_admin_triplet_csvs.
+    """
+    with open(nodes_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        names = {row[0]: row[1] for row in reader}
+    with open(rels_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for start, end, rel_type in reader:
+            yield names[start], rel_type.lower(), names[end]
+
+
+def iter_player_triplets(table: PlayersTable) -> Iterator[Tuple[str, str, str]]:
+    """
+    Facts from the typed players table: college, birth city and the
+    state of that city.
+    """
+    for i in range(len(table)):
+        name = table.columns["name"][i].rstrip("*")
+        college = table.value("college", i)
+        city = table.value("city", i)
+        state = table.value("state", i)
+        if college:
+            yield name, "played_for", college
+        if city:
+            yield name, "born_in", city
+            if state:
+                yield city, "located_in", state
+        elif state:
+            yield name, "born_in", state
+
+
+# ==============================
+# GRAPH
+# ==============================
+class KnowledgeGraph:
+    """
+    Directed multigraph over interned entity ids, stored as CSR arrays
+    in both directions (one row per node, no Python object per edge):
+
+        indptr[n] .. indptr[n + 1]  -> slice of nbr / rel / rev for node n
+        rev = 1 marks an incoming edge (nbr -[rel]-> n)
+
+    Entity names are linked in text through a token trie.
+    """
+    def __init__(self, names: Sequence[str], relations: Sequence[str],
+                 indptr: np.ndarray, nbr: np.ndarray, rel: np.ndarray, rev: np.ndarray):
+        self.names = list(names)
+        self.relations = list(relations)
+        self.indptr = indptr
+        self.nbr = nbr
+        self.rel = rel
+        self.rev = rev
+        self.trie = self._build_trie(self.names)
+
+    @staticmethod
+    def _build_trie(names: Sequence[str]) -> Dict:
+        root: Dict = {}
+        for i, name in enumerate(names):
+            tokens = name_tokens(name)
+            if not tokens or len(" ".join(tokens)) < MIN_NAME_CHARS:
+                continue
+            node = root
+            for t in tokens:
+                node = node.setdefault(t, {})
+            node.setdefault(END, i)  # first entity with that spelling wins
+        return root
+
+    # ---------- construction ----------
+    @classmethod
+    def from_triplets(cls, triplets: Iterable[Tuple[str, str, str]]) -> "KnowledgeGraph":
+        store = TripletStore()
+        for source, relation, target in triplets:
+            source, target = source.strip(), target.strip()
+            if source and target and source != target:
+                store.add(source, relation, target)
+        return cls.from_store(store)
+
+    @classmethod
+    def from_store(cls, store: TripletStore) -> "KnowledgeGraph":
+        src, rel, dst = (a.astype("int64") for a in store.arrays())
+        n = len(store.entities)
+        ends = np.concatenate([src, dst])
+        others = np.concatenate([dst, src]).astype("int32")
+        rels = np.concatenate([rel, rel]).astype("uint16")
+        rev = np.concatenate([np.zeros(len(src), "uint8"), np.ones(len(dst), "uint8")])
+        order = np.argsort(ends, kind="stable")
+        indptr = np.zeros(n + 1, dtype="int64")
+        np.cumsum(np.bincount(ends, minlength=n), out=indptr[1:])
+        return cls(store.entities.names, store.relations.names, indptr, others[order], rels[order], rev[order])
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.nbr) // 2
+
+    # ---------- persistence ----------
+    def save(self, path: str = GRAPH_FILE):
+        np.savez(
+            path,
+            names=np.asarray(self.names, dtype=str),
+            relations=np.asarray(self.relations, dtype=str),
+            indptr=self.indptr, nbr=self.nbr, rel=self.rel, rev=self.rev,
+        )
+
+    @classmethod
+    def load(cls, path: str = GRAPH_FILE) -> "KnowledgeGraph":
+        data = np.load(path)
+        return cls(data["names"].tolist(), data["relations"].tolist(),
+                   data["indptr"], data["nbr"], data["rel"], data["rev"])
+
+    # ---------- entity linking ----------
+    def link(self, text: str) -> List[int]:
+        """
+        Entity ids mentioned in text, longest match first at each position,
+        in order of appearance.
+        """
+        tokens = TOKEN_RE.findall(text.lower())
+        found: List[int] = []
+        i = 0
+        while i < len(tokens):
+            node, best, best_end = self.trie, None, i
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if END in node:
+                    best, best_end = node[END], j + 1
+            if best is None:
+                i += 1
+            else:
+                if best not in found:
+                    found.append(best)
+                i = best_end
+        return found
+
+    # ---------- traversal ----------
+    def _edges_of(self, nodes: np.ndarray) -> np.ndarray:
+        """
+        CSR positions of all edges of `nodes`, vectorized.
+        """
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        if not counts.sum():
+            return np.zeros(0, dtype="int64")
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(counts.sum())
+
+    def neighbours(self, node: int) -> List[Tuple[str, str, str]]:
+        return [self._fact(node, p) for p in range(self.indptr[node], self.indptr[node + 1])]
+
+    def _fact(self, node: int, pos: int) -> Tuple[str, str, str]:
+        a, b = self.names[node], self.names[self.nbr[pos]]
+        r = self.relations[self.rel[pos]]
+        return (b, r, a) if self.rev[pos] else (a, r, b)
+
+    def expand(self, seeds: Sequence[int], hops: int = 1, max_nodes: int = MAX_EXPANSION
+               ) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+        """
+        Breadth-first k-hop neighbourhood of seeds. Returns (node ids in
+        visiting order, [(node, csr position)] of the edges that reached
+        them).
+        """
+        seen = np.zeros(len(self.names), dtype=bool)
+        frontier = np.unique(np.asarray(seeds, dtype="int64"))
+        seen[frontier] = True
+        order = [frontier]
+        edges: List[Tuple[int, int]] = []
+        for _ in range(hops):
+            if not len(frontier):
+                break
+            pos = self._edges_of(frontier)
+            owner = np.repeat(frontier, self.indptr[frontier + 1] - self.indptr[frontier])
+            targets = self.nbr[pos]
+            new = ~seen[targets]
+            pos, owner, targets = pos[new], owner[new], targets[new]
+            targets, first = np.unique(targets, return_index=True)
+            first.sort()
+            targets = self.nbr[pos[first]][:max_nodes]
+            first = first[:max_nodes]
+            seen[targets] = True
+            edges.extend(zip(owner[first].tolist(), pos[first].tolist()))
+            order.append(targets)
+            frontier = targets.astype("int64")
+        return np.concatenate(order), edges
+
+    def facts(self, text: str, hops: int = 1, max_facts: int = MAX_FACTS) -> List[str]:
+        """
+        "source relation target" sentences around the entities linked in
+        text: direct facts of the linked entities first, then the edges
+        that reached further hops.
+        """
+        seeds = self.link(text)
+        if not seeds:
+            return []
+        out: List[str] = []
+        for s in seeds:
+            for p in range(self.indptr[s], self.indptr[s + 1]):
+                out.append(" ".join(self._fact(s, p)).replace("_", " "))
+                if len(out) >= max_facts:
+                    return out
+        if hops > 1:
+            _, edges = self.expand(seeds, hops)
+            direct = set(seeds)
+            for node, pos in edges:
+                if node in direct:
+                    continue
+                fact = " ".join(self._fact(node, pos)).replace("_", " ")
+                if fact not in out:
+                    out.append(fact)
+                if len(out) >= max_facts:
+                    break
+        return out
+
+    def stats(self) -> Dict:
+        return {"entities": len(self.names), "edges": self.n_edges, "relations": len(self.relations)}
+
+
+def load_graph(path: str = GRAPH_FILE) -> Optional[KnowledgeGraph]:
+    return KnowledgeGraph.load(path) if os.path.exists(path) else None
+
+
+def with_graph_facts(results: List[Dict], graph: Optional[KnowledgeGraph], query: str,
+                     hops: int = 1, max_facts: int = MAX_FACTS) -> List[Dict]:
+    """
+    Prepend a "Known facts" chunk for the entities in the query, scored
+    like the best retrieved chunk so the context packer keeps it.
+    """
+    if graph is None or hops <= 0:
+        return results
+    facts = graph.facts(query, hops, max_facts)
+    if not facts:
+        return results
+    best = max((r.get("score") or 0.0 for r in results), default=0.0)
+    return [{"id": None, "text": "Known facts: " + "; ".join(facts) + ".", "score": best}] + list(results)
+
+
+def build_graph(triplet_paths: Iterable[str] = (TRIPLETS_FILE,), players_paths: Iterable[str] = (),
+                out_path: str = GRAPH_FILE) -> KnowledgeGraph:
+    def triplets():
+        for path in triplet_paths:
+            if os.path.exists(path):
+                yield from iter_triplet_file(path)
+        for path in players_paths:
+            if path.endswith(".parquet"):
+                yield from iter_player_triplets(PlayersTable.from_parquet(path))
+            else:
+                yield from iter_player_triplets(PlayersTable.from_txt(path))
+
+    graph = KnowledgeGraph.from_triplets(triplets())
+    graph.save(out_path)
+    print(f"✅ Saved knowledge graph ({len(graph)} entities, {graph.n_edges} edges) to {out_path}")
+    return graph
+
+
+if __name__ == "__main__":
+    # <<< EDIT PATHS BELOW IF NEEDED >>>
+    players = [p for p in ("players.parquet", "players.txt") if os.path.exists(p)][:1]
+    build_graph([TRIPLETS_FILE], players)
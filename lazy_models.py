@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+# ==============================
+# LAZY RESOURCES
+# ==============================
+class LazyResource:
+    """
+    A model / index that is loaded on first get() (once, thread-safe)
+    instead of at import time, so scripts that never use it never pay
+    for it.
+
+        generator = LazyResource(load_generator, "generator")
+        ...
+        generator.get()(prompt)
+    """
+    def __init__(self, loader: Callable[[], object], name: str = "resource"):
+        self.loader = loader
+        self.name = name
+        self.load_ms: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._value = self.loader()
+                self.load_ms = round((time.perf_counter() - start) * 1000, 1)
+                self.error = None
+                self._loaded = True
+        return self._value
+
+    def stats(self) -> Dict:
+        return {"name": self.name, "loaded": self._loaded, "load_ms": self.load_ms}
+
+
+def warm_up(resources: Iterable[LazyResource], name: str = "warm-up") -> threading.Thread:
+    """
+    Load resources one after the other in a background thread. A request
+    that needs one before it is ready just waits on its lock; a failed
+    load is kept in .error and retried (and raised) on the next get().
+    """
+    resources = list(resources)
+
+    def run():
+        for r in resources:
+            try:
+                r.get()
+            except Exception as e:
+                r.error = e
+                print(f"⚠️ Warm-up of {r.name} failed: {e}")
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
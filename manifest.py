@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from chunker import iter_chunks, DEFAULT_BATCH_SIZE
+
+# ==============================
+# CONFIGURATION
+# ==============================
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+# ==============================
+# HASHING
+# ==============================
+def file_sha1(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# ==============================
+# LOAD / SAVE
+# ==============================
+def new_manifest(chunk_opts: Optional[Dict] = None, index_spec: Optional[Dict] = None) -> Dict:
+    """
+    files: {file_name: {"size", "mtime", "sha1", "chunks": [[chunk_id, chunk_sha1], ...]}}
+    """
+    return {
+        "version": MANIFEST_VERSION,
+        "chunk_opts": chunk_opts or {},
+        "index_spec": index_spec or {},
+        "next_id": 0,
+        "files": {},
+    }
+
+
+def load_manifest(path: str = MANIFEST_FILE) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(manifest: Dict, path: str = MANIFEST_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ==============================
+# INCREMENTAL REFRESH
+# ==============================
+def refresh_store(
+    folder_path: str,
+    manifest: Dict,
+    store,
+    embed_fn: Callable[[List[str]], "np.ndarray"],
+    make_store: Callable[[int], object],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dedup_index=None,
+):
+    """
+    Bring `store` in line with the .txt files in folder_path.
+
+    - files whose size and mtime match the manifest are skipped unread
+    - touched files with the same content hash only get their mtime updated
+    - changed files are re-chunked; chunks whose text hash already existed
+      in that file keep their id (only their offsets are updated), new
+      chunks are embedded, vanished chunks are removed by id
+    - files missing from disk have all their chunks removed
+    - with a dedup_index (dedup.NearDuplicateIndex), a new chunk that
+      near-duplicates an indexed one is not embedded; the file's manifest
+      entry points at the canonical chunk id instead, so a chunk id is
+      only removed once no file references it any more
+
+    `store` may be None (first build); it is then created with
+    make_store(dim) once the first batch is embedded.
+    Returns (store, stats).
+    """
+    stats = defaultdict(int)
+    chunk_opts = manifest["chunk_opts"]
+    files = manifest["files"]
+    to_remove: List[int] = []
+    pending: List[Dict] = []
+
+    def embed_pending():
+        nonlocal store
+        if not pending:
+            return
+        texts = [c["text"] for c in pending]
+        emb = embed_fn(texts)
+        if store is None:
+            store = make_store(emb.shape[1])
+        store.add(
+            emb,
+            texts,
+            [{k: v for k, v in c.items() if k not in ("id", "text")} for c in pending],
+            ids=[c["id"] for c in pending],
+        )
+        stats["chunks_added"] += len(pending)
+        pending.clear()
+
+    on_disk = sorted(f for f in os.listdir(folder_path) if f.endswith(".txt"))
+
+    for file_name in set(files) - set(on_disk):
+        to_remove.extend(cid for cid, _ in files.pop(file_name)["chunks"])
+        stats["files_removed"] += 1
+
+    for file_name in on_disk:
+        path = os.path.join(folder_path, file_name)
+        st = os.stat(path)
+        entry = files.get(file_name)
+
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            stats["files_unchanged"] += 1
+            continue
+
+        digest = file_sha1(path)
+        if entry and entry["sha1"] == digest:
+            entry["mtime"] = st.st_mtime
+            stats["files_unchanged"] += 1
+            continue
+
+        stats["files_changed" if entry else "files_added"] += 1
+        old = defaultdict(list)
+        for cid, h in (entry or {}).get("chunks", []):
+            old[h].append(cid)
+
+        chunks = []
+        for chunk in iter_chunks(path, **chunk_opts):
+            h = chunk_sha1(chunk["text"])
+            if old[h]:
+                cid = old[h].pop(0)
+                meta = store.chunk_meta.get(cid) if store is not None else None
+                # a collapsed duplicate keeps the canonical chunk's offsets
+                if meta is not None and meta.get("source_file") == chunk.get("source_file"):
+                    store.chunk_meta[cid] = {k: v for k, v in chunk.items() if k != "text"}
+                stats["chunks_kept"] += 1
+            else:
+                canonical = None
+                if dedup_index is not None:
+                    sig = dedup_index.signature(chunk["text"])
+                    group = dedup_index.group(chunk["text"])
+                    canonical = dedup_index.query(sig, group)
+                if canonical is not None:
+                    cid = canonical
+                    stats["chunks_deduplicated"] += 1
+                else:
+                    cid = manifest["next_id"]
+                    manifest["next_id"] += 1
+                    chunk["id"] = cid
+                    if dedup_index is not None:
+                        dedup_index.add(cid, sig, group)
+                    pending.append(chunk)
+                    if len(pending) >= batch_size:
+                        embed_pending()
+            chunks.append([cid, h])
+
+        for ids in old.values():
+            to_remove.extend(ids)
+
+        files[file_name] = {
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "sha1": digest,
+            "chunks": chunks,
+        }
+
+    embed_pending()
+    referenced = {cid for entry in files.values() for cid, _ in entry["chunks"]}
+    to_remove = sorted({cid for cid in to_remove if cid not in referenced})
+    if dedup_index is not None:
+        dedup_index.remove(to_remove)
+    if store is not None:
+        store.flush()
+        store.remove(to_remove)
+    stats["chunks_removed"] = len(to_remove)
+    return store, dict(stats)
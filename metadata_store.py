@@ -0,0 +1,188 @@
+import os
+import json
+import shutil
+import numpy as np
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# A metadata store is a directory:
+#   header.json   -> count, format version and column descriptions
+#   ids.npy       -> int64 chunk ids, strictly increasing
+#   offsets.npy   -> uint64, count + 1 byte offsets into text.bin
+#   text.bin      -> UTF-8 text of every chunk, concatenated
+#   <field>.npy   -> one column per extra field (int64, or uint32 codes
+#                    into header["fields"][field]["values"] for strings)
+# Everything is opened with mmap, so only the pages of the returned ids
+# are ever read.
+METADATA_DIR = "metadata"
+FORMAT_VERSION = 1
+
+INT_FIELDS = ("start", "end", "row_start", "row_end")
+CATEGORY_FIELDS = ("source_file",)
+
+
+# ==============================
+# WRITER
+# ==============================
+def write_metadata_store(path: str, entries: Iterable[Dict]) -> int:
+    """
+    Stream entries ({"id", "text", ...fields}) sorted by id into a
+    metadata store directory. Unknown fields are dropped; missing ones
+    are stored as -1 / "". Returns the number of entries written.
+    """
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    ids = array("q")
+    offsets = array("Q", [0])
+    ints = {f: array("q") for f in INT_FIELDS}
+    cats = {f: array("I") for f in CATEGORY_FIELDS}
+    cat_values: Dict[str, Dict[str, int]] = {f: {} for f in CATEGORY_FIELDS}
+
+    with open(os.path.join(tmp, "text.bin"), "wb") as blob:
+        for entry in entries:
+            chunk_id = int(entry["id"])
+            if ids and chunk_id <= ids[-1]:
+                raise ValueError("metadata entries must be sorted by id")
+            ids.append(chunk_id)
+            data = entry["text"].encode("utf-8")
+            blob.write(data)
+            offsets.append(offsets[-1] + len(data))
+            for f in INT_FIELDS:
+                value = entry.get(f)
+                ints[f].append(-1 if value is None else int(value))
+            for f in CATEGORY_FIELDS:
+                values = cat_values[f]
+                cats[f].append(values.setdefault(str(entry.get(f, "")), len(values)))
+
+    np.save(os.path.join(tmp, "ids.npy"), np.frombuffer(ids, dtype="int64"))
+    np.save(os.path.join(tmp, "offsets.npy"), np.frombuffer(offsets, dtype="uint64"))
+    fields = {}
+    for f in INT_FIELDS:
+        np.save(os.path.join(tmp, f + ".npy"), np.frombuffer(ints[f], dtype="int64"))
+        fields[f] = {"kind": "int64"}
+    for f in CATEGORY_FIELDS:
+        np.save(os.path.join(tmp, f + ".npy"), np.frombuffer(cats[f], dtype="uint32"))
+        fields[f] = {"kind": "category", "values": list(cat_values[f])}
+
+    with open(os.path.join(tmp, "header.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION, "count": len(ids), "fields": fields}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return len(ids)
+
+
+# ==============================
+# READER
+# ==============================
+class MetadataStore:
+    """
+    Read-only, memory-mapped view of a metadata store directory.
+    store[chunk_id] returns {"id", "text", ...fields} like the entries of
+    the old metadata.json, so callers doing metadata[i]["text"] keep working.
+    """
+    def __init__(self, path: str = METADATA_DIR):
+        self.path = path
+        with open(os.path.join(path, "header.json"), "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        if self.header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported metadata store version in {path}")
+        self.count = self.header["count"]
+        self.ids = self._load("ids")
+        self.offsets = self._load("offsets")
+        # ids written by a single full build are 0..n-1: skip the binary search
+        self.dense = self.count == 0 or (int(self.ids[0]) == 0 and int(self.ids[-1]) == self.count - 1)
+        self.text = (
+            np.memmap(os.path.join(path, "text.bin"), dtype="uint8", mode="r")
+            if os.path.getsize(os.path.join(path, "text.bin"))
+            else np.zeros(0, dtype="uint8")
+        )
+        self.fields = self.header["fields"]
+        self.columns = {f: self._load(f) for f in self.fields}
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+
+    def __len__(self):
+        return self.count
+
+    def position(self, chunk_id: int) -> int:
+        """
+        Row of chunk_id in the store, or -1 if it is not stored.
+        """
+        chunk_id = int(chunk_id)
+        if self.dense:
+            return chunk_id if 0 <= chunk_id < self.count else -1
+        pos = int(np.searchsorted(self.ids, chunk_id))
+        if pos < self.count and int(self.ids[pos]) == chunk_id:
+            return pos
+        return -1
+
+    def __contains__(self, chunk_id) -> bool:
+        return self.position(chunk_id) >= 0
+
+    def _text_at(self, pos: int) -> str:
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return bytes(self.text[start:end]).decode("utf-8")
+
+    def _field_at(self, field: str, pos: int):
+        value = self.columns[field][pos]
+        spec = self.fields[field]
+        if spec["kind"] == "category":
+            return spec["values"][int(value)]
+        return int(value)
+
+    def get_text(self, chunk_id: int) -> str:
+        pos = self.position(chunk_id)
+        if pos < 0:
+            raise KeyError(chunk_id)
+        return self._text_at(pos)
+
+    def get_field(self, chunk_id: int, field: str):
+        pos = self.position(chunk_id)
+        if pos < 0:
+            raise KeyError(chunk_id)
+        return self._field_at(field, pos)
+
+    def __getitem__(self, chunk_id) -> Dict:
+        pos = self.position(chunk_id)
+        if pos < 0:
+            raise KeyError(chunk_id)
+        entry = {"id": int(chunk_id), "text": self._text_at(pos)}
+        for f in self.fields:
+            entry[f] = self._field_at(f, pos)
+        return entry
+
+    def get(self, chunk_id, default=None):
+        try:
+            return self[chunk_id]
+        except KeyError:
+            return default
+
+    def texts(self, chunk_ids: Iterable[int]) -> List[str]:
+        return [self.get_text(i) for i in chunk_ids if i >= 0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for pos in range(self.count):
+            yield self[int(self.ids[pos])]
+
+
+# ==============================
+# LEGACY metadata.json
+# ==============================
+def open_metadata(path: str = METADATA_DIR, legacy_path: Optional[str] = "metadata.json"):
+    """
+    Open the binary store if present, else fall back to an old
+    metadata.json (loaded into a dict keyed by chunk id).
+    """
+    if os.path.isdir(path):
+        return MetadataStore(path)
+    if legacy_path and os.path.exists(legacy_path):
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            return {m["id"]: m for m in json.load(f)}
+    raise FileNotFoundError(f"no metadata store at {path}")
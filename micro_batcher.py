@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Sequence
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# a batch is sent as soon as it holds MAX_BATCH items or the oldest item
+# has waited MAX_WAIT_MS, whichever comes first
+MAX_BATCH = 64
+MAX_WAIT_MS = 5
+
+
+class MicroBatcher:
+    """
+    Collects single items submitted from many threads (or asyncio tasks,
+    via asyncio.wrap_future) and runs them through `fn` in one call.
+
+        batcher = MicroBatcher(lambda texts: embedder.encode(texts), max_batch=64)
+        vector = batcher.submit("some text").result()
+
+    fn receives a list of items and must return one result per item, in
+    order. An exception from fn is set on every future of that batch.
+    """
+    def __init__(self, fn: Callable[[List], Sequence], max_batch: int = MAX_BATCH,
+                 max_wait_ms: float = MAX_WAIT_MS, name: str = "batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stats = {"items": 0, "batches": 0, "max_batch_seen": 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def submit_many(self, items: Sequence) -> List[Future]:
+        return [self.submit(item) for item in items]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            live = [(item, f) for item, f in batch if f.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                results = self.fn([item for item, _ in live])
+                for (_, f), r in zip(live, results):
+                    f.set_result(r)
+            except Exception as e:
+                for _, f in live:
+                    f.set_exception(e)
+
+            self._stats["items"] += len(live)
+            self._stats["batches"] += 1
+            self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(live))
+
+    def stats(self) -> Dict:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "queued": self._queue.qsize(),
+            "avg_batch": round(self._stats["items"] / batches, 2) if batches else 0.0,
+        }
@@ -1,7 +1,10 @@
 import os
 import re
+import csv
 import pandas as pd
 from typing import List, Dict
+from dedup import collapse_rows
+from players_table import detect_players_file, txt_to_parquet
 
 # =============================
 # CONFIGURATION (EDIT ONLY HERE)
@@ -16,6 +19,10 @@ OUTPUT_DIR =r"C:\Users\Soumya Shree\OneDrive\Attachments\milestone_2\processed_d
 # Output CSV file name
 OUTPUT_FILE = "structured.csv"
 
+# Drop near-duplicate rows (same row in overlapping / re-scraped files)
+# (off until `python dedup.py structured.csv` reports 0 merged ids on new data)
+DEDUP = False
+
 
 # =============================
 # TEXT NORMALIZATION FUNCTION
@@ -45,7 +52,12 @@ def normalize_text(text: str) -> str:
 # DATA INGESTION FUNCTION
 # =============================
 
-def ingest_txt_files(folder_path: str) -> List[Dict]:
+def ingest_txt_files(folder_path: str, dedup: bool = False) -> List[Dict]:
+    """
+    One record per .txt file. With dedup=True, rows that near-duplicate
+    a row read earlier are dropped; the record lists them as
+    "duplicates": [[line, canonical file, canonical line], ...]
+    """
     records = []
     doc_id = 1
 
@@ -67,6 +79,12 @@ def ingest_txt_files(folder_path: str) -> List[Dict]:
 
             doc_id += 1
 
+    if dedup:
+        records, stats = collapse_rows(records, "cleaned_text", "file_name")
+        for record in records:
+            record["word_count"] = len(record["cleaned_text"].split())
+        print(f"Near-duplicate rows removed: {stats['duplicates']} of {stats['checked']} ({stats['removed_pct']}%)")
+
     return records
 
 
@@ -77,7 +95,7 @@ def ingest_txt_files(folder_path: str) -> List[Dict]:
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     print("Reading files from:", RAW_DATA_DIR)
-    data = ingest_txt_files(RAW_DATA_DIR)
+    data = ingest_txt_files(RAW_DATA_DIR, dedup=DEDUP)
     print("Number of documents read:", len(data))
 
     if not data:
@@ -91,6 +109,13 @@ def main():
     df.to_csv(output_path, index=False, sep=',', quoting=csv.QUOTE_ALL)
     print(f"✅ structured.csv saved at: {output_path}")
 
+    # typed, columnar copy of tab separated player tables (needs pyarrow)
+    for file_name in os.listdir(RAW_DATA_DIR):
+        file_path = os.path.join(RAW_DATA_DIR, file_name)
+        if file_name.endswith(".txt") and detect_players_file(file_path):
+            parquet_name = os.path.splitext(file_name)[0] + ".parquet"
+            txt_to_parquet(file_path, os.path.join(OUTPUT_DIR, parquet_name))
+
 
 
 # =============================
@@ -2,23 +2,50 @@ import os
 import re
 import json
 import spacy
-from typing import List, Dict
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from typing import List, Dict, Iterable, Iterator, Tuple
+from triplet_store import TripletStore
+from jsonl_io import JsonlWriter, write_jsonl
 
 # ======================================================
 # 🔴 CHANGE PATH ONLY HERE
 # ======================================================
 RAW_TEXT_DIR = r"C:\Users\Soumya Shree\OneDrive\Attachments\milestone_2\data copy"
 
+# ======================================================
+# NLP settings
+# ======================================================
+# records are split into chunks ("line" or "sentence") that are fed
+# through nlp.pipe; n_process > 1 uses one worker process per core
+CHUNK_MODE = "line"
+MAX_CHUNK_CHARS = 100_000
+NLP_BATCH_SIZE = 256
+NLP_N_PROCESS = 1
+
+# relationships are only formed between entities of the same "row" or
+# "sentence", or ("tokens") at most RELATION_MAX_DISTANCE tokens apart
+RELATION_WINDOW = "row"
+RELATION_MAX_DISTANCE = 10
+RELATION_RULES = {"ORG": "associated_with", "GPE": "located_in"}
+
+# only the NER is used, the rest of the pipeline is skipped
+DISABLED_PIPES = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+
 # ======================================================
 # Load spaCy
 # ======================================================
-nlp = spacy.load("en_core_web_sm")
+nlp = spacy.load("en_core_web_sm", disable=DISABLED_PIPES)
 
 # ======================================================
 # 1. Clean & Normalize Text
 # ======================================================
-def clean_text(text: str) -> str:
+def clean_text(text: str, keep_lines: bool = False) -> str:
     text = text.replace("\r\n", "\n")
+    if keep_lines:
+        # clean every line on its own so rows stay one per line
+        lines = (clean_text(line) for line in text.split("\n"))
+        return "\n".join(line for line in lines if line)
     text = re.sub(r"\n+", " ", text)
     text = re.sub(r"\s+", " ", text)
     text = re.sub(r"[^\w\s.,:-]", "", text)
@@ -27,8 +54,7 @@ def clean_text(text: str) -> str:
 # ======================================================
 # 2. Read TXT Files
 # ======================================================
-def read_txt_files(folder_path: str) -> List[Dict]:
-    records = []
+def iter_txt_files(folder_path: str) -> Iterator[Dict]:
     doc_id = 1
 
     for file in os.listdir(folder_path):
@@ -36,57 +62,175 @@ def read_txt_files(folder_path: str) -> List[Dict]:
             with open(os.path.join(folder_path, file), "r", encoding="utf-8", errors="ignore") as f:
                 content = f.read()
 
-            records.append({
+            yield {
                 "id": doc_id,
                 "source_file": file,
-                "content": clean_text(content)
-            })
+                "content": clean_text(content, keep_lines=True)
+            }
             doc_id += 1
 
-    return records
+
+def read_txt_files(folder_path: str) -> List[Dict]:
+    return list(iter_txt_files(folder_path))
 
 # ======================================================
 # 3. Entity Extraction (spaCy)
 # ======================================================
-def extract_entities(text: str) -> List[Dict]:
-    doc = nlp(text)
-    entities = []
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_record(text: str, mode: str = CHUNK_MODE, max_chars: int = MAX_CHUNK_CHARS) -> List[Tuple[int, str]]:
+    """
+    Split a record into (offset, chunk) pairs by line or by sentence.
+    Chunks longer than max_chars are cut at the last whitespace so no
+    doc ever gets near spaCy's max_length.
+    """
+    if mode == "line":
+        pieces, pos = [], 0
+        for line in text.split("\n"):
+            pieces.append((pos, line))
+            pos += len(line) + 1
+    elif mode == "sentence":
+        pieces, pos = [], 0
+        for m in SENTENCE_END.finditer(text):
+            pieces.append((pos, text[pos:m.start()]))
+            pos = m.end()
+        pieces.append((pos, text[pos:]))
+    else:
+        raise ValueError("mode must be 'line' or 'sentence'")
+
+    chunks = []
+    for offset, piece in pieces:
+        while len(piece) > max_chars:
+            cut = piece.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            chunks.append((offset, piece[:cut]))
+            offset, piece = offset + cut, piece[cut:]
+        if piece.strip():
+            chunks.append((offset, piece))
+    return chunks
+
+
+def iter_record_entities(
+    records: Iterable[Dict],
+    batch_size: int = NLP_BATCH_SIZE,
+    n_process: int = NLP_N_PROCESS,
+    mode: str = CHUNK_MODE,
+    max_chars: int = MAX_CHUNK_CHARS,
+) -> Iterator[Tuple[Dict, List[Dict]]]:
+    """
+    Run NER over a stream of records with one nlp.pipe call and yield
+    (record, entities) as soon as all chunks of a record are done.
+    Entity start/end are character offsets into record["content"].
+    """
+    pending = deque()  # records whose chunks were handed to nlp.pipe
+
+    def tasks():
+        for i, record in enumerate(records):
+            pending.append(record)
+            # every record yields at least one task so none is skipped
+            chunks = split_record(record["content"], mode, max_chars) or [(0, "")]
+            for offset, chunk in chunks:
+                yield chunk, (i, offset)
+
+    current, entities = -1, []
+    for doc, (i, offset) in nlp.pipe(tasks(), as_tuples=True, batch_size=batch_size, n_process=n_process):
+        if i != current:
+            if current >= 0:
+                yield pending.popleft(), entities
+            current, entities = i, []
+        for ent in doc.ents:
+            entities.append({
+                "text": ent.text,
+                "label": ent.label_,
+                "start": offset + ent.start_char,
+                "end": offset + ent.end_char
+            })
+    if current >= 0:
+        yield pending.popleft(), entities
+
 
-    for ent in doc.ents:
-        entities.append({
-            "text": ent.text,
-            "label": ent.label_
-        })
+def extract_entities_batch(
+    texts: List[str],
+    batch_size: int = NLP_BATCH_SIZE,
+    n_process: int = NLP_N_PROCESS,
+    mode: str = CHUNK_MODE,
+    max_chars: int = MAX_CHUNK_CHARS,
+) -> List[List[Dict]]:
+    records = ({"content": t} for t in texts)
+    return [
+        entities
+        for _, entities in iter_record_entities(records, batch_size, n_process, mode, max_chars)
+    ]
 
-    return entities
+
+def extract_entities(text: str) -> List[Dict]:
+    return extract_entities_batch([text])[0]
 
 # ======================================================
 # 4. Relationship Extraction (simple rule-based)
 # ======================================================
-def extract_relationships(entities: List[Dict]) -> List[Dict]:
-    relationships = []
+TOKEN_START = re.compile(r"\S+")
 
-    persons = [e["text"] for e in entities if e["label"] == "PERSON"]
-    orgs = [e["text"] for e in entities if e["label"] == "ORG"]
-    locations = [e["text"] for e in entities if e["label"] == "GPE"]
 
-    for p in persons:
-        for o in orgs:
-            relationships.append({
-                "source": p,
-                "relation": "associated_with",
-                "target": o
-            })
+def _window_ids(entities: List[Dict], text: str, window: str) -> List[int]:
+    mode = "line" if window == "row" else window
+    bounds = [offset for offset, _ in split_record(text, mode, max_chars=len(text) + 1)]
+    return [bisect_right(bounds, e["start"]) - 1 for e in entities]
 
-    for p in persons:
-        for l in locations:
-            relationships.append({
-                "source": p,
-                "relation": "located_in",
-                "target": l
-            })
 
-    return relationships
+def iter_relationships(
+    entities: List[Dict],
+    text: str,
+    window: str = RELATION_WINDOW,
+    max_distance: int = RELATION_MAX_DISTANCE,
+) -> Iterator[Tuple[Dict, str, Dict]]:
+    """
+    Yields (person, relation, target) entity triples, pairing a PERSON
+    only with ORG / GPE entities inside the same window. Work and output
+    grow with the number of entities per window, not per record.
+    """
+    if window in ("row", "sentence"):
+        groups = defaultdict(list)
+        for ent, wid in zip(entities, _window_ids(entities, text, window)):
+            groups[wid].append(ent)
+        for group in groups.values():
+            persons = [e for e in group if e["label"] == "PERSON"]
+            for p in persons:
+                for t in group:
+                    relation = RELATION_RULES.get(t["label"])
+                    if relation:
+                        yield p, relation, t
+
+    elif window == "tokens":
+        token_starts = [m.start() for m in TOKEN_START.finditer(text)]
+        position = [bisect_right(token_starts, e["start"]) - 1 for e in entities]
+        targets = sorted(
+            (pos, i) for i, pos in enumerate(position) if entities[i]["label"] in RELATION_RULES
+        )
+        target_pos = [pos for pos, _ in targets]
+        for i, e in enumerate(entities):
+            if e["label"] != "PERSON":
+                continue
+            lo = bisect_left(target_pos, position[i] - max_distance)
+            hi = bisect_right(target_pos, position[i] + max_distance)
+            for _, j in targets[lo:hi]:
+                yield e, RELATION_RULES[entities[j]["label"]], entities[j]
+
+    else:
+        raise ValueError("window must be 'row', 'sentence' or 'tokens'")
+
+
+def extract_relationships(
+    entities: List[Dict],
+    text: str,
+    window: str = RELATION_WINDOW,
+    max_distance: int = RELATION_MAX_DISTANCE,
+) -> List[Dict]:
+    return [
+        {"source": p["text"], "relation": rel, "target": t["text"]}
+        for p, rel, t in iter_relationships(entities, text, window, max_distance)
+    ]
 
 # ======================================================
 # 5. Triplet Creation
@@ -97,27 +241,65 @@ def create_triplets(relationships: List[Dict]) -> List[List[str]]:
 # ======================================================
 # 6. Main Pipeline
 # ======================================================
-def process_dataset(records: List[Dict]):
-    output_entities = []
-    all_relationships = []
-    all_triplets = []
-
-    for record in records:
-        entities = extract_entities(record["content"])
-        relationships = extract_relationships(entities)
-        triplets = create_triplets(relationships)
+def iter_processed(
+    records: Iterable[Dict],
+    store: TripletStore,
+    batch_size: int = NLP_BATCH_SIZE,
+    n_process: int = NLP_N_PROCESS,
+    chunk_mode: str = CHUNK_MODE,
+    window: str = RELATION_WINDOW,
+    max_distance: int = RELATION_MAX_DISTANCE,
+) -> Iterator[Dict]:
+    """
+    Yield one output record (with its entities) at a time while adding
+    its relationships to `store`.
+    """
+    for record, entities in iter_record_entities(records, batch_size, n_process, chunk_mode):
+        for p, relation, t in iter_relationships(entities, record["content"], window, max_distance):
+            store.add(p["text"], relation, t["text"], p["label"], t["label"])
 
-        output_entities.append({
+        yield {
             "id": record["id"],
             "source_file": record["source_file"],
             "text": record["content"],
             "entities": entities
-        })
+        }
 
-        all_relationships.extend(relationships)
-        all_triplets.extend(triplets)
 
-    return output_entities, all_relationships, all_triplets
+def process_dataset(records: List[Dict], **opts):
+    """
+    Returns (output_entities, triplet_store). Relationships / triplets are
+    interned and deduplicated in a TripletStore; use
+    store.relationships() / store.triplets() to read them back.
+    Keyword options are those of iter_processed.
+    """
+    store = TripletStore()
+    output_entities = list(iter_processed(records, store, **opts))
+    store.compact()
+    return output_entities, store
+
+
+def process_dataset_streaming(
+    records: Iterable[Dict],
+    output_path: str = "output.jsonl",
+    relationship_path: str = "relationship.jsonl",
+    triplets_path: str = "triplets.jsonl",
+    **opts
+) -> TripletStore:
+    """
+    Streaming variant of process_dataset: every output record is written
+    as one JSON line as soon as it is processed, so the extraction result
+    is never held in memory. Relationships and triplets are written from
+    the (compact, deduplicated) TripletStore at the end. Use a .gz or
+    .zst suffix for compressed output; read back with jsonl_io.read_jsonl.
+    """
+    store = TripletStore()
+    with JsonlWriter(output_path) as w:
+        w.write_all(iter_processed(records, store, **opts))
+    print(f"✅ Saved {output_path} ({w.count} records)")
+    save_jsonl(relationship_path, store.relationships())
+    save_jsonl(triplets_path, store.triplets())
+    return store
 
 # ======================================================
 # 7. Save JSON
@@ -127,19 +309,35 @@ def save_json(filename: str, data):
         json.dump(data, f, indent=4)
     print(f"✅ Saved {filename}")
 
+
+def save_jsonl(filename: str, items: Iterable):
+    count = write_jsonl(filename, items)
+    print(f"✅ Saved {filename} ({count} lines)")
+
 # ======================================================
 # 8. Run
 # ======================================================
-if __name__ == "__main__":
-    records = read_txt_files(RAW_TEXT_DIR)
+# "jsonl" streams one item per line (add ".gz" / ".zst" to compress),
+# "json" writes the old indented output.json / relationship.json / triplets.json
+OUTPUT_FORMAT = "jsonl"
 
-    if not records:
-        print("❌ No TXT files found.")
+if __name__ == "__main__":
+    if OUTPUT_FORMAT == "jsonl":
+        # raise n_process to use more cores on large corpora
+        store = process_dataset_streaming(iter_txt_files(RAW_TEXT_DIR), n_process=NLP_N_PROCESS)
+        print(f"{len(store.entities)} entities, {len(store)} unique triplets")
+        print("🎉 Milestone-2 completed")
     else:
-        output, relationships, triplets = process_dataset(records)
+        records = read_txt_files(RAW_TEXT_DIR)
 
-        save_json("output.json", output)
-        save_json("relationship.json", relationships)
-        save_json("triplets.json", triplets)
+        if not records:
+            print("❌ No TXT files found.")
+        else:
+            output, store = process_dataset(records, n_process=NLP_N_PROCESS)
+            print(f"{len(store.entities)} entities, {len(store)} unique triplets")
 
-        print("🎉 Milestone-2 completed")
+            save_json("output.json", output)
+            save_json("relationship.json", list(store.relationships()))
+            save_json("triplets.json", list(store.triplets()))
+
+            print("🎉 Milestone-2 completed")
@@ -4,17 +4,35 @@ import faiss
 import numpy as np
 import json
 import csv
-import networkx as nx
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
-from sklearn.metrics.pairwise import cosine_similarity
 import os
+from chunker import iter_folder_chunks, batched, DEFAULT_BATCH_SIZE
+from embedding_cache import EmbeddingCache
+from manifest import MANIFEST_FILE, load_manifest, new_manifest, refresh_store, save_manifest
+from metadata_store import METADATA_DIR, MetadataStore, open_metadata, write_metadata_store
+from bitmap_filter import BITMAPS_FILE, BitmapIndex, filtered_search
+from bm25_index import BM25_FILE, RRF_K, build_bm25, rrf_fuse
+from streaming import TokenStream
+from context_packer import ContextPacker
+from knowledge_graph import GRAPH_FILE, KnowledgeGraph, load_graph, with_graph_facts
+from players_table import PlayersTable, detect_players_file
+from lazy_models import LazyResource
+from dedup import MINHASH_FILE, NearDuplicateIndex, chunk_sources, load_dedup_index, save_sources
+from evaluation import pairwise_similarity
+import tracing
+from tracing import count, span, trace
+from ann_index import build_id_index, is_id_index, fit_spec, load_spec, resolve_spec, save_spec, search_params, train_index, train_size
+from raw_vectors import RawVectors, rescore, vectors_path, write_raw_vectors
 
 # -------------------------------
 # 1. Load Structured Dataset
 # -------------------------------
-def load_dataset(folder_path):
+def load_dataset(folder_path, dedup=False):
+    """
+    dedup=True drops documents that near-duplicate one read before
+    (MinHash / LSH, see dedup.py).
+    """
     documents = []
+    index = NearDuplicateIndex() if dedup else None
 
     if not os.path.isdir(folder_path):
         raise ValueError("DATA_PATH must be a folder containing .txt files")
@@ -26,71 +44,401 @@ def load_dataset(folder_path):
             with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
                 text = f.read().strip()
 
-            if text:
-                documents.append(text)
-
+            if not text:
+                continue
+            if index is not None:
+                sig, group = index.signature(text), index.group(text)
+                if index.query(sig, group) is not None:
+                    continue
+                index.add(file, sig, group)
+            documents.append(text)
+
+    if index is not None:
+        print("Dedup:", index.stats())
     return documents
 
 
+def load_chunks(folder_path, **chunk_opts):
+    """
+    Stream the .txt files of a folder as row / multi-row / token-window
+    chunks (see chunker.iter_chunks for the options).
+    """
+    if not os.path.isdir(folder_path):
+        raise ValueError("DATA_PATH must be a folder containing .txt files")
+    return iter_folder_chunks(folder_path, **chunk_opts)
+
+
 # -------------------------------
 # 2. Embedding Generation
 # -------------------------------
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+EMBED_MODEL = "all-MiniLM-L6-v2"
+
+def load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL)
 
-def generate_embeddings(texts):
-    emb = embedder.encode(texts, convert_to_numpy=True)
-    return emb.astype('float32')  
+# models load on first use, not on import: a build that hits the
+# embedding cache for every chunk never loads the embedder at all
+embedder = LazyResource(load_embedder, "embedder")
+# texts seen before (previous builds, repeated queries) skip the forward pass
+embedding_cache = EmbeddingCache(EMBED_MODEL)
+
+def generate_embeddings(texts, batch_size=32):
+    def encode(batch):
+        count("embed.model_texts", len(batch))
+        with span("embed.model"):
+            return embedder.get().encode(batch, batch_size=batch_size, convert_to_numpy=True)
+    with span("embed"):
+        return embedding_cache.encode(list(texts), encode)
 
 
 # -------------------------------
 # 3. Vector Database (FAISS)
 # -------------------------------
 class VectorStore:
-    def __init__(self, dim):
-        self.index = faiss.IndexFlatL2(dim)
-        self.texts = []
-
-    def add(self, embeddings, texts):
+    """
+    index_spec selects the FAISS backend (flat / hnsw / ivf / ivfpq),
+    see ann_index.py. IVF indexes are trained on the first `train_size`
+    vectors that are added; call flush() once all batches are in.
+
+    Every vector is added with its chunk id (IVF natively, flat/HNSW via
+    an IndexIDMap2) so it can be removed again for incremental refresh.
+    texts / chunk_meta are dicts keyed by chunk id.
+
+    With a "quantize" spec the index only holds compact codes; the float32
+    vectors go to <index>.f32 on save_index() and searches rescore the
+    candidates from that memory-mapped file (raw_vectors.py).
+    """
+    def __init__(self, dim, index_spec=None):
+        self.dim = dim
+        self.spec = resolve_spec(index_spec)
+        self.index = build_id_index(dim, self.spec)
+        self.texts = {}
+        self.chunk_meta = {}
+        self.next_id = 0
+        self._pending = []
+        self.raw = None
+        self._raw_new = []
+
+    def add(self, embeddings, texts, metadata=None, ids=None):
         embeddings = embeddings.astype('float32')  # <-- ensure type
-        self.index.add(embeddings)
-        self.texts.extend(texts)
-
-
-    def search(self, query_embedding, k=3):
-        _, indices = self.index.search(query_embedding, k)
-        return [self.texts[i] for i in indices[0]]
+        if ids is None:
+            ids = range(self.next_id, self.next_id + len(texts))
+        ids = np.asarray(list(ids), dtype="int64")
+        metadata = metadata or [{} for _ in texts]
+        for i, t, m in zip(ids.tolist(), texts, metadata):
+            self.texts[i] = t
+            self.chunk_meta[i] = m
+        if len(ids):
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+        if self.spec["quantize"]:
+            # kept until save_index() writes them next to the codes
+            self._raw_new.append((ids, embeddings))
+
+        if self.index.is_trained:
+            with span("index.add"):
+                self.index.add_with_ids(embeddings, ids)
+            return
+
+        # collect a training sample before the first add
+        self._pending.append((embeddings, ids))
+        if sum(len(e) for e, _ in self._pending) >= train_size(self.spec):
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        sample = np.vstack([e for e, _ in self._pending])
+        ids = np.concatenate([i for _, i in self._pending])
+        self._pending = []
+        if len(sample) < train_size(self.spec):
+            # not enough vectors for the requested nlist / nbits
+            self.spec = fit_spec(self.spec, len(sample))
+            self.index = build_id_index(self.dim, self.spec)
+        with span("index.train"):
+            train_index(self.index, sample)
+        with span("index.add"):
+            self.index.add_with_ids(sample, ids)
+
+    def remove(self, ids):
+        ids = np.asarray(list(ids), dtype="int64")
+        if not len(ids):
+            return
+        for i in ids.tolist():
+            self.texts.pop(i, None)
+            self.chunk_meta.pop(i, None)
+        try:
+            self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW cannot delete in place: rebuild from the remaining vectors
+            # (quantized: from the float32 copies, not the lossy codes)
+            keep = np.asarray(sorted(self.texts), dtype="int64")
+            if not len(keep):
+                vectors = None
+            elif self.spec["quantize"]:
+                vectors = self._raw_vectors(keep)
+            else:
+                vectors = np.vstack([self.index.reconstruct(int(i)) for i in keep])
+            self.index = build_id_index(self.dim, self.spec)
+            if vectors is not None:
+                train_index(self.index, vectors)
+                self.index.add_with_ids(vectors, keep)
+
+    def _raw_vectors(self, ids):
+        """
+        float32 vectors of the (sorted) ids of a quantized store: the raw
+        file, overlaid with the ones added since the last save_index().
+        """
+        vectors = np.zeros((len(ids), self.dim), dtype="float32")
+        if self.raw is not None:
+            saved = ids < len(self.raw)
+            vectors[saved] = self.raw.get(ids[saved])
+        for new_ids, embeddings in self._raw_new:
+            pos = np.minimum(np.searchsorted(ids, new_ids), len(ids) - 1)
+            hit = ids[pos] == new_ids
+            vectors[pos[hit]] = embeddings[hit]
+        return vectors
+
+    def search_ids(self, query_embedding, k=3, nprobe=None, ef_search=None, filters=None, bitmaps=None):
+        # quantized: over-fetch from the codes, then rank by exact distance
+        # (once saved: vectors added since are not in the raw file yet)
+        exact = self.raw is not None and not self._raw_new
+        fetch = k * self.spec["rescore"] if exact else k
+        # filters, e.g. {"state": "Texas"}, need the BitmapIndex of this store
+        if filters:
+            _, indices = filtered_search(
+                self.index, query_embedding, fetch, bitmaps.mask(filters), nprobe=nprobe, ef_search=ef_search
+            )
+        else:
+            params = search_params(self.index, nprobe=nprobe, ef_search=ef_search)
+            with span("index.search"):
+                _, indices = self.index.search(query_embedding, fetch, params=params)
+        if exact:
+            with span("rescore"):
+                _, indices = rescore(self.raw, query_embedding, indices[0], k)
+        return [int(i) for i in indices[0] if i >= 0]
+
+    def search(self, query_embedding, k=3, nprobe=None, ef_search=None, filters=None, bitmaps=None):
+        ids = self.search_ids(query_embedding, k, nprobe=nprobe, ef_search=ef_search, filters=filters, bitmaps=bitmaps)
+        return [self.texts[i] for i in ids]
 
     # 🔹 SAVE FAISS INDEX
     def save_index(self, path="faiss.index"):
         faiss.write_index(self.index, path)
-
-    # 🔹 SAVE METADATA
-    def save_metadata(self, path="metadata.json"):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(
-                [{"id": i, "text": t} for i, t in enumerate(self.texts)],
-                f,
-                indent=2,
-                ensure_ascii=False
-            )
+        save_spec(path, self.spec)
+        if self.spec["quantize"]:
+            self.raw = write_raw_vectors(vectors_path(path), self.dim, self._raw_new, base=self.raw)
+            self._raw_new = []
+
+    # 🔹 SAVE METADATA (binary, memory-mappable store; see metadata_store.py)
+    def save_metadata(self, path=METADATA_DIR):
+        write_metadata_store(
+            path,
+            ({**self.chunk_meta[i], "id": i, "text": self.texts[i]} for i in sorted(self.texts)),
+        )
+
+    # 🔹 LOAD (for incremental refresh)
+    @classmethod
+    def load(cls, index_path="faiss.index", metadata_path=METADATA_DIR, index_spec=None):
+        index = faiss.read_index(index_path)
+        if not is_id_index(index):
+            raise ValueError(f"{index_path} is not ID-mapped, rebuild it from scratch")
+        store = cls.__new__(cls)
+        store.dim = index.d
+        # the spec it was saved with (fit_spec may have shrunk nlist / nbits);
+        # index_spec only for builds from before spec files
+        store.spec = resolve_spec(load_spec(index_path) or index_spec)
+        store.index = index
+        store.texts = {}
+        store.chunk_meta = {}
+        store._pending = []
+        store._raw_new = []
+        store.raw = RawVectors.open(index_path, index.d) if store.spec["quantize"] else None
+        if store.spec["quantize"] and store.raw is None:
+            raise ValueError(f"{vectors_path(index_path)} is missing, rebuild the quantized index")
+        metadata = open_metadata(metadata_path, legacy_path=None)
+        for entry in (metadata.values() if isinstance(metadata, dict) else metadata):
+            entry = dict(entry)
+            i = entry.pop("id")
+            store.texts[i] = entry.pop("text")
+            store.chunk_meta[i] = entry
+        store.next_id = max(store.texts, default=-1) + 1
+        return store
+
+
+def build_store(chunks, batch_size=DEFAULT_BATCH_SIZE, index_spec=None):
+    """
+    Embed and index a stream of chunks in bounded-memory batches.
+    Only one batch of embeddings is held in memory at a time.
+    """
+    store = None
+    for batch in batched(chunks, batch_size):
+        texts = [c["text"] for c in batch]
+        meta = [{k: v for k, v in c.items() if k not in ("id", "text")} for c in batch]
+        ids = [c["id"] for c in batch] if "id" in batch[0] else None
+        emb = generate_embeddings(texts)
+        if store is None:
+            store = VectorStore(dim=emb.shape[1], index_spec=index_spec)
+        store.add(emb, texts, meta, ids=ids)
+    if store is not None:
+        store.flush()
+    return store
+
+
+def refresh_index(
+    folder_path,
+    chunk_opts=None,
+    index_spec=None,
+    index_path="faiss.index",
+    metadata_path=METADATA_DIR,
+    manifest_path=MANIFEST_FILE,
+    dedup=False,
+):
+    """
+    Incremental build: only embeds chunks of added/changed files and
+    removes chunks of changed/deleted ones (see manifest.refresh_store).
+    Falls back to a full build when there is no manifest yet or the
+    chunking options / index spec / dedup setting changed.
+
+    dedup=True collapses near-duplicate chunks onto one canonical chunk
+    (MinHash signatures kept in metadata/minhash.npz); the chunks each
+    canonical one stands for are listed in metadata/sources.json.
+    """
+    if not os.path.isdir(folder_path):
+        raise ValueError("DATA_PATH must be a folder containing .txt files")
+    chunk_opts = chunk_opts or {}
+    index_spec = index_spec or {}
+
+    manifest = load_manifest(manifest_path)
+    store = None
+    if (
+        manifest is not None
+        and manifest["chunk_opts"] == chunk_opts
+        and manifest["index_spec"] == index_spec
+        and manifest.get("dedup", False) == dedup
+        and os.path.exists(index_path)
+        and os.path.exists(metadata_path)
+    ):
+        try:
+            store = VectorStore.load(index_path, metadata_path, index_spec)
+        except ValueError:
+            store = None
+    dedup_index = None
+    if dedup and store is not None:
+        dedup_index = load_dedup_index(metadata_path)
+        if dedup_index is None:
+            # missing or written by an older dedup: its collapses can't be trusted
+            store = None
+    if store is None:
+        manifest = new_manifest(chunk_opts, index_spec)
+        manifest["dedup"] = dedup
+    if dedup and dedup_index is None:
+        dedup_index = NearDuplicateIndex()
+
+    store, stats = refresh_store(
+        folder_path,
+        manifest,
+        store,
+        generate_embeddings,
+        lambda dim: VectorStore(dim, index_spec=index_spec),
+        dedup_index=dedup_index,
+    )
+    if dedup_index is not None:
+        stats["dedup"] = dedup_index.stats()
+    if store is not None:
+        with span("save_index"):
+            store.save_index(index_path)
+        with span("save_metadata"):
+            store.save_metadata(metadata_path)
+        with span("build_bitmaps"):
+            build_bitmaps(folder_path, metadata_path)
+        # lexical index over the same chunk ids, from the texts already in memory
+        with span("build_bm25"):
+            build_bm25(sorted(store.texts.items())).save(os.path.join(metadata_path, BM25_FILE))
+        save_sources(chunk_sources(manifest), metadata_path)
+        if dedup_index is not None:
+            dedup_index.save(os.path.join(metadata_path, MINHASH_FILE))
+        save_manifest(manifest, manifest_path)
+    return store, stats
+
+
+def build_bitmaps(folder_path, metadata_path=METADATA_DIR):
+    """
+    Precompute per-attribute bitmaps over chunk ids (source file, and
+    state / city / college for chunks of players tables) for filtered search.
+    """
+    tables = {}
+    for file_name in os.listdir(folder_path):
+        file_path = os.path.join(folder_path, file_name)
+        if file_name.endswith(".txt") and detect_players_file(file_path):
+            tables[file_name] = PlayersTable.from_txt(file_path)
+    bitmaps = BitmapIndex.build(MetadataStore(metadata_path), tables)
+    bitmaps.save(os.path.join(metadata_path, BITMAPS_FILE))
+    return bitmaps
 
 # -------------------------------
 # 4. Semantic Search
 # -------------------------------
-def semantic_search(query, store, k=3):
+def semantic_search(query, store, k=3, nprobe=None, ef_search=None, filters=None, bitmaps=None, reranker=None):
+    """
+    reranker: optional reranker.CrossEncoderReranker; candidates are then
+    over-fetched from FAISS and the k best by cross-encoder score kept.
+    """
     query_emb = generate_embeddings([query])
-    return store.search(query_emb, k)
+    if reranker is None:
+        return store.search(query_emb, k, nprobe=nprobe, ef_search=ef_search, filters=filters, bitmaps=bitmaps)
+    ids = store.search_ids(
+        query_emb, reranker.max_depth(k), nprobe=nprobe, ef_search=ef_search, filters=filters, bitmaps=bitmaps
+    )
+    top, _ = reranker.rerank(query, [{"id": i, "text": store.texts[i]} for i in ids], top_n=k)
+    return [c["text"] for c in top]
+
+
+def hybrid_search(
+    query,
+    store,
+    bm25,
+    k=3,
+    dense_k=20,
+    sparse_k=20,
+    rrf_k=RRF_K,
+    weights=(1.0, 1.0),
+    nprobe=None,
+    ef_search=None,
+    filters=None,
+    bitmaps=None,
+):
+    """
+    Dense (FAISS) + sparse (BM25) retrieval merged with reciprocal-rank
+    fusion. weights = (dense, sparse); (1, 0) is pure semantic search,
+    (0, 1) pure keyword search.
+    """
+    dense = []
+    if weights[0]:
+        query_emb = generate_embeddings([query])
+        dense = store.search_ids(query_emb, dense_k, nprobe=nprobe, ef_search=ef_search, filters=filters, bitmaps=bitmaps)
+    sparse = []
+    if weights[1]:
+        mask = bitmaps.mask(filters) if filters else None
+        sparse = bm25.search(query, sparse_k, mask=mask)[1].tolist()
+    fused = rrf_fuse([dense, sparse], k=k, rrf_k=rrf_k, weights=weights)
+    return [store.texts[i] for i, _ in fused if i in store.texts]
 
 # -------------------------------
 # 5. RAG-based Q&A
 # -------------------------------
-generator = pipeline("text-generation", model="gpt2")
-
-def rag_answer(query, store):
-    docs = semantic_search(query, store)
-    context = " ".join(docs)
-
-    prompt = f"""
+def load_generator():
+    from transformers import pipeline
+    return pipeline("text-generation", model="gpt2")
+
+# indexing never touches these, so only a process that answers loads gpt2
+generator = LazyResource(load_generator, "generator")
+
+# gpt2 has one 1024-token window for prompt + answer: the answer gets
+# ANSWER_TOKENS, the prompt is packed into the rest
+ANSWER_TOKENS = 100
+CONTEXT_CANDIDATES = 8
+RAG_PROMPT = """
 Context:
 {context}
 
@@ -99,26 +447,59 @@ Question:
 
 Answer:
 """
-    output = generator(prompt, max_length=150)
+packer = LazyResource(
+    lambda: ContextPacker.for_generator(generator.get(), RAG_PROMPT, max_new_tokens=ANSWER_TOKENS),
+    "context packer",
+)
+
+def build_rag_prompt(query, store):
+    with span("retrieve"):
+        docs = semantic_search(query, store, k=CONTEXT_CANDIDATES)
+    # graph facts first, then rank order; duplicates and what does not fit are dropped
+    with span("graph_facts"):
+        chunks = with_graph_facts([{"text": d} for d in docs], kg.get(), query)
+    with span("pack_prompt"):
+        return packer.get().pack(query, chunks)["prompt"]
+
+def rag_answer(query, store):
+    prompt = build_rag_prompt(query, store)
+    with span("generate"):
+        output = generator.get()(prompt, max_new_tokens=ANSWER_TOKENS)
     return output[0]["generated_text"]
 
+
+def rag_answer_stream(query, store):
+    """
+    Like rag_answer, but yields the answer (without the prompt) piece by
+    piece while gpt2 is still generating; see streaming.TokenStream.
+    """
+    prompt = build_rag_prompt(query, store)
+    yield from TokenStream(generator.get(), prompt, max_new_tokens=ANSWER_TOKENS)
+
 # -------------------------------
 # 6. Knowledge Graph (Optional)
 # -------------------------------
-kg = nx.Graph()
-kg.add_edge("RAG", "Retrieval")
-kg.add_edge("RAG", "Generation")
+# CSR graph over milestone2's triplets (+ player facts), see knowledge_graph.py;
+# build it with `python knowledge_graph.py`
+kg = LazyResource(lambda: load_graph(GRAPH_FILE) or KnowledgeGraph.from_triplets([]), "knowledge graph")
 
 def kg_enrichment(query):
-    return [node for node in kg.nodes if node.lower() in query.lower()]
+    # entities of the graph mentioned in the query (trie lookup)
+    graph = kg.get()
+    return [graph.names[i] for i in graph.link(query)]
+
+def kg_facts(query, hops=1):
+    return kg.get().facts(query, hops)
 
 # -------------------------------
 # 7. Evaluation
 # -------------------------------
+# mean similarity of predicted[i] to reference[i]; for whole datasets
+# (recall@k, MRR, cached batches) use evaluation.py
 def evaluate(predicted, reference):
     p_emb = generate_embeddings(predicted)
     r_emb = generate_embeddings(reference)
-    return cosine_similarity(p_emb, r_emb).mean()
+    return float(pairwise_similarity(p_emb, r_emb).mean())
 
 # 8. MAIN
 
@@ -126,30 +507,38 @@ if __name__ == "__main__":
 
     DATA_PATH = r"C:\Users\Soumya Shree\OneDrive\Attachments\milestone_2\data copy"
 
-    documents = load_dataset(DATA_PATH)
-    print(f"Loaded {len(documents)} documents")
-
-    doc_embeddings = generate_embeddings(documents)
-
-    store = VectorStore(dim=doc_embeddings.shape[1])
-    store.add(doc_embeddings, documents)
-    print("Number of documents:", len(documents))
+    # one chunk per player row; use mode="rows" / "tokens" for bigger chunks
+    CHUNK_OPTS = {"mode": "row"}
+    # e.g. {"type": "hnsw", "M": 32} or {"type": "ivf", "nlist": 64, "nprobe": 8}
+    # add "quantize": "int8" / "binary" for 4x / 32x smaller vectors (exact rescoring)
+    INDEX_SPEC = {"type": "flat"}
+    # collapse near-duplicate rows (re-scraped / overlapping files) before embedding
+    DEDUP = False
+
+    # 🔹 BUILD / REFRESH + SAVE OUTPUT FILES
+    # only added / changed files are re-embedded, see manifest.json
+    # RAG_TRACE=1 times every stage (RAG_TRACE_LOG=traces.jsonl keeps the spans)
+    with trace("refresh_index"):
+        store, stats = refresh_index(DATA_PATH, CHUNK_OPTS, INDEX_SPEC, dedup=DEDUP)
+    if store is None:
+        raise SystemExit("No chunks found in DATA_PATH")
+
+    print("Refresh:", stats)
+    print("Number of chunks:", len(store.texts))
     print("FAISS index total vectors:", store.index.ntotal)
-
-
-    # 🔹 SAVE OUTPUT FILES
-    store.save_index("faiss.index")
-    store.save_metadata("metadata.json")
+    print("Embedding cache:", embedding_cache.stats())
 
     print("\nSaved outputs:")
     print(" - faiss.index")
-    print(" - metadata.json")
+    print(" - metadata/ (binary metadata store)")
+    print(" - manifest.json")
 
     # evaluation
     eval_query = "Explain retrieval augmented generation"
     reference_answer = "RAG combines document retrieval with language generation"
 
-    generated_answer = rag_answer(eval_query, store)
+    with trace("rag_answer"):
+        generated_answer = rag_answer(eval_query, store)
 
     score = evaluate(
         [generated_answer],
@@ -157,11 +546,14 @@ if __name__ == "__main__":
     )
 
     print("\nEvaluation score:", round(score, 3))
-# Load FAISS index to check
-index = faiss.read_index("faiss.index")
-print("FAISS index ntotal:", index.ntotal)
-
-query = "example search query"
-query_emb = generate_embeddings([query])
-results = store.search(query_emb, k=3)
-print("Top results:", results)
+    if tracing.ENABLED:
+        print("\nStage timings:", json.dumps(tracing.registry.snapshot()["spans"], indent=2))
+
+    # Load FAISS index to check
+    index = faiss.read_index("faiss.index")
+    print("FAISS index ntotal:", index.ntotal)
+
+    query = "example search query"
+    query_emb = generate_embeddings([query])
+    results = store.search(query_emb, k=3)
+    print("Top results:", results)
@@ -0,0 +1,244 @@
+import os
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from chunker import iter_lines, looks_like_header
+
+# ==============================
+# SCHEMA
+# ==============================
+# players.txt is tab separated. Its header names 7 columns
+# ("Player height weight collage born birth_city birth_state") while
+# every row has 8 fields: the leading unnamed field is the player id.
+COLUMNS = ["id", "name", "height", "weight", "college", "born", "city", "state"]
+INT_COLUMNS = ("id", "height", "weight", "born")
+CATEGORY_COLUMNS = ("college", "city", "state")
+
+# header spellings mapped to schema columns
+HEADER_ALIASES = {
+    "player": "name",
+    "name": "name",
+    "height": "height",
+    "weight": "weight",
+    "collage": "college",
+    "college": "college",
+    "born": "born",
+    "birth_city": "city",
+    "city": "city",
+    "birth_state": "state",
+    "state": "state",
+    "id": "id",
+}
+
+MISSING_INT = -1
+PARQUET_BATCH_SIZE = 65_536
+
+
+# ==============================
+# PARSING
+# ==============================
+def header_columns(header: str) -> Optional[List[str]]:
+    """
+    Map a header line to schema columns, or None if it is not a
+    players-style header.
+    """
+    names = [h.strip().lower() for h in header.split("\t")]
+    columns = [HEADER_ALIASES.get(n) for n in names]
+    if None in columns or "name" not in columns:
+        return None
+    if "id" not in columns:
+        columns = ["id"] + columns
+    return columns
+
+
+def detect_players_file(file_path: str) -> Optional[List[str]]:
+    for line, _, _ in iter_lines(file_path):
+        if line.strip():
+            return header_columns(line) if looks_like_header(line) else None
+    return None
+
+
+def _to_int(value: str) -> int:
+    value = value.strip()
+    try:
+        return int(float(value)) if value else MISSING_INT
+    except ValueError:
+        return MISSING_INT
+
+
+def iter_player_rows(file_path: str) -> Iterator[Dict]:
+    """
+    Stream typed rows ({"id": int, "name": str, ...}) from a tab separated
+    players file. Missing numbers are MISSING_INT, missing strings "".
+    Raises ValueError if the file has no players header.
+    """
+    columns = detect_players_file(file_path)
+    if columns is None:
+        raise ValueError(f"{file_path} has no players header")
+
+    first = True
+    for line, _, _ in iter_lines(file_path):
+        if not line.strip():
+            continue
+        if first:
+            first = False
+            continue
+        fields = line.split("\t")
+        if len(fields) < len(columns):
+            fields += [""] * (len(columns) - len(fields))
+        row = {}
+        for col, value in zip(columns, fields):
+            row[col] = _to_int(value) if col in INT_COLUMNS else value.strip()
+        yield row
+
+
+# ==============================
+# COLUMNAR TABLE
+# ==============================
+class PlayersTable:
+    """
+    In-memory columnar players table: int32 numpy arrays for numeric
+    columns, int32 codes + a values list for categorical columns and an
+    object array for names. Row i of the table is data row i of the
+    source file (the same numbering as chunker row_start).
+    """
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Dict[str, List[str]]):
+        self.columns = columns
+        self.categories = categories
+        self._codes = {c: {v: i for i, v in enumerate(vals)} for c, vals in categories.items()}
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    # ---------- construction ----------
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict]) -> "PlayersTable":
+        ints = {c: [] for c in INT_COLUMNS}
+        codes = {c: [] for c in CATEGORY_COLUMNS}
+        values: Dict[str, Dict[str, int]] = {c: {} for c in CATEGORY_COLUMNS}
+        names = []
+        for row in rows:
+            for c in INT_COLUMNS:
+                ints[c].append(row.get(c, MISSING_INT))
+            for c in CATEGORY_COLUMNS:
+                codes[c].append(values[c].setdefault(row.get(c, ""), len(values[c])))
+            names.append(row.get("name", ""))
+
+        columns = {c: np.asarray(ints[c], dtype="int32") for c in INT_COLUMNS}
+        columns.update({c: np.asarray(codes[c], dtype="int32") for c in CATEGORY_COLUMNS})
+        columns["name"] = np.asarray(names, dtype=object)
+        return cls(columns, {c: list(values[c]) for c in CATEGORY_COLUMNS})
+
+    @classmethod
+    def from_txt(cls, file_path: str) -> "PlayersTable":
+        return cls.from_rows(iter_player_rows(file_path))
+
+    @classmethod
+    def from_parquet(cls, path: str) -> "PlayersTable":
+        pq = _require_pyarrow()[1]
+        table = pq.read_table(path)
+        columns, categories = {}, {}
+        for c in INT_COLUMNS:
+            columns[c] = table.column(c).to_numpy().astype("int32")
+        for c in CATEGORY_COLUMNS:
+            arr = table.column(c).combine_chunks().dictionary_encode()
+            categories[c] = arr.dictionary.to_pylist()
+            columns[c] = arr.indices.to_numpy(zero_copy_only=False).astype("int32")
+        columns["name"] = np.asarray(table.column("name").to_pylist(), dtype=object)
+        return cls(columns, categories)
+
+    # ---------- access ----------
+    def code(self, column: str, value: str) -> int:
+        """
+        Categorical code of value (case-insensitive), -1 if unknown.
+        """
+        codes = self._codes[column]
+        if value in codes:
+            return codes[value]
+        value = value.lower()
+        for v, i in codes.items():
+            if v.lower() == value:
+                return i
+        return -1
+
+    def value(self, column: str, i: int):
+        if column in CATEGORY_COLUMNS:
+            return self.categories[column][self.columns[column][i]]
+        if column == "name":
+            return self.columns["name"][i]
+        return int(self.columns[column][i])
+
+    def row(self, i: int) -> Dict:
+        return {c: self.value(c, i) for c in COLUMNS}
+
+    def rows(self, indices: Iterable[int]) -> List[Dict]:
+        return [self.row(int(i)) for i in indices]
+
+
+def row_text(row: Dict) -> str:
+    """
+    Readable one-line description of a typed row (used for answers).
+    """
+    parts = [row["name"]]
+    if row["height"] != MISSING_INT:
+        parts.append(f"{row['height']} cm")
+    if row["weight"] != MISSING_INT:
+        parts.append(f"{row['weight']} kg")
+    if row["college"]:
+        parts.append(row["college"])
+    born = []
+    if row["born"] != MISSING_INT:
+        born.append(f"born {row['born']}")
+    place = ", ".join(p for p in (row["city"], row["state"]) if p)
+    if place:
+        born.append(f"in {place}")
+    if born:
+        parts.append(" ".join(born))
+    return " | ".join(parts)
+
+
+# ==============================
+# PARQUET (pyarrow)
+# ==============================
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output needs the 'pyarrow' package") from e
+    return pa, pq
+
+
+def _schema(pa):
+    return pa.schema(
+        [(c, pa.int32()) if c in INT_COLUMNS else (c, pa.string()) for c in COLUMNS]
+    )
+
+
+def write_parquet(rows: Iterable[Dict], path: str, batch_size: int = PARQUET_BATCH_SIZE) -> int:
+    """
+    Stream typed rows into a Parquet file, one row group per batch.
+    Categorical columns are dictionary encoded by the writer.
+    """
+    pa, pq = _require_pyarrow()
+    schema = _schema(pa)
+    count = 0
+    with pq.ParquetWriter(path, schema, use_dictionary=list(CATEGORY_COLUMNS)) as writer:
+        batch: List[Dict] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def txt_to_parquet(file_path: str, out_path: Optional[str] = None) -> str:
+    out_path = out_path or os.path.splitext(file_path)[0] + ".parquet"
+    n = write_parquet(iter_player_rows(file_path), out_path)
+    print(f"✅ Wrote {n} typed rows to {out_path}")
+    return out_path
@@ -2,6 +2,7 @@ import os
 import re
 import pandas as pd
 from typing import List, Dict
+from dedup import collapse_rows
 
 # =============================
 # CONFIGURATION (EDIT ONLY HERE)
@@ -16,6 +17,10 @@ OUTPUT_DIR =r"C:\Users\Soumya Shree\OneDrive\Attachments\milestone_2\processed_d
 # Output CSV file name
 OUTPUT_FILE = "structured.csv"
 
+# Drop near-duplicate rows (same row in overlapping / re-scraped files)
+# (off until `python dedup.py structured.csv` reports 0 merged ids on new data)
+DEDUP = False
+
 
 # =============================
 # TEXT NORMALIZATION FUNCTION
@@ -45,7 +50,12 @@ def normalize_text(text: str) -> str:
 # DATA INGESTION FUNCTION
 # =============================
 
-def ingest_txt_files(folder_path: str) -> List[Dict]:
+def ingest_txt_files(folder_path: str, dedup: bool = False) -> List[Dict]:
+    """
+    One record per .txt file. With dedup=True, rows that near-duplicate
+    a row read earlier are dropped; the record lists them as
+    "duplicates": [[line, canonical file, canonical line], ...]
+    """
     records = []
     doc_id = 1
 
@@ -67,6 +77,12 @@ def ingest_txt_files(folder_path: str) -> List[Dict]:
 
             doc_id += 1
 
+    if dedup:
+        records, stats = collapse_rows(records, "cleaned_text", "file_name")
+        for record in records:
+            record["word_count"] = len(record["cleaned_text"].split())
+        print(f"Near-duplicate rows removed: {stats['duplicates']} of {stats['checked']} ({stats['removed_pct']}%)")
+
     return records
 
 
@@ -77,7 +93,7 @@ def ingest_txt_files(folder_path: str) -> List[Dict]:
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     print("Reading files from:", RAW_DATA_DIR)
-    data = ingest_txt_files(RAW_DATA_DIR)
+    data = ingest_txt_files(RAW_DATA_DIR, dedup=DEDUP)
     print("Number of documents read:", len(data))
 
     if not data:
@@ -0,0 +1,399 @@
+import re
+import time
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from players_table import MISSING_INT, PlayersTable, row_text
+
+# ==============================
+# CONFIGURATION
+# ==============================
+SORTED_COLUMNS = ("height", "weight", "born")
+MAX_LISTED = 10
+
+CM_PER_FOOT = 30.48
+CM_PER_INCH = 2.54
+KG_PER_LB = 0.45359237
+
+# comparison words; "strict" ones exclude the bound itself
+# (a bare "in" is not a unit: "taller than 200 in Texas")
+GREATER = r"(?:taller|heavier|older|more|greater|higher|bigger|over|above|at least|>=|>)"
+LESS = r"(?:shorter|lighter|younger|smaller|less|lower|under|below|at most|<=|<)"
+COMPARISON = re.compile(
+    r"(?P<cmp>" + GREATER + "|" + LESS + r")\s*(?:than\s+)?"
+    r"(?P<num>\d+(?:\.\d+)?)\s*"
+    r"(?P<unit>cm|centimeters?|meters?|m|kg|kilos?|kilograms?|lbs?|pounds?|ft|feet|foot|inches|inch)?\b"
+)
+BETWEEN = re.compile(
+    r"between\s+(?P<a>\d+(?:\.\d+)?)\s*(?:\w+\s+)?and\s+(?P<b>\d+(?:\.\d+)?)\s*"
+    r"(?P<unit>cm|centimeters?|meters?|m|kg|kilos?|kilograms?|lbs?|pounds?|ft|feet|foot|inches|inch)?\b"
+)
+BORN = re.compile(r"(?:born|birth)\D{0,40}?\b(after|since|before|in)\s+(\d{4})\b")
+BORN_BETWEEN = re.compile(r"(?:born|birth)\D{0,40}?\bbetween\s+(\d{4})\s+and\s+(\d{4})\b")
+
+HEIGHT_UNITS = ("cm", "centimeter", "centimeters", "m", "meter", "meters", "ft", "feet", "foot", "inch", "inches")
+WEIGHT_UNITS = ("kg", "kilo", "kilos", "kilogram", "kilograms", "lb", "lbs", "pound", "pounds")
+HEIGHT_WORDS = re.compile(r"height|tall|short")
+WEIGHT_WORDS = re.compile(r"weight|weigh|heav|light")
+
+SUPERLATIVES = {
+    "tallest": ("height", "max"),
+    "shortest": ("height", "min"),
+    "heaviest": ("weight", "max"),
+    "lightest": ("weight", "min"),
+    "oldest": ("born", "min"),
+    "youngest": ("born", "max"),
+}
+
+LIST_WORDS = re.compile(r"\b(players?|who|which|list|show|name|names|how many|count|number of)\b")
+
+# capitalized words that are not a constraint of their own (sentence
+# starts, question words); any other capitalized word must be covered by
+# a filter, or the question goes to retrieval
+ENTITY = re.compile(r"\b[A-Z][\w'&.-]*")
+QUESTION_WORDS = {
+    "a", "an", "the", "i", "me", "please", "can", "could", "tell", "give", "find", "list", "show",
+    "name", "names", "count", "which", "who", "whose", "what", "how", "is", "are", "was", "were",
+    "do", "does", "did", "all", "any", "players", "player", "average", "mean", "height", "weight",
+    "born", "in", "from", "of", "and", "or", "with", "at", "for", "to", "nba", "aba",
+} | set(SUPERLATIVES)
+
+# "Duke University" is also "Duke"; these are the short names that are
+# not just the full name minus "University (of)" / "College"
+COLLEGE_ABBREVIATIONS = {
+    "ucla": "University of California, Los Angeles",
+    "unc": "University of North Carolina",
+    "usc": "University of Southern California",
+    "lsu": "Louisiana State University",
+    "unlv": "University of Nevada, Las Vegas",
+    "byu": "Brigham Young University",
+    "smu": "Southern Methodist University",
+    "tcu": "Texas Christian University",
+    "utep": "University of Texas at El Paso",
+    "vcu": "Virginia Commonwealth University",
+    "uconn": "University of Connecticut",
+    "uab": "University of Alabama at Birmingham",
+    "umass": "University of Massachusetts Amherst",
+    "nc state": "North Carolina State University",
+}
+COLLEGE_AFFIXES = re.compile(r"^(?:the )?(?:university|college) of |(?: university| college)$")
+
+
+# ==============================
+# SORTED INDEXES
+# ==============================
+class PlayerIndex:
+    """
+    PlayersTable plus a precomputed argsort per numeric column (a range
+    filter is two binary searches and a slice) and one precompiled
+    regex per categorical column for matching values in questions
+    (colleges also by short name, see college_aliases), plus one for
+    the full player names.
+    """
+    def __init__(self, table: PlayersTable):
+        self.table = table
+        self.order: Dict[str, np.ndarray] = {}
+        self.sorted: Dict[str, np.ndarray] = {}
+        for col in SORTED_COLUMNS:
+            values = table.columns[col]
+            valid = np.flatnonzero(values != MISSING_INT)
+            order = valid[np.argsort(values[valid], kind="stable")]
+            self.order[col] = order
+            self.sorted[col] = values[order]
+
+        self.matchers: Dict[str, Tuple[re.Pattern, Dict[str, int]]] = {}
+        for col in ("college", "state", "city"):
+            codes = {v.lower(): i for i, v in enumerate(table.categories[col]) if len(v) >= 3}
+            if col == "college":
+                codes.update(college_aliases(table))
+            if codes:
+                self.matchers[col] = (_alternatives(codes), codes)
+
+        # "Bob McAdoo*": the Hall of Fame mark is not part of the name
+        names = {n.strip(" *").lower() for n in table.columns["name"] if " " in n.strip()}
+        self.names = _alternatives(names) if names else None
+
+    def range_ids(self, col: str, lo: Optional[float], hi: Optional[float]) -> np.ndarray:
+        vals = self.sorted[col]
+        start = 0 if lo is None else int(np.searchsorted(vals, lo, side="left"))
+        end = len(vals) if hi is None else int(np.searchsorted(vals, hi, side="right"))
+        return self.order[col][start:end]
+
+    def extreme(self, col: str, kind: str, candidates: np.ndarray) -> int:
+        values = self.table.columns[col][candidates]
+        valid = values != MISSING_INT
+        if not valid.any():
+            return -1
+        candidates, values = candidates[valid], values[valid]
+        return int(candidates[np.argmax(values) if kind == "max" else np.argmin(values)])
+
+
+def _alternatives(values: Iterable[str]) -> re.Pattern:
+    # longest first, so "university of north carolina at charlotte" wins
+    alternatives = "|".join(re.escape(v) for v in sorted(values, key=len, reverse=True))
+    return re.compile(r"\b(?:" + alternatives + r")\b")
+
+
+def college_aliases(table: PlayersTable) -> Dict[str, int]:
+    """
+    {short name: college code}: the value without "University (of)" /
+    "College" ("duke") and COLLEGE_ABBREVIATIONS ("ucla"). A short name
+    shared by two colleges ("miami") or equal to a state / city
+    ("kentucky", "louisville") is left out.
+    """
+    codes = {v.lower(): i for i, v in enumerate(table.categories["college"])}
+    places = {v.lower() for col in ("state", "city") for v in table.categories[col]}
+    aliases: Dict[str, List[int]] = {}
+    for value, code in codes.items():
+        short = COLLEGE_AFFIXES.sub("", value)
+        if short != value and len(short) >= 3:
+            aliases.setdefault(short, []).append(code)
+    for short, value in COLLEGE_ABBREVIATIONS.items():
+        if value.lower() in codes:
+            aliases.setdefault(short, []).append(codes[value.lower()])
+    return {
+        short: found[0] for short, found in aliases.items()
+        if len(set(found)) == 1 and short not in codes and short not in places
+    }
+
+
+# ==============================
+# QUESTION PARSING
+# ==============================
+def _to_cm(value: float, unit: Optional[str]) -> float:
+    unit = (unit or "").lower()
+    if unit in ("ft", "feet", "foot"):
+        return value * CM_PER_FOOT
+    if unit in ("inch", "inches"):
+        return value * CM_PER_INCH
+    if unit in ("m", "meter", "meters") and value < 3:
+        return value * 100
+    return value
+
+
+def _to_kg(value: float, unit: Optional[str]) -> float:
+    unit = (unit or "").lower()
+    if unit in ("lb", "lbs", "pound", "pounds"):
+        return value * KG_PER_LB
+    return value
+
+
+def _column_for(q: str, start: int, end: int, unit: Optional[str]) -> Optional[str]:
+    unit = (unit or "").lower()
+    if unit in HEIGHT_UNITS:
+        return "height"
+    if unit in WEIGHT_UNITS:
+        return "weight"
+    # no unit: look at the words right around the comparison
+    around = q[max(0, start - 25):end + 15]
+    if HEIGHT_WORDS.search(around):
+        return "height"
+    if WEIGHT_WORDS.search(around):
+        return "weight"
+    return None
+
+
+def _numeric_filters(q: str) -> Tuple[List[Tuple[str, Optional[float], Optional[float]]], List[Tuple[int, int]]]:
+    """
+    Range filters in the question and the spans of q they came from.
+    """
+    filters = []
+    used = []
+    spans = []
+
+    # "born after 1980", "born in Texas before 1960", "born between 1970 and 1980"
+    for m in BORN_BETWEEN.finditer(q):
+        filters.append(("born", int(m.group(1)), int(m.group(2))))
+        used.append((m.start(), m.end()))
+        spans.append(m.span())
+    for m in BORN.finditer(q):
+        if any(s <= m.start() < e for s, e in used):
+            continue
+        word, year = m.group(1), int(m.group(2))
+        if word in ("after", "since"):
+            filters.append(("born", year + (word == "after"), None))
+        elif word == "before":
+            filters.append(("born", None, year - 1))
+        else:
+            filters.append(("born", year, year))
+        used.append((m.start(2), m.end(2)))
+        spans.append(m.span())
+
+    # "height between 200 and 205 cm"
+    for m in BETWEEN.finditer(q):
+        if any(s <= m.start("a") < e for s, e in used):
+            continue
+        col = _column_for(q, m.start(), m.end(), m.group("unit"))
+        if col:
+            convert = _to_cm if col == "height" else _to_kg
+            filters.append((col, convert(float(m.group("a")), m.group("unit")), convert(float(m.group("b")), m.group("unit"))))
+            used.append((m.start(), m.end()))
+            spans.append(m.span())
+
+    # "taller than 210 cm", "over 7 feet", "under 100 kg", "at least 220 cm tall"
+    for m in COMPARISON.finditer(q):
+        if any(s <= m.start("num") < e for s, e in used):
+            continue
+        col = _column_for(q, m.start(), m.end(), m.group("unit"))
+        if col is None:
+            continue
+        convert = _to_cm if col == "height" else _to_kg
+        value = convert(float(m.group("num")), m.group("unit"))
+        strict = m.group("cmp") not in ("at least", "at most", ">=", "<=")
+        step = 1 if strict and float(value).is_integer() else 0
+        if re.fullmatch(GREATER, m.group("cmp")):
+            filters.append((col, value + step, None))
+        else:
+            filters.append((col, None, value - step))
+        spans.append(m.span())
+    return filters, spans
+
+
+def _category_filters(q: str, index: PlayerIndex) -> Tuple[List[Tuple[str, List[int]]], List[Tuple[int, int]]]:
+    """
+    Match known college / state / city values in the question (longest
+    value wins, each span of the question is used once). Several values
+    of one column ("from Ohio or Texas") are alternatives. Returns the
+    filters and the spans of q they came from.
+    """
+    found = []
+    used = []
+    for col, (pattern, codes) in index.matchers.items():
+        matched = []
+        for m in pattern.finditer(q):
+            if any(m.start() < e and s < m.end() for s, e in used):
+                continue
+            used.append((m.start(), m.end()))
+            if codes[m.group(0)] not in matched:
+                matched.append(codes[m.group(0)])
+        if matched:
+            found.append((col, matched))
+    return found, used
+
+
+def _unused_constraint(question: str, q: str, spans: List[Tuple[int, int]]) -> bool:
+    """
+    True if the question has a comparison or a capitalized name (player,
+    team, unknown school) that none of the matched filters covers:
+    answering without it would give the wrong players, not just more.
+    """
+    def covered(start, end):
+        return any(s <= start and end <= e for s, e in spans)
+
+    if any(not covered(*m.span("num")) for m in COMPARISON.finditer(q)):
+        return True
+    return any(
+        m.group(0).lower() not in QUESTION_WORDS and not covered(*m.span())
+        for m in ENTITY.finditer(question)
+    )
+
+
+def parse_question(question: str, index: PlayerIndex) -> Optional[Dict]:
+    """
+    Return a structured plan {"filters", "categories", "aggregate"} for
+    filter / aggregate style questions, or None for open-ended ones and
+    ones with a constraint the plan could not express.
+    """
+    q = question.lower()
+    if index.names is not None and index.names.search(q):
+        # about one player ("is Kobe Bryant taller than 200 cm"), not a filter
+        return None
+    filters, spans = _numeric_filters(q)
+    categories, category_spans = _category_filters(q, index)
+    if _unused_constraint(question, q, spans + category_spans):
+        return None
+
+    aggregate = None
+    if re.search(r"\bhow many\b|\bcount\b|\bnumber of\b", q):
+        aggregate = ("count", None)
+    else:
+        m = re.search(r"\b(average|mean|avg)\s+(height|weight|birth year)", q)
+        if m:
+            aggregate = ("avg", "born" if m.group(2) == "birth year" else m.group(2))
+        elif LIST_WORDS.search(q):
+            # "tallest player", not "tallest building in Texas"
+            for word, (col, kind) in SUPERLATIVES.items():
+                if re.search(r"\b" + word + r"\b", q):
+                    aggregate = (kind, col)
+                    break
+
+    if not (filters or aggregate or (categories and LIST_WORDS.search(q))):
+        return None
+    return {"filters": filters, "categories": categories, "aggregate": aggregate}
+
+
+# ==============================
+# EXECUTION
+# ==============================
+def describe_plan(plan: Dict, table: PlayersTable) -> str:
+    parts = []
+    for col, lo, hi in plan["filters"]:
+        if lo is not None and hi is not None:
+            parts.append(f"{col} {lo:g}–{hi:g}")
+        elif lo is not None:
+            parts.append(f"{col} ≥ {lo:g}")
+        else:
+            parts.append(f"{col} ≤ {hi:g}")
+    for col, codes in plan["categories"]:
+        values = " or ".join(table.categories[col][code] if code >= 0 else "?" for code in codes)
+        parts.append(f"{col} = {values}")
+    return ", ".join(parts) or "all players"
+
+
+def execute(plan: Dict, index: PlayerIndex) -> Dict:
+    table = index.table
+    n = len(table)
+    mask = np.ones(n, dtype=bool)
+    for col, lo, hi in plan["filters"]:
+        hit = np.zeros(n, dtype=bool)
+        hit[index.range_ids(col, lo, hi)] = True
+        mask &= hit
+    for col, codes in plan["categories"]:
+        mask &= np.isin(table.columns[col], codes)
+    ids = np.flatnonzero(mask)
+    where = describe_plan(plan, table)
+
+    kind, col = plan["aggregate"] or ("list", None)
+    if kind == "count":
+        answer = f"{len(ids)} players match ({where})."
+        shown = ids[:MAX_LISTED]
+    elif kind == "avg":
+        values = table.columns[col][ids]
+        values = values[values != MISSING_INT]
+        answer = (
+            f"Average {col} is {values.mean():.1f} over {len(values)} players ({where})."
+            if len(values) else f"No players with a known {col} match ({where})."
+        )
+        shown = ids[:MAX_LISTED]
+    elif kind in ("max", "min"):
+        best = index.extreme(col, kind, ids) if len(ids) else -1
+        if best < 0:
+            answer = f"No players match ({where})."
+            shown = ids[:0]
+        else:
+            word = [w for w, v in SUPERLATIVES.items() if v == (col, kind)][0]
+            answer = f"The {word} player ({where}) is {row_text(table.row(best))}."
+            shown = np.array([best])
+    else:
+        shown = ids[:MAX_LISTED]
+        listed = "; ".join(row_text(r) for r in table.rows(shown))
+        more = f" (showing {len(shown)})" if len(ids) > len(shown) else ""
+        answer = f"{len(ids)} players match ({where}){more}: {listed}" if len(ids) else f"No players match ({where})."
+
+    return {"answer": answer, "count": int(len(ids)), "rows": table.rows(shown)}
+
+
+def route(question: str, index: Optional[PlayerIndex]) -> Optional[Dict]:
+    """
+    Answer filter / aggregate questions straight from the table.
+    Returns None when the question should go to retrieval + generation.
+    """
+    if index is None:
+        return None
+    start = time.perf_counter()
+    plan = parse_question(question, index)
+    if plan is None:
+        return None
+    result = execute(plan, index)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
@@ -4,69 +4,205 @@ import streamlit as st
 import faiss
 import json
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
-from sklearn.metrics.pairwise import cosine_similarity
+from answer_cache import SemanticAnswerCache, scope_key
+from embedding_cache import EmbeddingCache
+import os
+import urllib.request
+from players_table import PlayersTable
+from query_router import PlayerIndex, route
+from reranker import CrossEncoderReranker
+from knowledge_graph import GRAPH_FILE, load_graph, with_graph_facts
+from context_packer import ContextPacker
+from retrieval import CONTEXT_CANDIDATES, PROMPT_TEMPLATE, Retriever, generated_text
+from streaming import TokenStream, iter_sse
+from bitmap_filter import load_bitmaps
+from bm25_index import BM25_FILE
+from lazy_models import LazyResource, warm_up
+import tracing
+from tracing import count, span, trace
+import time
+
+# =========================
+# --- 0. Optional API backend ---
+# =========================
+# Set RAG_API_URL (e.g. http://localhost:8000, see api.py) to share one
+# model server between app instances instead of loading models here.
+API_URL = os.environ.get("RAG_API_URL")
+
+def api_call(path, payload=None):
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(
+        API_URL.rstrip("/") + path, data=data, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req) as resp:
+        return json.load(resp)
 
 # =========================
 # --- 1. Load Models ---
 # =========================
+EMBED_MODEL = "all-MiniLM-L6-v2"
+GEN_MODEL = "google/flan-t5-base"
+
+def load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBED_MODEL)
+
+def load_generator():
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=GEN_MODEL)
+
 @st.cache_resource
 def load_models():
-    embedder = SentenceTransformer("all-MiniLM-L6-v2")
-    generator = pipeline(
-        "text2text-generation",
-        model="google/flan-t5-base"
-    )
-    return embedder, generator
+    # nothing is loaded here: the page renders right away, the models load
+    # on first use or in the background warm-up started below
+    embedder = LazyResource(load_embedder, "embedder")
+    generator = LazyResource(load_generator, "generator")
+    # fits the best retrieved chunks into flan-t5's input window
+    packer = LazyResource(lambda: ContextPacker.for_generator(generator.get(), PROMPT_TEMPLATE), "context packer")
+    return embedder, generator, packer
+
+@st.cache_resource
+def load_embedding_cache():
+    return EmbeddingCache(EMBED_MODEL)
 
-embedder, generator = load_models()
+if API_URL is None:
+    embedder, generator, packer = load_models()
+    embedding_cache = load_embedding_cache()
 
 # =========================
 # --- 2. Load FAISS Index + Metadata ---
 # =========================
-@st.cache_data
-def load_faiss_metadata():
-    # <<< EDIT PATH BELOW IF NEEDED >>>
-    index = faiss.read_index("faiss.index")
-    with open("metadata.json", "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-    return index, metadata
+def embed_text(text):
+    if API_URL:
+        return np.asarray(api_call("/embed", {"texts": [text]})["vectors"], dtype="float32")
+    return embedding_cache.encode(
+        [text], lambda texts: embedder.get().encode(texts, convert_to_numpy=True)
+    )
+
+# <<< EDIT PATHS BELOW IF NEEDED >>>
+INDEX_PATH = "faiss.index"
+METADATA_PATH = "metadata"
 
-index, metadata = load_faiss_metadata()
+@st.cache_resource  # shared, not copied: the index and the mmap'd store are read-only
+def load_retriever():
+    # FAISS index + metadata store + filter bitmaps + BM25 (see retrieval.py)
+    return LazyResource(
+        lambda: Retriever.load(lambda texts: embed_text(texts[0]), INDEX_PATH, METADATA_PATH), "retriever"
+    )
+
+retriever = load_retriever() if API_URL is None else None
+
+@st.cache_resource
+def load_answer_cache():
+    # near-duplicate questions reuse a stored answer (see answer_cache.py)
+    return LazyResource(lambda: SemanticAnswerCache(retriever.get().index.d), "answer cache")
+
+answer_cache = load_answer_cache() if API_URL is None else None
 
 # =========================
-# --- 3. Functions ---
+# --- 2b. Typed Player Table (structured fast path) ---
 # =========================
-def embed_text(text):
-    return embedder.encode([text], convert_to_numpy=True).astype("float32")
+# <<< EDIT PATHS BELOW IF NEEDED >>>
+PLAYERS_PARQUET = "players.parquet"
+PLAYERS_TXT = "players.txt"
 
-def retrieve_docs(query, k=3):
-    q_emb = embed_text(query)
-    _, indices = index.search(q_emb, k)
-    docs = [metadata[i]["text"] for i in indices[0]]
-    return docs
+@st.cache_resource
+def load_player_index():
+    if os.path.exists(PLAYERS_PARQUET):
+        return PlayerIndex(PlayersTable.from_parquet(PLAYERS_PARQUET))
+    if os.path.exists(PLAYERS_TXT):
+        return PlayerIndex(PlayersTable.from_txt(PLAYERS_TXT))
+    return None  # no table: every question goes through retrieval
 
-def rag_answer(query, docs):
-    context = " ".join(docs)
-    context = context[:1500]  # limit context
+player_index = load_player_index()
 
-    prompt = f"""
-Answer using context.
+# =========================
+# --- 2c. Knowledge Graph (entity facts for the context) ---
+# =========================
+@st.cache_resource
+def load_knowledge_graph():
+    # value is None until knowledge_graph.py has been run
+    return LazyResource(lambda: load_graph(GRAPH_FILE), "knowledge graph")
 
-Context:
-{context}
+knowledge_graph = load_knowledge_graph() if API_URL is None else None
 
-Question:
-{query}
-"""
-    output = generator(prompt, max_length=200)
-    return output[0]["generated_text"]
+@st.cache_resource
+def start_warm_up():
+    # once per server process: index first (needed by every question),
+    # then the models; a question asked meanwhile waits only for what it uses
+    return warm_up([retriever, embedder, knowledge_graph, answer_cache, generator, packer])
 
-def evaluate(ans, ref):
-    a = embed_text(ans)
-    r = embed_text(ref)
-    return cosine_similarity(a, r)[0][0]
+if API_URL is None:
+    start_warm_up()
+
+# =========================
+# --- 3. Functions ---
+# =========================
+def retrieve(query, k=3, nprobe=None, ef_search=None, filters=None, weights=(1.0, 1.0), query_emb=None):
+    # nprobe (IVF) / ef_search (HNSW) trade recall for latency per request;
+    # weights = (dense, BM25) for reciprocal-rank fusion
+    if API_URL:
+        return api_call("/search", {
+            "query": query, "k": k, "nprobe": nprobe, "ef_search": ef_search,
+            "filters": filters or None, "weights": list(weights),
+        })["results"]
+    return retriever.get().search(
+        query, k, nprobe=nprobe, ef_search=ef_search, filters=filters, weights=weights, query_emb=query_emb
+    )
+
+@st.cache_resource
+def load_reranker():
+    return CrossEncoderReranker()
+
+def retrieve_ranked(query, rerank=False, k=CONTEXT_CANDIDATES, **opts):
+    # (results, rerank stats or None); reranking over-fetches candidates
+    # and keeps the k best by cross-encoder score
+    if API_URL:
+        resp = api_call("/search", {
+            "query": query, "k": k, "rerank": rerank, "filters": opts.get("filters") or None,
+            "weights": list(opts.get("weights", (1.0, 1.0))),
+        })
+        return resp["results"], resp.get("rerank")
+    if not rerank:
+        return retrieve(query, k=k, **opts), None
+    reranker = load_reranker()
+    candidates = retrieve(query, k=reranker.max_depth(k), **opts)
+    return reranker.rerank(query, candidates, top_n=k)
+
+def retrieve_docs(query, **opts):
+    return [r["text"] for r in retrieve(query, **opts)]
+
+def rag_answer(query, docs):
+    if API_URL:
+        return api_call("/answer", {"query": query, "structured": False, "documents": docs})["answer"]
+    with span("pack_prompt"):
+        prompt = packer.get().pack(query, [{"text": d} for d in docs])["prompt"]
+    with span("generate"):
+        output = generator.get()(prompt, max_length=200)
+    return generated_text(output[0])
+
+def stream_answer(query, docs, prompt=None, graph_hops=0):
+    # yields answer text pieces as the generator produces them;
+    # prompt is the packed prompt for docs (the API service packs its own
+    # and adds the knowledge-graph facts itself)
+    if API_URL:
+        req = urllib.request.Request(
+            API_URL.rstrip("/") + "/answer/stream",
+            data=json.dumps({
+                "query": query, "structured": False, "documents": docs, "graph_hops": graph_hops,
+            }).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(req) as resp:
+            for event in iter_sse(resp):
+                if event["event"] == "token":
+                    yield event["data"]["text"]
+        return
+    if prompt is None:
+        with span("pack_prompt"):
+            prompt = packer.get().pack(query, [{"text": d} for d in docs])["prompt"]
+    with span("generate"):
+        yield from TokenStream(generator.get(), prompt, max_length=200)
 
 # =========================
 # --- 4. Streamlit UI ---
@@ -146,25 +282,130 @@ st.markdown("<p>Ask anything from your dataset!</p>", unsafe_allow_html=True)
 
 query = st.text_input("💬 Enter your question here:")
 
-if st.button("✨ Get Answer") and query:
+# optional metadata filters for retrieval
+@st.cache_data
+def filter_values():
+    if API_URL:
+        return api_call("/filters")
+    # read straight from disk so the sidebar does not wait for the index
+    bitmaps = load_bitmaps(METADATA_PATH)
+    if bitmaps is None:
+        return {}
+    return {attr: bitmaps.values(attr) for attr in ("state", "college", "source_file")}
+
+filters = {}
+if filter_values():
+    st.sidebar.markdown("### 🔎 Filters")
+    for attr, label in (("state", "Birth state"), ("college", "College"), ("source_file", "Source file")):
+        chosen = st.sidebar.multiselect(label, filter_values().get(attr, []))
+        if chosen:
+            filters[attr] = chosen
+
+# hybrid retrieval: how much the keyword (BM25) ranking counts vs. the dense one
+keyword_weight = 1.0
+if API_URL or os.path.exists(os.path.join(METADATA_PATH, BM25_FILE)):
+    keyword_weight = st.sidebar.slider("🔤 Keyword weight (BM25)", 0.0, 2.0, 1.0, 0.1)
+
+# second stage: cross-encoder over a deeper candidate list
+use_rerank = st.sidebar.checkbox("🎯 Rerank with cross-encoder", value=False)
 
-    with st.spinner("🤔 Thinking..."):
-        docs = retrieve_docs(query)
-        answer = rag_answer(query, docs)
+# facts about the entities named in the question, from the knowledge graph
+graph_hops = 0
+if API_URL or os.path.exists(GRAPH_FILE):
+    graph_hops = st.sidebar.slider("🕸️ Knowledge-graph hops", 0, 3, 1)
 
-        # optional evaluation
-        reference = "This is expected answer"
-        score = evaluate(answer, reference)
+clicked = st.button("✨ Get Answer")
 
-    # Display Answer
+# filter / aggregate questions are answered straight from the player table
+routed = route(query, player_index) if clicked and query else None
+
+if routed:
+    st.markdown(
+        f"<div class='answer-box'><strong>💡 Answer:</strong><br>{routed['answer']}</div>",
+        unsafe_allow_html=True
+    )
     st.markdown(
+        f"<div class='eval-box'><strong>⚡ Structured query:</strong> {routed['count']} matching players "
+        f"in {routed['elapsed_ms']} ms</div>",
+        unsafe_allow_html=True
+    )
+    if routed["rows"]:
+        st.dataframe(routed["rows"])
+
+elif clicked and query:
+
+    # per-stage timings (RAG_TRACE=1, see tracing.py)
+    with trace("query"):
+        started = time.perf_counter()
+        weights = (1.0, keyword_weight)
+        scope = scope_key(filters=filters, weights=weights, rerank=use_rerank, graph_hops=graph_hops)
+
+        # the query embedding is computed once: cache key + dense retrieval
+        local = API_URL is None
+        cache = answer_cache.get() if local else None
+        version = retriever.get().version if local else None
+        with span("embed"):
+            q_emb = embed_text(query) if local else None
+        with span("answer_cache.get"):
+            cached = cache.get(q_emb, version, scope) if local else None
+        if local:
+            count("answer_cache.hit" if cached else "answer_cache.miss")
+
+        answer_box = st.empty()
+        rerank_info = None
+        if cached:
+            docs = [retriever.get().text(i) for i in cached["sources"]]
+            answer = cached["answer"]
+            ttft_ms = round((time.perf_counter() - started) * 1000)
+        else:
+            with st.spinner("🤔 Thinking..."):
+                with span("retrieve", rerank=use_rerank):
+                    results, rerank_info = retrieve_ranked(
+                        query, rerank=use_rerank, filters=filters, weights=weights, query_emb=q_emb
+                    )
+                prompt = None
+                if local:
+                    with span("graph_facts"):
+                        results = with_graph_facts(results, knowledge_graph.get(), query, graph_hops)
+                    # best-scoring chunks that fit the model's input window
+                    with span("pack_prompt"):
+                        packed = packer.get().pack(query, results)
+                    results, prompt = packed["used"], packed["prompt"]
+                docs = [r["text"] for r in results]
+
+            # Display Answer, token by token
+            answer, ttft_ms = "", None
+            pieces = stream_answer(query, docs, prompt, graph_hops)
+            try:
+                for piece in pieces:
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000)
+                    answer += piece
+                    answer_box.markdown(
+                        f"<div class='answer-box'><strong>💡 Answer:</strong><br>{answer}▌</div>",
+                        unsafe_allow_html=True
+                    )
+            finally:
+                # a new question / stop interrupts the loop: stop generating too
+                pieces.close()
+            # only complete answers are cached
+            if local:
+                with span("answer_cache.put"):
+                    cache.put(query, q_emb, answer, [r["id"] for r in results], version, scope)
+        total_ms = round((time.perf_counter() - started) * 1000)
+    answer_box.markdown(
         f"<div class='answer-box'><strong>💡 Answer:</strong><br>{answer}</div>",
         unsafe_allow_html=True
     )
 
-    # Display Evaluation
+    # Display Stats (answer quality is measured offline: python evaluation.py run eval.jsonl)
+    rerank_note = ""
+    if rerank_info:
+        rerank_note = f" | 🎯 Rerank: {rerank_info['ms']} ms over {rerank_info['depth']} candidates"
     st.markdown(
-        f"<div class='eval-box'><strong>📊 Evaluation Score:</strong> {round(score,3)} | 📚 Sources Used: {len(docs)}</div>",
+        f"<div class='eval-box'>📚 Sources Used: {len(docs)}"
+        f" | ⏱️ First token: {ttft_ms} ms, total: {total_ms} ms"
+        f"{' | ⚡ cached answer' if cached else ''}{rerank_note}</div>",
         unsafe_allow_html=True
     )
 
@@ -174,3 +415,24 @@ if st.button("✨ Get Answer") and query:
             f"<div class='source-box'>📄 <strong>Source {i+1}:</strong> {doc[:500]}...</div>",
             unsafe_allow_html=True
         )
+
+# =========================
+# --- 5. Sidebar Stats ---
+# =========================
+if API_URL:
+    st.sidebar.markdown("### ⚡ API Service")
+    st.sidebar.json(api_call("/stats"))
+else:
+    st.sidebar.markdown("### ⏳ Models")
+    st.sidebar.json({
+        r.name: f"{r.load_ms} ms" if r.loaded else ("failed" if r.error else "loading...")
+        for r in (retriever, embedder, generator)
+    })
+    st.sidebar.markdown("### ⚡ Embedding Cache")
+    st.sidebar.json(embedding_cache.stats())
+    if answer_cache.loaded:
+        st.sidebar.markdown("### 💾 Answer Cache")
+        st.sidebar.json(answer_cache.get().stats())
+    if tracing.ENABLED:
+        st.sidebar.markdown("### 🧭 Stage Timings")
+        st.sidebar.json(tracing.registry.snapshot())
@@ -0,0 +1,83 @@
+import os
+import shutil
+import numpy as np
+from typing import Iterable, Optional, Tuple
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# full-precision copy of a quantized index, next to the index file
+VECTORS_SUFFIX = ".f32"
+
+
+def vectors_path(index_path: str) -> str:
+    return index_path + VECTORS_SUFFIX
+
+
+# ==============================
+# RAW VECTORS
+# ==============================
+class RawVectors:
+    """
+    float32 embeddings on disk, row i = chunk id i (rows of removed or
+    never-added ids are zero and never asked for). Memory-mapped
+    read-only, so rescoring only pages in the candidate rows.
+    """
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        n = os.path.getsize(path) // (4 * dim)
+        if n:
+            self.vectors = np.memmap(path, dtype="float32", mode="r", shape=(n, dim))
+        else:
+            self.vectors = np.zeros((0, dim), dtype="float32")
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @classmethod
+    def open(cls, index_path: str, dim: int) -> Optional["RawVectors"]:
+        path = vectors_path(index_path)
+        return cls(path, dim) if os.path.exists(path) else None
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[ids])
+
+
+def write_raw_vectors(path: str, dim: int, batches: Iterable[Tuple[np.ndarray, np.ndarray]],
+                      base: Optional[RawVectors] = None) -> RawVectors:
+    """
+    Write base's rows plus the (ids, embeddings) batches to path. The
+    new file is built next to it and swapped in, so readers that have
+    the old file mapped keep a consistent view.
+    """
+    batches = [(np.asarray(ids, dtype="int64"), e) for ids, e in batches if len(ids)]
+    n = max([len(base) if base is not None else 0] + [int(ids.max()) + 1 for ids, _ in batches])
+    tmp = path + ".tmp"
+    if base is not None:
+        shutil.copyfile(base.path, tmp)
+    with open(tmp, "r+b" if base is not None else "wb") as f:
+        f.truncate(n * dim * 4)
+    if n:
+        out = np.memmap(tmp, dtype="float32", mode="r+", shape=(n, dim))
+        for ids, embeddings in batches:
+            out[ids] = embeddings
+        out.flush()
+        del out
+    os.replace(tmp, path)
+    return RawVectors(path, dim)
+
+
+def rescore(raw: RawVectors, query: np.ndarray, ids: np.ndarray, k: int):
+    """
+    Exact squared L2 of query (1, dim) against the candidate ids (-1
+    padding is skipped). Returns the k best as (D, I), like index.search.
+    """
+    ids = ids[ids >= 0]
+    dist = ((raw.get(ids) - query[0]) ** 2).sum(axis=1)
+    top = np.argsort(dist)[:k]
+    D = np.full((1, k), np.inf, dtype="float32")
+    I = np.full((1, k), -1, dtype="int64")
+    D[0, :len(top)] = dist[top]
+    I[0, :len(top)] = ids[top]
+    return D, I
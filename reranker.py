@@ -0,0 +1,132 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+from embedding_cache import normalize_for_cache
+
+# ==============================
+# CONFIGURATION
+# ==============================
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BATCH_SIZE = 16
+# candidates are scored in growing prefixes of the first-stage ranking,
+# top_n times these factors deep; deeper prefixes are only scored when
+# the last one still looked useful (the first is always deeper than top_n)
+DEPTH_FACTORS = (2, 4, 8)
+# stop when the best score of the newest slice is this far below the
+# current top_n-th score (ms-marco logits, roughly -10 .. 10)
+STOP_MARGIN = 2.0
+SCORE_CACHE_SIZE = 65_536
+
+
+def query_hash(query: str) -> bytes:
+    return hashlib.sha1(normalize_for_cache(query).lower().encode("utf-8")).digest()
+
+
+# ==============================
+# RERANKER
+# ==============================
+class CrossEncoderReranker:
+    """
+    Second-stage ranking of retrieved chunks with a cross-encoder (query
+    and chunk read together). Scores are cached per (query hash, chunk
+    id), so repeated questions and overlapping candidate lists only pay
+    for new pairs.
+    """
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE,
+                 depth_factors: Sequence[int] = DEPTH_FACTORS, margin: float = STOP_MARGIN,
+                 cache_size: int = SCORE_CACHE_SIZE, model=None):
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name)
+        self.model = model
+        self.batch_size = batch_size
+        self.depth_factors = tuple(depth_factors)
+        self.margin = margin
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[bytes, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def depth_schedule(self, top_n: int) -> Tuple[int, ...]:
+        return tuple(top_n * f for f in self.depth_factors)
+
+    def max_depth(self, top_n: int) -> int:
+        """
+        First-stage candidates to fetch for rerank(..., top_n).
+        """
+        return self.depth_schedule(top_n)[-1]
+
+    def _scores(self, query: str, candidates: Sequence[Dict]) -> Tuple[List[float], int]:
+        """
+        Cross-encoder scores for candidates (one predict call for all
+        uncached pairs). Returns (scores, cache hits).
+        """
+        qh = query_hash(query)
+        scores: List = [None] * len(candidates)
+        missing = []
+        with self._lock:
+            for j, c in enumerate(candidates):
+                key = (qh, c["id"]) if c.get("id") is not None else None
+                if key is not None and key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[j] = self._cache[key]
+                else:
+                    missing.append(j)
+        if missing:
+            pairs = [[query, candidates[j]["text"]] for j in missing]
+            new = self.model.predict(pairs, batch_size=self.batch_size)
+            with self._lock:
+                for j, s in zip(missing, new):
+                    scores[j] = float(s)
+                    if candidates[j].get("id") is not None:
+                        self._cache[(qh, candidates[j]["id"])] = float(s)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores, len(candidates) - len(missing)
+
+    def rerank(self, query: str, candidates: Sequence[Dict], top_n: int = 3) -> Tuple[List[Dict], Dict]:
+        """
+        candidates: [{"id", "text", "score"?}] in first-stage order, at
+        least max_depth(top_n) of them for the full schedule.
+        Returns (top_n candidates best first with "score" set to the
+        cross-encoder score and the old one kept as "retrieval_score",
+        stats {"ms", "scored" (cross-encoder calls), "cache_hits", "depth"}).
+        """
+        started = time.perf_counter()
+        scored: List[Tuple[float, Dict]] = []
+        cache_hits = 0
+        done = 0
+        schedule = self.depth_schedule(top_n)
+        for depth in schedule:
+            batch = list(candidates[done:depth])
+            if not batch:
+                break
+            scores, hits = self._scores(query, batch)
+            cache_hits += hits
+            scored.extend(zip(scores, batch))
+            done += len(batch)
+            if done >= len(candidates) or len(scored) <= top_n:
+                continue
+            # well separated: the deepest slice scored cannot reach the top_n
+            kth = sorted((s for s, _ in scored), reverse=True)[top_n - 1]
+            newest = scores[len(scores) // 2:] if depth == schedule[0] else scores
+            if max(newest) < kth - self.margin:
+                break
+
+        scored.sort(key=lambda x: -x[0])
+        top = [
+            {**c, "score": round(s, 4), "retrieval_score": c.get("score")}
+            for s, c in scored[:top_n]
+        ]
+        stats = {
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "scored": done - cache_hits,
+            "cache_hits": cache_hits,
+            "depth": done,
+        }
+        return top, stats
+
+    def stats(self) -> Dict:
+        return {"cached_pairs": len(self._cache)}
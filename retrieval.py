@@ -0,0 +1,157 @@
+import faiss
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from ann_index import RESCORE_FACTORS, load_spec, quantizer_of, search_params
+from answer_cache import index_version
+from bitmap_filter import filtered_search, load_bitmaps
+from bm25_index import RRF_K, load_bm25, rrf_fuse
+from dedup import load_sources
+from metadata_store import open_metadata
+from raw_vectors import RawVectors, rescore
+from tracing import span
+
+# ==============================
+# CONFIGURATION
+# ==============================
+INDEX_PATH = "faiss.index"
+METADATA_DIR = "metadata"
+LEGACY_METADATA = "metadata.json"
+FUSION_DEPTH = 20
+# chunks retrieved per question; the context packer keeps what fits
+CONTEXT_CANDIDATES = 8
+
+PROMPT_TEMPLATE = """
+Answer using context.
+
+Context:
+{context}
+
+Question:
+{query}
+"""
+
+
+# ==============================
+# RETRIEVER
+# ==============================
+class Retriever:
+    """
+    Read-only view over what milestone3 writes (FAISS index, metadata
+    store, filter bitmaps, BM25 index) shared by the Streamlit app and
+    the API service. embed_fn maps a list of texts to float32 vectors.
+    version identifies the index build (see answer_cache.index_version).
+    sources maps the id of a chunk that near-duplicates were collapsed
+    onto to all its [file, chunk number] references (see dedup.py).
+    raw (quantized indexes) holds the float32 vectors the
+    rescore_factor * k candidates from the codes are rescored with.
+    """
+    def __init__(self, index, metadata, embed_fn: Callable[[List[str]], np.ndarray],
+                 bitmaps=None, bm25=None, version: str = "", sources: Optional[Dict[int, List]] = None,
+                 raw: Optional[RawVectors] = None, rescore_factor: Optional[int] = None):
+        self.index = index
+        self.metadata = metadata
+        self.embed_fn = embed_fn
+        self.bitmaps = bitmaps
+        self.bm25 = bm25
+        self.version = version
+        self.sources = sources or {}
+        self.raw = raw
+        quantizer = quantizer_of(index)
+        self.rescore_factor = rescore_factor or RESCORE_FACTORS.get(quantizer, 1)
+
+    @classmethod
+    def load(cls, embed_fn, index_path: str = INDEX_PATH, metadata_dir: str = METADATA_DIR,
+             legacy_path: Optional[str] = LEGACY_METADATA) -> "Retriever":
+        # works for flat / HNSW / IVF / IVF-PQ indexes written by milestone3
+        index = faiss.read_index(index_path)
+        # memory-mapped: only the texts of returned ids are read from disk
+        metadata = open_metadata(metadata_dir, legacy_path=legacy_path)
+        # bitmaps / bm25 are None for builds that predate them
+        raw = RawVectors.open(index_path, index.d) if quantizer_of(index) else None
+        # the "rescore" the index was built with (None before spec files)
+        spec = load_spec(index_path) or {}
+        return cls(index, metadata, embed_fn, load_bitmaps(metadata_dir), load_bm25(metadata_dir),
+                   version=index_version(index_path, metadata_dir), sources=load_sources(metadata_dir),
+                   raw=raw, rescore_factor=spec.get("rescore"))
+
+    def dense_hits(self, query: str, k: int, nprobe=None, ef_search=None, filters=None,
+                   query_emb: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        [(chunk id, -L2 distance)], best first.
+        """
+        # nprobe (IVF) / ef_search (HNSW) trade recall for latency per request
+        # filters, e.g. {"state": ["Texas"]}, restrict hits inside FAISS
+        if query_emb is None:
+            with span("embed"):
+                query_emb = self.embed_fn([query])
+        query_emb = np.asarray(query_emb, dtype="float32").reshape(1, -1)
+        # quantized: over-fetch from the codes, then rank by exact distance
+        fetch = k * self.rescore_factor if self.raw is not None else k
+        if filters and self.bitmaps is not None:
+            with span("index.search", filtered=True):
+                distances, indices = filtered_search(
+                    self.index, query_emb, fetch, self.bitmaps.mask(filters), nprobe=nprobe, ef_search=ef_search
+                )
+        else:
+            with span("index.search"):
+                params = search_params(self.index, nprobe=nprobe, ef_search=ef_search)
+                distances, indices = self.index.search(query_emb, fetch, params=params)
+        if self.raw is not None:
+            with span("rescore"):
+                distances, indices = rescore(self.raw, query_emb, indices[0], k)
+        return [(int(i), -float(d)) for d, i in zip(distances[0], indices[0]) if i >= 0]
+
+    def sparse_hits(self, query: str, k: int, filters=None) -> List[Tuple[int, float]]:
+        """
+        [(chunk id, BM25 score)], best first.
+        """
+        if self.bm25 is None:
+            return []
+        mask = self.bitmaps.mask(filters) if filters and self.bitmaps is not None else None
+        with span("bm25.search"):
+            scores, ids = self.bm25.search(query, k, mask=mask)
+        return list(zip(ids.tolist(), scores.tolist()))
+
+    def search_hits(self, query: str, k: int = 3, nprobe=None, ef_search=None, filters=None,
+                    weights: Sequence[float] = (1.0, 1.0), depth: int = FUSION_DEPTH,
+                    rrf_k: int = RRF_K, query_emb: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        weights = (dense, sparse) for reciprocal-rank fusion; names,
+        colleges and cities are matched exactly by BM25 where embeddings
+        blur them. Without a BM25 index this is plain dense search.
+        Scores are comparable within one result list only.
+        """
+        if self.bm25 is None or not weights[1]:
+            return self.dense_hits(query, k, nprobe, ef_search, filters, query_emb)
+        dense = self.dense_hits(query, depth, nprobe, ef_search, filters, query_emb) if weights[0] else []
+        sparse = self.sparse_hits(query, depth, filters)
+        return rrf_fuse([[i for i, _ in dense], [i for i, _ in sparse]], k=k, rrf_k=rrf_k, weights=weights)
+
+    def search_ids(self, query: str, k: int = 3, **opts) -> List[int]:
+        return [i for i, _ in self.search_hits(query, k, **opts)]
+
+    def text(self, chunk_id: int) -> str:
+        return self.metadata[chunk_id]["text"]
+
+    def search(self, query: str, k: int = 3, **opts) -> List[Dict]:
+        hits = self.search_hits(query, k, **opts)
+        with span("metadata"):
+            results = [{"id": i, "text": self.text(i), "score": round(score, 6)} for i, score in hits]
+        for r in results:
+            if r["id"] in self.sources:
+                r["sources"] = self.sources[r["id"]]
+        return results
+
+
+# ==============================
+# PROMPT
+# ==============================
+def generated_text(output) -> str:
+    """
+    Text of one pipeline result; text-generation wraps each result in a
+    list, text2text-generation does not.
+    """
+    if isinstance(output, list):
+        output = output[0]
+    return output["generated_text"]
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# seconds the consumer waits for the next token before giving up
+STREAM_TIMEOUT = 60.0
+
+_DONE = object()
+
+
+# ==============================
+# TOKEN STREAM
+# ==============================
+class TokenStream:
+    """
+    Runs generator.model.generate for one prompt in a worker thread and
+    yields decoded text pieces as they are produced (TextIteratorStreamer).
+
+        stream = TokenStream(generator, prompt, max_length=200)   # or max_new_tokens=100
+        for piece in stream:
+            show(stream.text)
+        stream.ttft_ms, stream.elapsed_ms
+
+    cancel() (or closing the iterator early) stops generation at the next
+    decoding step through a stopping criterion.
+    """
+    def __init__(self, generator, prompt: str, max_length: int = 200, timeout: float = STREAM_TIMEOUT,
+                 max_new_tokens: Optional[int] = None):
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+        import torch
+
+        cancelled = self.cancelled = threading.Event()
+
+        class Cancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool)
+
+        tokenizer, model = generator.tokenizer, generator.model
+        # decoder-only models (gpt2) echo the prompt, seq2seq ones (flan-t5) do not
+        self._streamer = TextIteratorStreamer(
+            tokenizer,
+            skip_prompt=not model.config.is_encoder_decoder,
+            skip_special_tokens=True,
+            timeout=timeout,
+        )
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True)
+        kwargs = dict(
+            **inputs,
+            streamer=self._streamer,
+            stopping_criteria=StoppingCriteriaList([Cancelled()]),
+        )
+        if max_new_tokens is not None:
+            kwargs["max_new_tokens"] = max_new_tokens
+        else:
+            kwargs["max_length"] = max_length
+        if tokenizer.pad_token_id is None:
+            kwargs["pad_token_id"] = tokenizer.eos_token_id
+
+        self.text = ""
+        self.error: Optional[BaseException] = None
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, args=(model, kwargs), daemon=True)
+        self._thread.start()
+
+    def _run(self, model, kwargs):
+        try:
+            model.generate(**kwargs)
+        except BaseException as e:
+            self.error = e
+            self._streamer.end()
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for piece in self._streamer:
+                if self.cancelled.is_set():
+                    break
+                if not piece:
+                    continue
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self.text += piece
+                yield piece
+        finally:
+            self.finished_at = time.perf_counter()
+            # consumer stopped early (cancel, disconnect, Streamlit rerun)
+            self.cancel()
+        if self.error is not None:
+            raise self.error
+
+    def cancel(self):
+        self.cancelled.set()
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return round((self.first_token_at - self.started) * 1000, 1)
+
+    @property
+    def elapsed_ms(self) -> float:
+        end = self.finished_at or time.perf_counter()
+        return round((end - self.started) * 1000, 1)
+
+    def stats(self) -> Dict:
+        return {"ttft_ms": self.ttft_ms, "elapsed_ms": self.elapsed_ms, "chars": len(self.text)}
+
+
+async def aiter_stream(stream: TokenStream) -> AsyncIterator[str]:
+    """
+    Async iteration over a TokenStream without blocking the event loop.
+    Cancelling the consuming task stops generation.
+    """
+    it = iter(stream)
+    try:
+        while True:
+            piece = await asyncio.to_thread(next, it, _DONE)
+            if piece is _DONE:
+                break
+            yield piece
+    finally:
+        stream.cancel()
+
+
+# ==============================
+# SERVER-SENT EVENTS
+# ==============================
+def sse_event(data, event: Optional[str] = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+def iter_sse(lines: Iterator[bytes]) -> Iterator[Dict]:
+    """
+    Parse a text/event-stream response into {"event", "data"} dicts.
+    """
+    event, data = None, []
+    for raw in lines:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield {"event": event or "message", "data": json.loads("\n".join(data))}
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
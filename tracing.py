@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# everything below is a no-op unless RAG_TRACE=1 (or enable() is called)
+ENABLED = os.environ.get("RAG_TRACE", "") not in ("", "0")
+# one JSON line per finished trace, e.g. "traces.jsonl"
+TRACE_LOG = os.environ.get("RAG_TRACE_LOG")
+# traces slower than this get a sampling profile (0 = profiler off)
+PROFILE_SLOW_MS = float(os.environ.get("RAG_PROFILE_SLOW_MS", "0"))
+PROFILE_DIR = os.environ.get("RAG_PROFILE_DIR", ".profiles")
+PROFILE_INTERVAL_S = 0.005
+
+# histogram buckets in seconds (Prometheus "le" bounds)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "rag"
+
+_NULL = nullcontext()
+_current: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("rag_trace", default=None)
+_depth: "contextvars.ContextVar[int]" = contextvars.ContextVar("rag_span_depth", default=0)
+
+
+def enable(trace_log: Optional[str] = None, profile_slow_ms: Optional[float] = None):
+    global ENABLED, TRACE_LOG, PROFILE_SLOW_MS
+    ENABLED = True
+    if trace_log is not None:
+        TRACE_LOG = trace_log
+    if profile_slow_ms is not None:
+        PROFILE_SLOW_MS = profile_slow_ms
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+# ==============================
+# METRICS
+# ==============================
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        i = 0
+        while i < len(self.buckets) and seconds > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Registry:
+    """
+    Span latency histograms and event counters, keyed by name.
+    """
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def count(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "spans": {
+                    name: {"count": h.count, "sum_s": round(h.sum, 6),
+                           "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0}
+                    for name, h in sorted(self.histograms.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def prometheus(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        span, events = f"{METRIC_PREFIX}_span_seconds", f"{METRIC_PREFIX}_events_total"
+        lines = [f"# HELP {span} Time spent per pipeline stage.", f"# TYPE {span} histogram"]
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, c in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += c
+                    lines.append(f'{span}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{span}_sum{{span="{name}"}} {h.sum:.6f}')
+                lines.append(f'{span}_count{{span="{name}"}} {h.count}')
+            lines += [f"# HELP {events} Pipeline event counters.", f"# TYPE {events} counter"]
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{events}{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ==============================
+# SPANS / TRACES
+# ==============================
+class Trace:
+    """
+    All spans of one request (one rag_app question, one API call). Spans
+    opened in threads that copied the context (run_in_threadpool,
+    contextvars.copy_context) land here too.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans: List[Dict] = []
+
+    def to_dict(self, total_ms: float) -> Dict:
+        return {"trace": self.name, "time": time.time(), "total_ms": round(total_ms, 3), "spans": self.spans}
+
+
+@contextmanager
+def _span(name: str, labels: Dict):
+    t = _current.get()
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _depth.reset(token)
+        registry.observe(name, elapsed)
+        if t is not None:
+            # list.append is atomic, spans may finish in other threads
+            t.spans.append({
+                "span": name,
+                "start_ms": round((start - t.start) * 1000, 3),
+                "ms": round(elapsed * 1000, 3),
+                "depth": depth,
+                **labels,
+            })
+
+
+def span(name: str, **labels):
+    """
+    Time a stage:
+
+        with span("index.search"):
+            index.search(...)
+
+    Returns a shared null context when tracing is disabled.
+    """
+    if not ENABLED:
+        return _NULL
+    return _span(name, labels)
+
+
+def count(name: str, n: float = 1):
+    if ENABLED:
+        registry.count(name, n)
+
+
+def observe(name: str, seconds: float):
+    """
+    Record a duration measured elsewhere (e.g. time to first token).
+    """
+    if ENABLED:
+        registry.observe(name, seconds)
+
+
+def traced(name: str):
+    """
+    Decorator form of span(); the check happens per call, so enable()
+    works for functions decorated at import time.
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _span(name, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+@contextmanager
+def _trace(name: str):
+    t = Trace(name)
+    token = _current.set(t)
+    depth_token = _depth.set(0)
+    profiler = SamplingProfiler().start() if PROFILE_SLOW_MS > 0 else None
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+        _depth.reset(depth_token)
+        total = (time.perf_counter() - t.start) * 1000
+        registry.observe(name, total / 1000)
+        record = t.to_dict(total)
+        if profiler is not None:
+            profiler.stop()
+            if total >= PROFILE_SLOW_MS:
+                record["profile"] = profiler.save(name)
+        if TRACE_LOG:
+            _append_log(record)
+
+
+def trace(name: str):
+    """
+    Root of one request; spans inside it are collected into one trace
+    record (written to TRACE_LOG if set). Null context when disabled.
+    """
+    if not ENABLED:
+        return _NULL
+    return _trace(name)
+
+
+_log_lock = threading.Lock()
+
+
+def _append_log(record: Dict):
+    with _log_lock:
+        with open(TRACE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+# ==============================
+# SAMPLING PROFILER
+# ==============================
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads every interval seconds from a
+    background thread: the thread that opened a trace mostly waits, the
+    work happens on batcher / token-stream / worker threads. Each stack
+    is rooted at its thread's name, so one thread can be picked out of
+    the flame graph; in a busy server other requests show up too.
+    save() writes the samples in collapsed-stack format ("outer;inner
+    count" per line), which flamegraph.pl and speedscope render.
+    """
+    def __init__(self, interval: float = PROFILE_INTERVAL_S):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rag-profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, name: str, folder: str = PROFILE_DIR) -> str:
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{os.getpid()}-{id(self):x}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        return path
@@ -0,0 +1,116 @@
+import numpy as np
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# ==============================
+# CONFIGURATION
+# ==============================
+# triplets are appended to flat uint32 arrays and deduplicated in bulk
+# (numpy) every COMPACT_EVERY additions, so no Python object is kept per
+# triplet; (src, rel, dst) are packed into one uint64 key for dedup
+COMPACT_EVERY = 1_000_000
+ENTITY_BITS = 28
+RELATION_BITS = 8
+MAX_ENTITIES = 1 << ENTITY_BITS
+MAX_RELATIONS = 1 << RELATION_BITS
+
+
+# ==============================
+# INTERNING
+# ==============================
+class Interner:
+    """
+    Maps strings to dense integer ids (0, 1, 2, ...) and back.
+    """
+    def __init__(self, limit: Optional[int] = None):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.labels: List[str] = []
+        self.limit = limit
+
+    def intern(self, name: str, label: str = "") -> int:
+        idx = self.ids.get(name)
+        if idx is None:
+            idx = len(self.names)
+            if self.limit is not None and idx >= self.limit:
+                raise OverflowError(f"more than {self.limit} distinct values")
+            self.ids[name] = idx
+            self.names.append(name)
+            self.labels.append(label)
+        return idx
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, idx: int) -> str:
+        return self.names[idx]
+
+
+# ==============================
+# TRIPLET STORE
+# ==============================
+class TripletStore:
+    """
+    Deduplicated (source, relation, target) triplets over interned
+    entity / relation ids, backed by uint32 arrays.
+    """
+    def __init__(self):
+        self.entities = Interner(MAX_ENTITIES)
+        self.relations = Interner(MAX_RELATIONS)
+        self.src = array("I")
+        self.rel = array("I")
+        self.dst = array("I")
+        self._compacted = 0  # prefix of the arrays that is already unique
+
+    def add(self, source: str, relation: str, target: str, source_label: str = "", target_label: str = ""):
+        self.src.append(self.entities.intern(source, source_label))
+        self.rel.append(self.relations.intern(relation))
+        self.dst.append(self.entities.intern(target, target_label))
+        if len(self.src) - self._compacted >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        """
+        Drop duplicate triplets, keeping first-seen order.
+        """
+        if self._compacted == len(self.src):
+            return
+        src = np.frombuffer(self.src, dtype="uint32").astype("uint64")
+        rel = np.frombuffer(self.rel, dtype="uint32").astype("uint64")
+        dst = np.frombuffer(self.dst, dtype="uint32").astype("uint64")
+        keys = (src << np.uint64(ENTITY_BITS + RELATION_BITS)) | (rel << np.uint64(ENTITY_BITS)) | dst
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        self.src = array("I", np.frombuffer(self.src, dtype="uint32")[first].tobytes())
+        self.rel = array("I", np.frombuffer(self.rel, dtype="uint32")[first].tobytes())
+        self.dst = array("I", np.frombuffer(self.dst, dtype="uint32")[first].tobytes())
+        self._compacted = len(self.src)
+
+    def __len__(self):
+        self.compact()
+        return len(self.src)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (src, rel, dst) id arrays, zero-copy views over the store.
+        """
+        self.compact()
+        return (
+            np.frombuffer(self.src, dtype="uint32"),
+            np.frombuffer(self.rel, dtype="uint32"),
+            np.frombuffer(self.dst, dtype="uint32"),
+        )
+
+    def __iter__(self) -> Iterator[Tuple[str, str, str]]:
+        self.compact()
+        names, relations = self.entities.names, self.relations.names
+        for s, r, d in zip(self.src, self.rel, self.dst):
+            yield names[s], relations[r], names[d]
+
+    def relationships(self) -> Iterator[Dict]:
+        for s, r, d in self:
+            yield {"source": s, "relation": r, "target": d}
+
+    def triplets(self) -> Iterator[List[str]]:
+        for s, r, d in self:
+            yield [s, r, d]